@@ -0,0 +1,125 @@
+"""Seeded generators of synthetic panel and microhaplotype tables for benchmarking."""
+import numpy as np
+import pandas as pd
+
+BASES = np.array(list("ACGT"))
+
+
+def random_sequences(rng, n, length):
+    """Generate n random ACGT sequences of the given length."""
+    codes = rng.integers(0, 4, size=(n, length), dtype=np.uint8)
+    # View each row of single characters as one fixed width string
+    return BASES[codes].view(f"<U{length}").ravel().tolist()
+
+
+def generate_panel_table(n_targets, primers_per_target=1, with_location=True, primer_length=25, seed=0):
+    """
+    Generate a panel information table.
+
+    :param n_targets: the number of targets in the panel
+    :param primers_per_target: the number of primer pairs for each target
+    :param with_location: whether to add the chromosome, strand and coordinate columns
+    :param primer_length: the length of the primer sequences
+    :param seed: the random seed
+    :return: a dataframe with one row per primer pair
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = n_targets * primers_per_target
+    target_index = np.repeat(np.arange(n_targets), primers_per_target)
+    table = pd.DataFrame({
+        "target_id": [f"target_{i}" for i in target_index],
+        "fwd_primer": random_sequences(rng, n_rows, primer_length),
+        "rev_primer": random_sequences(rng, n_rows, primer_length),
+        "gene_id": [f"gene_{i // 4}" for i in target_index],
+        "target_type": np.where(target_index % 10 == 0, "drug_resistance", "diversity"),
+    })
+    if with_location:
+        insert_start = rng.integers(0, 3_000_000, size=n_targets)[target_index]
+        insert_end = insert_start + 200
+        table["chrom"] = [f"chr{i % 14 + 1}" for i in target_index]
+        table["strand"] = np.where(target_index % 2 == 0, "+", "-")
+        table["insert_start"] = insert_start
+        table["insert_end"] = insert_end
+        table["fwd_primer_start"] = insert_start - primer_length
+        table["fwd_primer_end"] = insert_start
+        table["rev_primer_start"] = insert_end
+        table["rev_primer_end"] = insert_end + primer_length
+    return table
+
+
+PANEL_LOCATION_COLUMNS = {
+    "forward_primers_start_col": "fwd_primer_start",
+    "forward_primers_end_col": "fwd_primer_end",
+    "reverse_primers_start_col": "rev_primer_start",
+    "reverse_primers_end_col": "rev_primer_end",
+    "insert_start_col": "insert_start",
+    "insert_end_col": "insert_end",
+    "chrom_col": "chrom",
+    "strand_col": "strand",
+}
+
+
+def generate_microhaplotype_table(n_samples, n_loci, max_alleles=3, seq_length=200, seed=0):
+    """
+    Generate a microhaplotype calls table sorted by sample and locus.
+
+    Each locus has a pool of max_alleles * 2 distinct sequences, and each sample carries between one and
+    max_alleles of them at every locus, so the table has roughly n_samples * n_loci * (max_alleles + 1) / 2 rows.
+
+    :param n_samples: the number of samples
+    :param n_loci: the number of loci
+    :param max_alleles: the maximum number of alleles called for a sample at a locus
+    :param seq_length: the length of the microhaplotype sequences
+    :param seed: the random seed
+    :return: a dataframe with sampleID, locus, asv and reads columns
+    """
+    rng = np.random.default_rng(seed)
+    pool_size = max_alleles * 2
+    pool = np.array(random_sequences(rng, n_loci * pool_size, seq_length), dtype=object)
+
+    alleles = rng.integers(1, max_alleles + 1, size=n_samples * n_loci)
+    pair_index = np.repeat(np.arange(n_samples * n_loci), alleles)
+    # Number the alleles of each sample and locus so they pick distinct sequences from the pool
+    allele_number = np.arange(len(pair_index)) - \
+        np.repeat(np.cumsum(alleles) - alleles, alleles)
+    sample_index = pair_index // n_loci
+    locus_index = pair_index % n_loci
+    pool_offset = rng.integers(0, pool_size, size=n_samples * n_loci)[pair_index]
+    seq_index = locus_index * pool_size + \
+        (pool_offset + allele_number) % pool_size
+
+    sample_names = np.array([f"sample_{i:06d}" for i in range(n_samples)], dtype=object)
+    locus_names = np.array([f"locus_{i:05d}" for i in range(n_loci)], dtype=object)
+    return pd.DataFrame({
+        "sampleID": sample_names[sample_index],
+        "locus": locus_names[locus_index],
+        "asv": pool[seq_index],
+        "reads": rng.integers(1, 5000, size=len(pair_index)),
+    })
+
+
+def microhaplotype_table_size(n_rows, n_loci=200, max_alleles=3):
+    """Get the number of samples for generate_microhaplotype_table to produce about n_rows rows."""
+    rows_per_sample = n_loci * (max_alleles + 1) / 2
+    return max(1, round(n_rows / rows_per_sample))
+
+
+def generate_column_names(n_columns, target_schema, seed=0):
+    """
+    Generate the header of a wide metadata sheet, containing variants of the schema fields and unrelated columns.
+
+    :param n_columns: the number of columns
+    :param target_schema: the schema fields to include variants of
+    :param seed: the random seed
+    :return: a list of unique column names
+    """
+    rng = np.random.default_rng(seed)
+    words = ["sample", "date", "collection", "site", "host", "age", "lat", "lon", "plate", "well", "run",
+             "batch", "volume", "parasite", "density", "method", "country", "region", "storage", "notes"]
+    columns = [field.upper() if i % 2 else f"{field}_col" for i, field in enumerate(target_schema)]
+    while len(columns) < n_columns:
+        name = "_".join(rng.choice(words, size=rng.integers(1, 4)))
+        name = f"{name}_{len(columns)}"
+        columns.append(name)
+    order = rng.permutation(len(columns))
+    return [columns[i] for i in order][:n_columns]
@@ -0,0 +1,202 @@
+"""
+Time and memory-profile the conversion functions on synthetic data and write the results to a JSON file.
+
+Usage:
+    python -m benchmarks.run_benchmarks --output bench_results.json [--mhap-rows 10000 1000000 ...]
+    python -m benchmarks.run_benchmarks --compare previous.json
+
+Each benchmark is timed without tracing, then run again under tracemalloc to record its peak memory unless
+--no-memory is given. With --compare, benchmarks slower than the previous results by more than --threshold are
+reported and the exit code is 1.
+"""
+import argparse
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generators import PANEL_LOCATION_COLUMNS, generate_column_names, generate_microhaplotype_table, generate_panel_table, microhaplotype_table_size
+from src.ai_matcher import LocalMatcherBackend, ResponseCache, ai_match_sheets
+from src.field_matcher import fuzzy_match_fields
+from src.incremental import update_microhaplotype_pmo_dict
+from src.pmo_writer import write_pmo
+from src.sequence_store import SequenceStore
+from src.transformer import create_representative_microhaplotype_table, microhaplotype_table_to_pmo_dict, panel_info_table_to_pmo_dict
+
+GENOME_INFO = {"name": "synthetic", "taxon_id": "0",
+               "url": "https://example.org/genome.fasta", "version": "1"}
+MHAP_SCHEMA = ["sampleID", "locus", "asv", "reads"]
+AI_SHEETS = 8
+AI_LATENCY = 0.2
+
+
+def measure(func, track_memory=True):
+    """
+    Time a function and optionally measure its peak traced memory in a second run.
+
+    :param func: the function to call without arguments
+    :param track_memory: whether to run the function again under tracemalloc
+    :return: the result of the first call, the wall time in seconds and the peak memory in bytes (or None)
+    """
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+
+    peak_memory = None
+    if track_memory:
+        tracemalloc.start()
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, seconds, peak_memory
+
+
+def run_benchmarks(mhap_rows, panel_targets, fuzzy_columns, n_loci=200, seed=0, track_memory=True):
+    """
+    Run all benchmarks.
+
+    :param mhap_rows: the approximate numbers of rows of the microhaplotype tables to benchmark
+    :param panel_targets: the numbers of targets of the panels to benchmark
+    :param fuzzy_columns: the numbers of input columns to benchmark fuzzy matching with
+    :param n_loci: the number of loci of the microhaplotype tables
+    :param seed: the random seed of the generated data
+    :param track_memory: whether to record the peak memory of each benchmark
+    :return: a list of result dictionaries
+    """
+    results = []
+
+    def record(benchmark, params, rows, func):
+        result, seconds, peak_memory = measure(func, track_memory)
+        results.append({"benchmark": benchmark, "params": params, "rows": rows,
+                        "seconds": round(seconds, 6), "peak_memory_bytes": peak_memory})
+        print(f"{benchmark:<35} {json.dumps(params):<50} {seconds:>10.3f}s", file=sys.stderr)
+        return result
+
+    for n_targets in panel_targets:
+        for with_location in (False, True):
+            table = generate_panel_table(
+                n_targets, primers_per_target=2, with_location=with_location, seed=seed)
+            location_cols = PANEL_LOCATION_COLUMNS if with_location else {}
+            record("panel_info_table_to_pmo_dict", {"targets": n_targets, "location": with_location}, len(table),
+                   lambda: panel_info_table_to_pmo_dict(table, "panel", GENOME_INFO, forward_primers_seq_col="fwd_primer",
+                                                        reverse_primers_seq_col="rev_primer", gene_id_col="gene_id",
+                                                        target_type_col="target_type", **location_cols))
+
+    for n_rows in mhap_rows:
+        n_samples = microhaplotype_table_size(n_rows, n_loci)
+        table = generate_microhaplotype_table(n_samples, n_loci, seed=seed)
+        params = {"samples": n_samples, "loci": n_loci}
+        component = record("microhaplotype_table_to_pmo_dict", params, len(table),
+                           lambda: microhaplotype_table_to_pmo_dict(table, "run"))
+        for indent in (4, None):
+            record("write_pmo", {**params, "indent": indent}, len(table),
+                   lambda: write_pmo([component], io.StringIO(), indent=indent))
+        # Re-sequence 5 samples of a previously converted table
+        conversion = update_microhaplotype_pmo_dict(table, "run")
+        updated = table.copy()
+        resequenced = updated["sampleID"].isin(updated["sampleID"].unique()[:5])
+        updated.loc[resequenced, "reads"] += 1
+        record("update_microhaplotype_pmo_dict", {**params, "changed_samples": 5}, len(table),
+               lambda: update_microhaplotype_pmo_dict(updated, "run", conversion))
+        # Intern the unique sequences of the table, as merging runs does
+        unique_table = create_representative_microhaplotype_table(table, "locus", "asv")
+        loci, seqs = unique_table["locus"].tolist(), unique_table["asv"].tolist()
+        record("SequenceStore.intern_many", {**params, "sequences": len(seqs)}, len(seqs),
+               lambda: SequenceStore().intern_many(loci, seqs))
+
+    for n_columns in fuzzy_columns:
+        columns = generate_column_names(n_columns, MHAP_SCHEMA, seed=seed)
+        record("fuzzy_match_fields", {"columns": n_columns, "schema": len(MHAP_SCHEMA)}, n_columns,
+               lambda: fuzzy_match_fields(columns, MHAP_SCHEMA))
+        # AI matching of several sheets against the local stand-in, with a simulated round trip to the model
+        sheets = [(generate_column_names(n_columns, MHAP_SCHEMA, seed=seed + i), MHAP_SCHEMA)
+                  for i in range(AI_SHEETS)]
+        record("ai_match_sheets", {"columns": n_columns, "sheets": AI_SHEETS, "latency": AI_LATENCY}, n_columns,
+               lambda: ai_match_sheets(sheets, LocalMatcherBackend(AI_LATENCY), cache=ResponseCache()))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, previous, threshold):
+    """
+    Compare results to previous results of the same benchmarks.
+
+    :param results: the current list of result dictionaries
+    :param previous: the previous list of result dictionaries
+    :param threshold: the relative slow down above which a benchmark is a regression
+    :return: a list of the regressed benchmarks with their previous and current times
+    """
+    previous_times = {(r["benchmark"], json.dumps(r["params"], sort_keys=True)): r["seconds"]
+                      for r in previous}
+    regressions = []
+    for r in results:
+        before = previous_times.get(
+            (r["benchmark"], json.dumps(r["params"], sort_keys=True)))
+        if before and r["seconds"] > before * (1 + threshold):
+            regressions.append({"benchmark": r["benchmark"], "params": r["params"],
+                                "previous_seconds": before, "seconds": r["seconds"]})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mhap-rows", type=int, nargs="+", default=[10_000, 100_000],
+                        help="Approximate row counts of the microhaplotype tables (10^4 to 10^8).")
+    parser.add_argument("--panel-targets", type=int, nargs="+", default=[1_000, 10_000],
+                        help="Target counts of the panels.")
+    parser.add_argument("--fuzzy-columns", type=int, nargs="+", default=[20, 100],
+                        help="Column counts of the sheets to fuzzy match.")
+    parser.add_argument("--loci", type=int, default=200,
+                        help="Number of loci in the microhaplotype tables.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Skip the tracemalloc run of each benchmark.")
+    parser.add_argument("--output", default="bench_results.json",
+                        help="Path of the JSON results file.")
+    parser.add_argument("--compare", default=None,
+                        help="A previous results file to check for regressions.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slow down reported as a regression.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.mhap_rows, args.panel_targets, args.fuzzy_columns, n_loci=args.loci,
+                             seed=args.seed, track_memory=not args.no_memory)
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_results(
+                results, json.load(f)["results"], args.threshold)
+        for r in regressions:
+            print(f"Regression: {r['benchmark']} {json.dumps(r['params'])} "
+                  f"{r['previous_seconds']:.3f}s -> {r['seconds']:.3f}s", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
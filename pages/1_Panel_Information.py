@@ -1,32 +1,31 @@
+import io
 import streamlit as st
 import pandas as pd
-import json
-import os
-from src.data_loader import load_csv
-from src.field_matcher import auto_match_fields, check_for_duplicates, interactive_field_mapping, field_mapping_json_to_table
+from src.data_loader import read_csv_columns
+from src.field_matcher import check_for_duplicates, interactive_field_mapping, field_mapping_json_to_table
 from src.transformer import transform_panel_info
-from src.format_page import render_header
-
-# Helper functions for loading and saving JSON
-current_directory = os.getcwd()  # Get the current working directory
-SAVE_DIR = os.path.join(current_directory, "saved_panels")
-os.makedirs(SAVE_DIR, exist_ok=True)  # Ensure the directory exists
-# SAVE_DIR = "saved_panels"
-# os.makedirs(SAVE_DIR, exist_ok=True)
-
-
-def save_panel(panel_name, panel_data):
-    with open(os.path.join(SAVE_DIR, f"{panel_name}.json"), "w") as f:
-        json.dump(panel_data, f)
-
-
-def load_panel(panel_name):
-    with open(os.path.join(SAVE_DIR, f"{panel_name}.json"), "r") as f:
-        return json.load(f)
-
-
-def get_saved_panels():
-    return [f.split(".json")[0] for f in os.listdir(SAVE_DIR) if f.endswith(".json")]
+from src.format_page import render_header, render_job_progress, render_profile_report, render_violations
+from src.instrumentation import profile
+from src.jobs import JobCancelled, get_conversion_jobs, job_key
+from src.table_cache import content_hash, load_csv_cached
+from src.mapping_cache import cached_auto_match_fields, invalidate_mapping, save_mapping
+from src.panel_library import list_panels, load_panel, save_panel
+from src.validation import ValidationError, raise_for_violations, validate_panel_table
+
+
+def convert_panel_table(file, panel_id, field_mapping, genome_info, additional_fields, track_memory,
+                        mapping_signature):
+    """Load, check and convert a panel information table, run as a background job."""
+    with profile(track_memory=track_memory) as report:
+        df = load_csv_cached(file, field_mapping, additional_fields)
+        # Report every problem in the table before converting it
+        raise_for_violations(validate_panel_table(
+            df, field_mapping, additional_fields))
+        transformed_df = transform_panel_info(
+            df, panel_id, field_mapping, genome_info, additional_fields)
+    # Remember the accepted mapping for the next file with these columns
+    save_mapping(*mapping_signature, field_mapping)
+    return transformed_df, report
 
 
 render_header()
@@ -34,9 +33,13 @@ st.subheader("Panel Information Converter", divider="gray")
 # Option to load past versions
 use_past = st.checkbox("Use a past version")
 if use_past:
-    saved_panels = get_saved_panels()
+    saved_panels = list_panels()
     if saved_panels:
-        selected_panel = st.selectbox("Select a saved panel:", saved_panels)
+        st.dataframe(pd.DataFrame(saved_panels).assign(
+            created=lambda panels: pd.to_datetime(panels["created"], unit="s").dt.floor("s")),
+            hide_index=True)
+        selected_panel = st.selectbox("Select a saved panel:",
+                                      [panel["panel_id"] for panel in saved_panels])
         if st.button("Load Panel"):
             panel_data = load_panel(selected_panel)
             st.session_state["panel_info"] = panel_data
@@ -52,11 +55,12 @@ else:
     st.subheader("Upload File")
     uploaded_file = st.file_uploader("Upload a CSV file", type="csv")
     if uploaded_file:
-        df = load_csv(uploaded_file)
+        # Only the header is needed until the data is transformed
+        df_columns = read_csv_columns(uploaded_file)
         interactive_preview = st.toggle("Preview File")
         if interactive_preview:
             st.write("Uploaded File Preview:")
-            st.dataframe(df)
+            st.dataframe(load_csv_cached(uploaded_file))
 
         # AI / Fuzzy Field Matching
         st.subheader("Match Fields")
@@ -67,15 +71,23 @@ else:
             api_key = st.text_input(
                 "Enter OpenAI API Key:", type="password")
 
-        df_columns = df.columns.tolist()
-        field_mapping, unused_field_names = auto_match_fields(
-            df.columns.tolist(),
+        field_mapping, unused_field_names, mapping_from_cache = cached_auto_match_fields(
+            df_columns,
             target_schema,
             method=method.lower(),
             api_key=api_key
         )
+        if mapping_from_cache:
+            st.info("Using the saved mapping for files with these columns.")
+            if st.button("Forget Saved Mapping"):
+                invalidate_mapping(df_columns, target_schema, method.lower())
+                st.rerun()
         st.write("Suggested Field Mapping:")
         st.dataframe(field_mapping_json_to_table(field_mapping))
+        unmatched_fields = [field for field in target_schema if field not in field_mapping]
+        if unmatched_fields:
+            st.warning(
+                f"No column matched {', '.join(unmatched_fields)}. Select them under Manually Alter Field Mapping.")
         # TODO: ADD OPTIONAL FIELDS
         # forward_primers_start_col, forward_primers_end_col, reverse_primers_start_col, reverse_primers_end_col, insert_start_col, insert_end_col, chrom_col, strand_col, gene_id_col, target_type_col
         # Interactive Mapping
@@ -83,12 +95,13 @@ else:
             "Manually Alter Field Mapping")
         if interactive_field_mapping_on:
             updated_mapping = interactive_field_mapping(
-                field_mapping, df_columns)
+                field_mapping, df_columns, target_schema)
             # Display the updated mapping after user interaction
             st.write("Updated Field Mapping:")
             st.dataframe(field_mapping_json_to_table(updated_mapping))
 
             check_for_duplicates(updated_mapping)
+            field_mapping = updated_mapping
 
         # Add additional fields
         st.subheader("Add Additional Fields")
@@ -129,6 +142,8 @@ else:
         if panel_ID:
             if all([genome_name, taxon_id, version, genome_url]):
                 st.subheader("Transform Data")
+                show_report = st.toggle(
+                    "Show performance report", help='Record the time and peak memory of each stage of the conversion.')
                 if st.button("Transform Data"):
                     genome_info = {
                         "name": genome_name,
@@ -138,18 +153,36 @@ else:
                     }
                     if gff_url:
                         genome_info["gff_url"] = gff_url
-                    transformed_df = transform_panel_info(
-                        df, panel_ID, field_mapping, genome_info, selected_additional_fields)
-
-                    # Convert the dictionary to a JSON string
-                    json_data = json.dumps(transformed_df, indent=4)
-                    # if st.button("Save Panel"):
-                    st.session_state["panel_info"] = transformed_df
+                    # The conversion runs in the background, so the page stays responsive and can be rerun meanwhile
+                    key = job_key(content_hash(uploaded_file), field_mapping,
+                                  selected_additional_fields, panel_ID, genome_info, show_report)
+                    st.session_state["panel_job"] = get_conversion_jobs().submit(
+                        key, convert_panel_table, io.BytesIO(uploaded_file.getvalue()), panel_ID, field_mapping,
+                        genome_info, selected_additional_fields, show_report,
+                        (df_columns, target_schema, method.lower()))
+                job = st.session_state.get("panel_job")
+                if job is not None and not job.finished:
+                    render_job_progress(job)
+                elif job is not None:
+                    del st.session_state["panel_job"]
                     try:
-                        save_panel(panel_ID, transformed_df)
-                        st.success(f"Panel '{panel_ID}' has been saved!")
-                    except Exception as e:
-                        st.error(f"Error saving panel: {e}")
+                        transformed_df, report = job.result()
+                    except JobCancelled:
+                        st.warning("The conversion was cancelled.")
+                    except ValidationError as e:
+                        render_violations(e.violations)
+                    else:
+                        st.session_state["panel_profile"] = report
+                        # if st.button("Save Panel"):
+                        st.session_state["panel_info"] = transformed_df
+                        saved_panel_id = next(iter(transformed_df["panel_info"]))
+                        try:
+                            save_panel(saved_panel_id, transformed_df)
+                            st.success(f"Panel '{saved_panel_id}' has been saved!")
+                        except Exception as e:
+                            st.error(f"Error saving panel: {e}")
+                if show_report and "panel_profile" in st.session_state:
+                    render_profile_report(st.session_state["panel_profile"])
 
 # Display the current panel information
 if "panel_info" in st.session_state:
@@ -1,21 +1,50 @@
+import io
 import streamlit as st
-from src.data_loader import load_csv
-from src.field_matcher import auto_match_fields, check_for_duplicates, interactive_field_mapping, field_mapping_json_to_table
-from src.transformer import transform_mhap_info
-from src.format_page import render_header
+from src.data_loader import read_common_columns
+from src.field_matcher import check_for_duplicates, interactive_field_mapping, field_mapping_json_to_table
+from src.incremental import transform_mhap_info_incremental
+from src.format_page import render_header, render_job_progress, render_profile_report, render_violations
+from src.instrumentation import profile
+from src.jobs import JobCancelled, get_conversion_jobs, job_key
+from src.table_cache import content_hash, load_csvs_cached
+from src.mapping_cache import cached_auto_match_fields, invalidate_mapping, save_mapping
+from src.validation import ValidationError, raise_for_violations, validate_mhap_table
+
+
+def convert_mhap_tables(files, bioinfo_id, field_mapping, additional_fields, previous, track_memory, mapping_signature):
+    """Load, check and convert the microhaplotype tables of a run, run as a background job."""
+    with profile(track_memory=track_memory) as report:
+        # The files are parsed concurrently and converted as one table
+        df = load_csvs_cached(files, field_mapping, additional_fields)
+        # Report every problem in the table before converting it
+        raise_for_violations(validate_mhap_table(
+            df, field_mapping, additional_fields))
+        # Only the samples that changed since the last conversion of this run are rebuilt
+        conversion = transform_mhap_info_incremental(
+            df, bioinfo_id, field_mapping, additional_fields, previous=previous)
+    # Remember the accepted mapping for the next file with these columns
+    save_mapping(*mapping_signature, field_mapping)
+    return conversion, report
+
 
 render_header()
 st.subheader("Microhaplotype Information Converter", divider="gray")
 
 # Upload CSV
 st.subheader("Upload File")
-uploaded_file = st.file_uploader("Upload a CSV file", type="csv")
-if uploaded_file:
-    df = load_csv(uploaded_file)
+uploaded_files = st.file_uploader("Upload CSV files, e.g. one per plate of the run", type="csv",
+                                  accept_multiple_files=True)
+if uploaded_files:
+    # Only the headers are needed until the data is transformed, and one field mapping is used for all files
+    try:
+        df_columns = read_common_columns(uploaded_files)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
     interactive_preview = st.toggle("Preview File")
     if interactive_preview:
         st.write("Uploaded File Preview:")
-        st.dataframe(df)
+        st.dataframe(load_csvs_cached(uploaded_files))
 
     # AI / Fuzzy Field Matching
     st.subheader("Match Fields")
@@ -25,25 +54,34 @@ if uploaded_file:
     if method == "AI":
         api_key = st.text_input("Enter OpenAI API Key:", type="password")
 
-    df_columns = df.columns.tolist()
-    field_mapping, unused_field_names = auto_match_fields(
-        df.columns.tolist(),
+    field_mapping, unused_field_names, mapping_from_cache = cached_auto_match_fields(
+        df_columns,
         target_schema,
         method=method.lower(),
         api_key=api_key
     )
+    if mapping_from_cache:
+        st.info("Using the saved mapping for files with these columns.")
+        if st.button("Forget Saved Mapping"):
+            invalidate_mapping(df_columns, target_schema, method.lower())
+            st.rerun()
     st.write("Suggested Field Mapping:")
     st.dataframe(field_mapping_json_to_table(field_mapping))
+    unmatched_fields = [field for field in target_schema if field not in field_mapping]
+    if unmatched_fields:
+        st.warning(
+            f"No column matched {', '.join(unmatched_fields)}. Select them under Manually Alter Field Mapping.")
 
     # Interactive Mapping
     interactive_field_mapping_on = st.toggle("Manually Alter Field Mapping")
     if interactive_field_mapping_on:
-        updated_mapping = interactive_field_mapping(field_mapping, df_columns)
+        updated_mapping = interactive_field_mapping(field_mapping, df_columns, target_schema)
         # Display the updated mapping after user interaction
         st.write("Updated Field Mapping:")
         st.dataframe(field_mapping_json_to_table(updated_mapping))
 
         check_for_duplicates(updated_mapping)
+        field_mapping = updated_mapping
 
     # Add additional fields
     selected_additional_fields = None
@@ -70,9 +108,41 @@ if uploaded_file:
     # Data Transformation
     if bioinfo_ID:
         st.subheader("Transform Data")
+        show_report = st.toggle(
+            "Show performance report", help='Record the time and peak memory of each stage of the conversion.')
         if st.button("Transform Data"):
-            transformed_df = transform_mhap_info(
-                df, bioinfo_ID, field_mapping, selected_additional_fields)
-            st.session_state["mhap_data"] = transformed_df
-            st.success(
-                f"Microhaplotype Information from Bioinformatics Run '{bioinfo_ID}' has been saved!")
+            # The conversion runs in the background, so the page stays responsive and can be rerun meanwhile
+            # Jobs are shared by all sessions, so the key identifies the previous conversion the update starts
+            # from by the key of the job that produced it, which covers the whole history of conversions
+            key = job_key([content_hash(file) for file in uploaded_files], field_mapping,
+                          selected_additional_fields, bioinfo_ID, st.session_state.get("mhap_conversion_key"),
+                          show_report)
+            st.session_state["mhap_job"] = get_conversion_jobs().submit(
+                key, convert_mhap_tables, [io.BytesIO(file.getvalue()) for file in uploaded_files], bioinfo_ID,
+                field_mapping, selected_additional_fields, st.session_state.get("mhap_conversion"), show_report,
+                (df_columns, target_schema, method.lower()))
+        job = st.session_state.get("mhap_job")
+        if job is not None and not job.finished:
+            render_job_progress(job)
+        elif job is not None:
+            del st.session_state["mhap_job"]
+            try:
+                conversion, report = job.result()
+            except JobCancelled:
+                st.warning("The conversion was cancelled.")
+            except ValidationError as e:
+                render_violations(e.violations)
+            else:
+                st.session_state["mhap_profile"] = report
+                previous = st.session_state.get("mhap_conversion")
+                st.session_state["mhap_conversion"] = conversion
+                st.session_state["mhap_conversion_key"] = job.key
+                st.session_state["mhap_data"] = conversion.pmo_data
+                st.success(
+                    f"Microhaplotype Information from Bioinformatics Run '{conversion.bioinfo_id}' has been saved!")
+                if previous is not None and previous.bioinfo_id == conversion.bioinfo_id:
+                    st.info(f"Updated {len(conversion.rebuilt_samples)} changed samples, removed "
+                            f"{len(conversion.removed_samples)} samples and added {conversion.added_sequences} "
+                            "new sequences.")
+        if show_report and "mhap_profile" in st.session_state:
+            render_profile_report(st.session_state["mhap_profile"])
@@ -1,10 +1,11 @@
 import streamlit as st
-import json
 import os
 from src.data_loader import load_csv
 from src.field_matcher import auto_match_fields, check_for_duplicates, interactive_field_mapping, field_mapping_json_to_table
 from src.transformer import transform_mhap_info
 from src.format_page import render_header
+from src.compression import CODEC_SUFFIXES, available_codecs
+from src.merge import merge_pmo
 
 current_directory = os.getcwd()  # Get the current working directory
 SAVE_DIR = os.path.join(current_directory, "PMO")
@@ -16,7 +17,7 @@ st.subheader("Create Final PMO", divider="gray")
 st.subheader("Components")
 # PANEL INFO
 if "panel_info" in st.session_state:
-    panel_info = json.loads(st.session_state["panel_info"])
+    panel_info = st.session_state["panel_info"]
     panel_id = panel_info["panel_info"].keys()
     st.write("Current Panel Information:", panel_id)
 else:
@@ -25,7 +26,7 @@ else:
 
 # MICROHAPLOTYPE DATA
 if "mhap_data" in st.session_state:
-    mhap_data = json.loads(st.session_state["mhap_data"])
+    mhap_data = st.session_state["mhap_data"]
     bioinfo_id = mhap_data["microhaplotypes_detected"].keys()
     st.write("Current Microhaplotype Information from bioinformatics run:", bioinfo_id)
 else:
@@ -35,16 +36,31 @@ else:
 # SPECIMEN INFO
 if "specimen_info" in st.session_state:
     st.write("Current specimen info:",)
-    st.write(json.loads(st.session_state["mhap_data"])[
+    st.write(st.session_state["mhap_data"][
              "microhaplotypes_detected"].keys())
 else:
     st.error(
         "No specimen information found. Please go to the Specimen Information tab before proceeding.")
 
+# ADDITIONAL RUNS
+st.subheader("Additional Bioinformatics Runs")
+additional_runs = st.file_uploader(
+    "Upload PMO files of other runs to merge (Optional)", type=["json", "gz", "zst"], accept_multiple_files=True,
+    help='The same sequence at the same locus is stored once and the haplotype IDs of each run are updated to match.')
+
 # MERGE DATA
 st.subheader("Merge Components to Final PMO")
+compact_output = st.toggle(
+    "Compact output", help='Write the PMO without indentation to reduce the file size.')
+compression = st.selectbox("Compression:", ["none"] + available_codecs(),
+                           help='Compress the PMO as it is written. zstd is faster than gzip for a similar size.')
 if st.button("Merge Data"):
-    with open(os.path.join(SAVE_DIR, f"{panel_id}_{bioinfo_id}.json"), "w") as f:
-        json.dump(panel_info, f)
-        json.dump(mhap_data, f)
-    st.success(f"Your PMO has been saved!")
+    pmo_name = f"{'_'.join(panel_id)}_{'_'.join(bioinfo_id)}"
+    # A single run keeps its own ID for the representative sequences
+    representative_id = pmo_name if additional_runs else '_'.join(bioinfo_id)
+    try:
+        merge_pmo([panel_info], [mhap_data, *additional_runs], os.path.join(SAVE_DIR, f"{pmo_name}.json{CODEC_SUFFIXES.get(compression, '')}"),
+                  representative_id, indent=None if compact_output else 4)
+        st.success(f"Your PMO has been saved!")
+    except ValueError as e:
+        st.error(f"Error merging runs: {e}")
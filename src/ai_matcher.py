@@ -0,0 +1,289 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+DEFAULT_TIMEOUT = 30
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_MAX_ENTRIES = 256
+# Set to "local" to use the local stand-in backend instead of OpenAI, e.g. to run the app offline
+BACKEND_ENV_VAR = "PMO_AI_BACKEND"
+
+SYSTEM_MESSAGE = (
+    "You are an assistant that helps map column names to a standard schema. "
+    "Given a list of column names and a target schema, match each column to the most relevant schema field."
+)
+
+
+class MatcherBackend(ABC):
+    """
+    A backend suggesting which schema field each column matches.
+
+    Backends return the reply as JSON text, an object with column names as keys and schema fields as values,
+    which is parsed and checked by ai_match_fields, so every backend goes through the same handling of replies.
+    """
+    model = None
+
+    @abstractmethod
+    def suggest(self, field_names, target_schema):
+        """
+        Suggests a schema field for each column.
+
+        Args:
+            field_names (list): List of column names to be matched.
+            target_schema (list): List of standard schema fields to match against.
+
+        Returns:
+            str: The reply, a JSON object mapping column names to schema fields.
+        """
+
+
+class OpenAIMatcherBackend(MatcherBackend):
+    """Suggests matches with an OpenAI chat model, with a timeout and retries on each request."""
+
+    def __init__(self, api_key=None, model=DEFAULT_MODEL, timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES):
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._client = None
+
+    def suggest(self, field_names, target_schema):
+        if self._client is None:
+            import openai
+
+            # Without an api_key the client reads it from the OPENAI_API_KEY environment variable
+            self._client = openai.OpenAI(
+                api_key=self.api_key, timeout=self.timeout, max_retries=self.max_retries)
+        response = self._client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SYSTEM_MESSAGE},
+                {"role": "user", "content": build_user_message(
+                    field_names, target_schema)},
+            ],
+            max_tokens=3000,
+            temperature=0.3,
+        )
+        return response.choices[0].message.content
+
+
+class LocalMatcherBackend(MatcherBackend):
+    """
+    A deterministic stand-in for a model, replying with the fuzzy matches, so the AI path can be tested and
+    benchmarked offline.
+    """
+    model = "local-fuzzy"
+
+    def __init__(self, latency=0.0):
+        # Seconds to wait before replying, to simulate the round trip to a model
+        self.latency = latency
+
+    def suggest(self, field_names, target_schema):
+        from src.field_matcher import fuzzy_match_fields
+
+        if self.latency:
+            time.sleep(self.latency)
+        matches, _ = fuzzy_match_fields(field_names, target_schema)
+        return json.dumps({field_name: schema_field for schema_field, field_name in matches.items()})
+
+
+class ResponseCache:
+    """A least recently used cache of backend replies, keyed by the columns, the schema and the model."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._replies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get the reply stored under key, or None."""
+        with self._lock:
+            if key in self._replies:
+                self._replies.move_to_end(key)
+                return self._replies[key]
+        return None
+
+    def put(self, key, reply):
+        """Store a reply under key, evicting the least recently used replies beyond max_entries."""
+        with self._lock:
+            self._replies[key] = reply
+            self._replies.move_to_end(key)
+            while len(self._replies) > self.max_entries:
+                self._replies.popitem(last=False)
+
+    def clear(self):
+        """Remove all replies."""
+        with self._lock:
+            self._replies.clear()
+
+
+# Shared by all sessions of the app, so the same columns are only sent to the model once
+response_cache = ResponseCache()
+
+
+def default_backend(api_key=None):
+    """
+    Gets the backend to use for AI matching: the local stand-in if the PMO_AI_BACKEND environment variable is
+    "local", otherwise OpenAI.
+
+    Args:
+        api_key (str, optional): OpenAI API key.
+
+    Returns:
+        MatcherBackend: The backend.
+    """
+    if os.environ.get(BACKEND_ENV_VAR) == "local":
+        return LocalMatcherBackend()
+    if not api_key and not os.environ.get("OPENAI_API_KEY"):
+        raise ValueError("API key is required for AI-based matching.")
+    return OpenAIMatcherBackend(api_key)
+
+
+def response_cache_key(field_names, target_schema, model):
+    """
+    Creates the cache key of a request.
+
+    Returns:
+        str: A hash of the column names, the target schema and the model.
+    """
+    signature = json.dumps([list(field_names), list(target_schema), model])
+    return hashlib.sha256(signature.encode()).hexdigest()
+
+
+def build_user_message(field_names, target_schema):
+    """Builds the request for a model to match the columns to the schema."""
+    return (
+        f"Columns: {field_names}\n"
+        f"Target Schema: {target_schema}\n\n"
+        "Provide the result as a JSON object where each column name is a key, "
+        "and the value is the most relevant field from the schema."
+    )
+
+
+def ai_match_fields(field_names, target_schema, backend, cache=None):
+    """
+    Matches field names to the target schema with a matcher backend, reusing the cached reply to the same
+    columns, schema and model.
+
+    Args:
+        field_names (list): List of column names to be matched.
+        target_schema (list): List of standard schema fields to match against.
+        backend (MatcherBackend): The backend suggesting the matches.
+        cache (ResponseCache, optional): The cache of replies, defaults to the shared response_cache.
+
+    Returns:
+        dict: A dictionary mapping each schema field to the matched field name.
+        list: A list of unused field names that could not be matched.
+    """
+    return ai_match_sheets([(field_names, target_schema)], backend, cache=cache)[0]
+
+
+def ai_match_sheets(sheets, backend, max_workers=None, cache=None):
+    """
+    Matches the columns of several sheets to their schemas with a matcher backend, sending the requests that
+    are not cached concurrently.
+
+    Args:
+        sheets (list): List of (field_names, target_schema) pairs.
+        backend (MatcherBackend): The backend suggesting the matches.
+        max_workers (int, optional): Maximum number of concurrent requests.
+        cache (ResponseCache, optional): The cache of replies, defaults to the shared response_cache.
+
+    Returns:
+        list: The field mapping and the list of unused field names of each sheet, in order.
+    """
+    if cache is None:
+        cache = response_cache
+    keys = [response_cache_key(field_names, target_schema, backend.model)
+            for field_names, target_schema in sheets]
+    replies = {key: cache.get(key) for key in keys}
+    # Identical sheets are only requested once
+    pending = {key: sheet for key, sheet in zip(keys, sheets) if replies[key] is None}
+
+    def request(key):
+        field_names, target_schema = pending[key]
+        try:
+            return backend.suggest(list(field_names), list(target_schema))
+        except Exception as e:
+            raise RuntimeError(f"AI matching failed: {e}")
+
+    # Each sheet is handled on its own, so the valid replies of a batch are cached even if another sheet fails,
+    # and the error of the first failed sheet is raised once they are
+    errors = {}
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers or len(pending)) as executor:
+            futures = {key: executor.submit(request, key) for key in pending}
+            for key, future in futures.items():
+                try:
+                    replies[key] = future.result()
+                except RuntimeError as e:
+                    errors[key] = e
+    results = []
+    for key, (field_names, target_schema) in zip(keys, sheets):
+        if key in errors:
+            continue
+        try:
+            results.append(parse_reply(replies[key], field_names, target_schema))
+        except RuntimeError as e:
+            errors[key] = e
+            continue
+        # Only replies that could be parsed are cached
+        if key in pending:
+            cache.put(key, replies[key])
+    if errors:
+        raise errors[next(key for key in keys if key in errors)]
+    return results
+
+
+def parse_reply(reply, field_names, target_schema):
+    """
+    Parses a reply mapping columns to schema fields into a field mapping.
+
+    Matches to unknown columns or schema fields are ignored, and a schema field matched by several columns keeps
+    the first. Schema fields the reply leaves unmatched are matched among the remaining columns by fuzzy matching,
+    so every schema field has a suggestion to review.
+
+    Args:
+        reply (str): The JSON reply, which may be wrapped in a Markdown code block.
+        field_names (list): List of column names to be matched.
+        target_schema (list): List of standard schema fields to match against.
+
+    Returns:
+        dict: A dictionary mapping each schema field to the matched field name.
+        list: A list of unused field names that could not be matched.
+    """
+    from src.field_matcher import fuzzy_match_fields
+
+    text = (reply or "").strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        suggestions = json.loads(text)
+    except ValueError as e:
+        raise RuntimeError(f"AI matching failed: the reply is not valid JSON ({e})")
+    if not isinstance(suggestions, dict):
+        raise RuntimeError("AI matching failed: the reply is not a JSON object")
+
+    schema_fields = set(target_schema)
+    matches = {}
+    for field_name in field_names:
+        schema_field = suggestions.get(field_name)
+        if isinstance(schema_field, str) and schema_field in schema_fields and schema_field not in matches:
+            matches[schema_field] = field_name
+
+    unmatched_schema = [field for field in target_schema if field not in matches]
+    remaining_fields = [field for field in field_names if field not in set(matches.values())]
+    if unmatched_schema and remaining_fields:
+        matches.update(fuzzy_match_fields(remaining_fields, unmatched_schema)[0])
+
+    matches = {field: matches[field] for field in target_schema if field in matches}
+    matched_fields = set(matches.values())
+    unused_field_names = [
+        field for field in field_names if field not in matched_fields]
+    return matches, unused_field_names
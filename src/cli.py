@@ -0,0 +1,264 @@
+"""
+Command line entry point for converting panel and microhaplotype tables to PMO without the Streamlit app.
+
+Usage:
+    python -m src.cli panel --panel-table panel.tsv --panel-id ID --genome-info genome.json --output panel.json
+    python -m src.cli microhaplotypes --mhap-table run.tsv [run2.tsv ...] --bioinfo-id ID --output mhap.json
+    python -m src.cli convert --panel-table panel.tsv --panel-id ID --genome-info genome.json \\
+        --mhap-table run.tsv --bioinfo-id ID --mapping mapping.json --output pmo.json
+    python -m src.cli microhaplotypes --mhap-table run.tsv --bioinfo-id ID --format parquet --output run_tables/
+    python -m src.cli merge --panel panel.json --runs run1.json [run2.json ...] --representative-id ID --output pmo.json
+
+The mapping file is a JSON object with optional "panel" and "microhaplotypes" sections, each mapping the PMO field
+names to the column names of the input table. Tables without a mapping section are matched with fuzzy matching, or
+with AI matching with --match-method ai.
+Output paths ending in .gz or .zst are compressed with gzip or zstd, and compressed PMO files can be merged.
+Modules are imported by the subcommands that need them to keep start up fast.
+"""
+import argparse
+import json
+import sys
+from contextlib import nullcontext
+
+PANEL_SCHEMA = ["target_id", "forward_primers", "reverse_primers"]
+MHAP_SCHEMA = ["sampleID", "locus", "asv", "reads"]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="pmo-convert", description="Convert panel and microhaplotype tables to PMO.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    panel_parser = subparsers.add_parser(
+        "panel", help="Convert a panel information table.")
+    _add_panel_args(panel_parser)
+    _add_common_args(panel_parser)
+    _add_format_arg(panel_parser)
+    panel_parser.set_defaults(func=run_panel)
+
+    mhap_parser = subparsers.add_parser(
+        "microhaplotypes", help="Convert one or more microhaplotype tables from a bioinformatics run.")
+    _add_mhap_args(mhap_parser)
+    _add_common_args(mhap_parser)
+    _add_format_arg(mhap_parser)
+    mhap_parser.set_defaults(func=run_microhaplotypes)
+
+    convert_parser = subparsers.add_parser(
+        "convert", help="Convert a panel and microhaplotype tables into a single PMO.")
+    _add_panel_args(convert_parser)
+    _add_mhap_args(convert_parser)
+    _add_common_args(convert_parser)
+    convert_parser.set_defaults(func=run_convert)
+
+    merge_parser = subparsers.add_parser(
+        "merge", help="Merge PMO files of panels and bioinformatics runs into a single PMO.")
+    merge_parser.add_argument("--panel", nargs="*", default=[],
+                              help="PMO files holding panel information.")
+    merge_parser.add_argument("--runs", nargs="+", required=True,
+                              help="PMO files holding microhaplotype information, read one at a time.")
+    merge_parser.add_argument("--representative-id", required=True,
+                              help="Identifier for the merged representative microhaplotype sequences.")
+    merge_parser.add_argument("--output", default="-",
+                              help="Path to write the PMO to, or - for standard output (default).")
+    merge_parser.add_argument("--compact", action="store_true",
+                              help="Write the JSON without indentation.")
+    _add_compression_args(merge_parser)
+    merge_parser.set_defaults(func=run_merge)
+    return parser
+
+
+def _add_panel_args(parser):
+    parser.add_argument("--panel-table", required=True,
+                        help="Tab separated panel information table.")
+    parser.add_argument("--panel-id", required=True,
+                        help="Identifier for the panel.")
+    parser.add_argument("--genome-info", required=True,
+                        help="JSON file with the reference genome name, taxon_id, version, url and optional gff_url.")
+    parser.add_argument("--panel-additional-cols", nargs="+", default=None,
+                        help="Additional panel columns to include in the target information.")
+
+
+def _add_mhap_args(parser):
+    parser.add_argument("--mhap-table", nargs="+", required=True,
+                        help="Tab separated microhaplotype tables with the same columns, e.g. one per plate, parsed concurrently "
+                             "and converted together as one bioinformatics run.")
+    parser.add_argument("--bioinfo-id", required=True,
+                        help="Identifier for the bioinformatics run.")
+    parser.add_argument("--mhap-additional-cols", nargs="+", default=None,
+                        help="Additional microhaplotype columns to include in the detected microhaplotypes.")
+
+
+def _add_common_args(parser):
+    parser.add_argument("--mapping", default=None,
+                        help="JSON file mapping the PMO fields to the input columns.")
+    parser.add_argument("--match-method", choices=["fuzzy", "ai"], default="fuzzy",
+                        help="How to match the columns of tables without a mapping. ai uses OpenAI with the key in "
+                             "OPENAI_API_KEY, or a local stand-in if PMO_AI_BACKEND=local.")
+    parser.add_argument("--output", default="-",
+                        help="Path to write the PMO to, or - for standard output (default).")
+    parser.add_argument("--compact", action="store_true",
+                        help="Write the JSON without indentation.")
+    _add_compression_args(parser)
+
+
+def _add_format_arg(parser):
+    parser.add_argument("--format", choices=["json", "parquet", "feather"], default="json",
+                        help="Output format. parquet and feather write one table per file to the --output directory.")
+
+
+def _add_compression_args(parser):
+    parser.add_argument("--compression", choices=["none", "gzip", "zstd"], default=None,
+                        help="Compress the output file, defaults to the codec implied by its suffix (.gz or .zst).")
+    parser.add_argument("--compression-level", type=int, default=None,
+                        help="Compression level of the codec.")
+
+
+def load_json_file(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_field_mapping(args, section, columns, target_schema):
+    """Get the field mapping for a section from the mapping file, falling back to matching the columns."""
+    return get_field_mappings(args, {section: (columns, target_schema)})[section]
+
+
+def get_field_mappings(args, sheets):
+    """
+    Get the field mappings of several sections from the mapping file, matching the columns of the sections
+    without a mapping with --match-method. AI requests for several sections are sent concurrently.
+
+    :param sheets: a dict of section to the (columns, target_schema) of its table
+    :return: a dict of section to field mapping
+    """
+    mapping = load_json_file(args.mapping) if args.mapping else {}
+    mappings = {section: mapping[section] for section in sheets if section in mapping}
+    to_match = [section for section in sheets if section not in mappings]
+    if to_match and getattr(args, "match_method", "fuzzy") == "ai":
+        from src.ai_matcher import ai_match_sheets, default_backend
+        results = ai_match_sheets([sheets[section] for section in to_match], default_backend())
+    else:
+        from src.field_matcher import auto_match_fields
+        results = [auto_match_fields(*sheets[section]) for section in to_match]
+    for section, (field_mapping, _) in zip(to_match, results):
+        mappings[section] = field_mapping
+    return mappings
+
+
+def convert_panel(args, columnar=False, field_mapping=None):
+    from src.data_loader import load_csv, read_csv_columns
+    from src.validation import raise_for_violations, validate_panel_table
+    if columnar:
+        from src.columnar import transform_panel_info_to_columnar as transform_panel_info
+    else:
+        from src.transformer import transform_panel_info
+
+    if field_mapping is None:
+        field_mapping = get_field_mapping(
+            args, "panel", read_csv_columns(args.panel_table), PANEL_SCHEMA)
+    df = load_csv(args.panel_table, field_mapping,
+                  args.panel_additional_cols)
+    raise_for_violations(validate_panel_table(
+        df, field_mapping, args.panel_additional_cols))
+    return transform_panel_info(df, args.panel_id, field_mapping, load_json_file(args.genome_info),
+                                args.panel_additional_cols)
+
+
+def convert_microhaplotypes(args, columnar=False, field_mapping=None):
+    from src.data_loader import load_csvs, read_common_columns
+    from src.validation import raise_for_violations, validate_mhap_table
+    if columnar:
+        from src.columnar import transform_mhap_info_to_columnar as transform_mhap_info
+    else:
+        from src.transformer import transform_mhap_info
+
+    # The tables must have the same columns, so the mapping is found once for all of them
+    if field_mapping is None:
+        field_mapping = get_field_mapping(
+            args, "microhaplotypes", read_common_columns(args.mhap_table), MHAP_SCHEMA)
+    df = load_csvs(args.mhap_table, field_mapping, args.mhap_additional_cols)
+    raise_for_violations(validate_mhap_table(
+        df, field_mapping, args.mhap_additional_cols))
+    return transform_mhap_info(df, args.bioinfo_id, field_mapping, args.mhap_additional_cols)
+
+
+def write_output(args, components):
+    from src.pmo_writer import write_pmo
+
+    indent = None if args.compact else 4
+    with output_target(args) as output:
+        write_pmo(components, output, indent=indent, compression=args.compression,
+                  compression_level=args.compression_level)
+
+
+def output_target(args):
+    """
+    Get the path to write the PMO to, or for --output - a text stream writing to standard output, compressed
+    if a codec was asked for, to use as a context manager.
+    """
+    from src.compression import open_text_output
+
+    if args.output != "-":
+        return nullcontext(args.output)
+    if args.compression in (None, "none"):
+        return nullcontext(sys.stdout)
+    sys.stdout.flush()
+    return open_text_output(sys.stdout.buffer, args.compression, args.compression_level)
+
+
+def write_columnar_output(args, tables):
+    from src.columnar import write_columnar
+
+    write_columnar(tables, args.output, args.format)
+
+
+def run_panel(args):
+    if args.format != "json":
+        write_columnar_output(args, convert_panel(args, columnar=True))
+    else:
+        write_output(args, [convert_panel(args)])
+
+
+def run_microhaplotypes(args):
+    if args.format != "json":
+        write_columnar_output(args, convert_microhaplotypes(args, columnar=True))
+    else:
+        write_output(args, [convert_microhaplotypes(args)])
+
+
+def run_convert(args):
+    from src.data_loader import read_common_columns, read_csv_columns
+
+    mappings = get_field_mappings(args, {
+        "panel": (read_csv_columns(args.panel_table), PANEL_SCHEMA),
+        "microhaplotypes": (read_common_columns(args.mhap_table), MHAP_SCHEMA)})
+    write_output(args, [convert_panel(args, field_mapping=mappings["panel"]),
+                        convert_microhaplotypes(args, field_mapping=mappings["microhaplotypes"])])
+
+
+def run_merge(args):
+    from src.merge import merge_pmo
+
+    with output_target(args) as output:
+        merge_pmo(args.panel, args.runs, output, args.representative_id, indent=None if args.compact else 4,
+                  compression=args.compression, compression_level=args.compression_level)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "format", "json") != "json" and args.output == "-":
+        parser.error(f"--output must be a directory for the {args.format} format")
+    if getattr(args, "compression_level", None) is not None and args.output == "-" and \
+            args.compression in (None, "none"):
+        parser.error("--compression-level needs --compression gzip or zstd when writing to standard output")
+    try:
+        args.func(args)
+    except (ValueError, KeyError, OSError) as e:
+        print(f"pmo-convert: error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import importlib.util
+import os
+import numpy as np
+import pandas as pd
+from src.instrumentation import instrumented
+from src.transformer import attach_representative_microhaplotype_ids, check_additional_columns_exist, check_columns_unique_for_target, check_location_columns, create_representative_microhaplotype_table
+
+COLUMNAR_FORMATS = {"parquet": ".parquet", "feather": ".feather"}
+
+
+def transform_mhap_info_to_columnar(df, bioinfo_id, field_mapping, additional_hap_detected_cols=None):
+    """Convert a microhaplotype table to columnar tables based on the provided field mapping."""
+    return microhaplotype_table_to_columnar(
+        df, bioinfo_id, sampleID_col=field_mapping["sampleID"], locus_col=field_mapping['locus'], mhap_col=field_mapping['asv'], reads_col=field_mapping['reads'], additional_hap_detected_cols=additional_hap_detected_cols)
+
+
+def transform_panel_info_to_columnar(df, panel_id, field_mapping, target_genome_info, additional_target_info_cols=None):
+    """Convert a panel information table to columnar tables based on the provided field mapping."""
+    return panel_info_table_to_columnar(
+        df,
+        panel_id,
+        target_genome_info,
+        target_id_col=field_mapping["target_id"],
+        forward_primers_seq_col=field_mapping["forward_primers"],
+        reverse_primers_seq_col=field_mapping["reverse_primers"],
+        additional_target_info_cols=additional_target_info_cols)
+
+
+@instrumented("microhaplotype_table_to_columnar")
+def microhaplotype_table_to_columnar(
+    contents: pd.DataFrame,
+    bioinfo_id: str,
+    sampleID_col: str = 'sampleID',
+    locus_col: str = 'locus',
+    mhap_col: str = 'asv',
+    reads_col: str = 'reads',
+    additional_hap_detected_cols: list | None = None
+):
+    """
+    Convert a dataframe of microhaplotype calls into flat tables holding the same information as the PMO
+    microhaplotypes_detected and representative_microhaplotype_sequences, without building the dictionaries.
+
+    Identifier columns are categoricals, so they are dictionary encoded when written. Detections are ordered by
+    sample then target, and haplotype IDs match those of microhaplotype_table_to_pmo_dict. As in the PMO, a
+    haplotype called more than once for the same sample and target keeps its last call.
+
+    :param contents: The dataframe containing microhaplotype calls
+    :param bioinfo_id: the bioinformatics ID of the microhaplotype table
+    :param sampleID_col: the name of the column containing the sample IDs
+    :param locus_col: the name of the column containing the locus IDs
+    :param mhap_col: the name of the column containing the microhaplotype sequence
+    :param reads_col: the name of the column containing the reads counts
+    :param additional_hap_detected_cols: optional additional columns to add to the detections table
+    :return: a dict of the microhaplotypes_detected table, with the bioinfo_id, sample_id, target_id,
+        haplotype_id, read_count and additional columns, and the representative_microhaplotype_sequences table, with
+        the representative_microhaplotype_id, target_id, microhaplotype_id and seq
+    """
+    check_additional_columns_exist(contents, additional_hap_detected_cols)
+
+    representative_table = create_representative_microhaplotype_table(
+        contents, locus_col, mhap_col).sort_values(locus_col, kind="stable")
+
+    table = contents[contents[sampleID_col].notna()
+                     & contents[locus_col].notna()]
+    table = table.sort_values([sampleID_col, locus_col], kind="stable")
+    hap_ids = attach_representative_microhaplotype_ids(
+        table, representative_table, locus_col, mhap_col)
+
+    detected = pd.DataFrame({
+        "bioinfo_id": _constant_column(bioinfo_id, len(table)),
+        "sample_id": _categorical(table[sampleID_col]),
+        "target_id": _categorical(table[locus_col]),
+        "haplotype_id": pd.Categorical(hap_ids),
+        "read_count": table[reads_col].to_numpy(),
+    })
+    for col in additional_hap_detected_cols or []:
+        detected[col] = table[col].to_numpy()
+    detected = detected.drop_duplicates(
+        ["sample_id", "target_id", "haplotype_id"], keep="last", ignore_index=True)
+
+    representative = pd.DataFrame({
+        "representative_microhaplotype_id": _constant_column(bioinfo_id, len(representative_table)),
+        "target_id": _categorical(representative_table[locus_col]),
+        "microhaplotype_id": representative_table["microhaplotype_id"].to_numpy(),
+        "seq": representative_table[mhap_col].to_numpy(),
+    })
+    return {"microhaplotypes_detected": detected, "representative_microhaplotype_sequences": representative}
+
+
+@instrumented("panel_info_table_to_columnar")
+def panel_info_table_to_columnar(target_table: pd.DataFrame,
+                                 panel_id: str,
+                                 genome_info: dict,
+                                 target_id_col: str = 'target_id',
+                                 forward_primers_seq_col: str = 'fwd_primer',
+                                 reverse_primers_seq_col: str = 'rev_primer',
+                                 forward_primers_start_col: str | None = None,
+                                 forward_primers_end_col: str | None = None,
+                                 reverse_primers_start_col: str | None = None,
+                                 reverse_primers_end_col: str | None = None,
+                                 insert_start_col: str | None = None,
+                                 insert_end_col: str | None = None,
+                                 chrom_col: str | None = None,
+                                 strand_col: str | None = None,
+                                 gene_id_col: str | None = None,
+                                 target_type_col: str | None = None,
+                                 additional_target_info_cols: list | None = None,
+                                 ):
+    """
+    Convert a dataframe containing panel information into flat tables holding the same information as the PMO
+    panel_info, without building the dictionaries. Nested fields are flattened into columns named by their path,
+    e.g. the chrom of a target's insert_location is the insert_location_chrom column.
+
+    :param target_table: The dataframe containing the target information
+    :param panel_id: the panel ID assigned to the panel
+    :param genome_info: A dictionary containing the genome information
+    :param target_id_col: the name of the column containing the target IDs
+    :param forward_primers_seq_col: the name of the column containing the sequence of the forward primer
+    :param reverse_primers_seq_col: the name of the column containing the sequence of the reverse primer
+    :param forward_primers_start_col (Optional): the name of the column containing the 0-based start coordinate of the forward primer
+    :param forward_primers_end_col (Optional): the name of the column containing the 0-based end coordinate of the forward primer
+    :param reverse_primers_start_col (Optional): the name of the column containing the 0-based start coordinate of the reverse primer
+    :param reverse_primers_end_col (Optional): the name of the column containing the 0-based end coordinate of the reverse primer
+    :param insert_start_col (Optional): the name of the column containing the 0-based start coordinate of the insert
+    :param insert_end_col (Optional): the name of the column containing the 0-based end coordinate of the insert
+    :param chrom_col (Optional): the name of the column containing the chromosome for the target
+    :param strand_col (Optional): the name of the column containing the strand for the target
+    :param gene_id_col (Optional): the name of the column containing the gene id
+    :param target_type_col (Optional): A classification type for the target
+    :param additional_target_info_cols (Optional): list of additional columns to add to the targets table
+    :return: a dict of the panels table, with the panel_id and the target genome fields, the targets table, with the
+        panel_id, target_id, gene_id, target_type, additional and insert_location columns in order of first
+        appearance, and the primers table, with the panel_id, target_id, forward_primers_seq and reverse_primers_seq
+        and the location columns of each primer pair
+    """
+    if not isinstance(target_table, pd.DataFrame):
+        raise ValueError("target_table must be a pandas DataFrame.")
+    if not isinstance(genome_info, dict):
+        raise ValueError("genome_info must be a dictionary.")
+    check_additional_columns_exist(target_table, additional_target_info_cols)
+    # If one location column set, check all location columns are set
+    location_cols = check_location_columns(forward_primers_start_col, forward_primers_end_col, reverse_primers_start_col,
+                                           reverse_primers_end_col, insert_start_col, insert_end_col, chrom_col, strand_col)
+    target_cols = {}
+    if gene_id_col:
+        target_cols["gene_id"] = gene_id_col
+    if target_type_col:
+        target_cols["target_type"] = target_type_col
+    for col in additional_target_info_cols or []:
+        target_cols[col] = col
+    if location_cols:
+        target_cols.update({"insert_location_chrom": chrom_col, "insert_location_start": insert_start_col,
+                            "insert_location_end": insert_end_col, "insert_location_strand": strand_col})
+    check_columns_unique_for_target(
+        target_table, target_id_col, list(dict.fromkeys(target_cols.values())))
+
+    panels = pd.DataFrame([{"panel_id": panel_id, **{
+        f"target_genome_{key}": value for key, value in genome_info.items()}}])
+
+    # Primer pairs are kept in their original order within each target
+    target_codes, target_ids = pd.factorize(target_table[target_id_col])
+    order = np.argsort(target_codes, kind="stable")
+    order = order[target_codes[order] >= 0]
+    first_rows = order[np.unique(target_codes[order], return_index=True)[1]]
+
+    targets = pd.DataFrame({
+        "panel_id": _constant_column(panel_id, len(target_ids)),
+        "target_id": target_ids.to_numpy(),
+    })
+    for name, col in target_cols.items():
+        targets[name] = _take_column(target_table[col], first_rows,
+                                     name in ("insert_location_start", "insert_location_end"))
+
+    primers = pd.DataFrame({
+        "panel_id": _constant_column(panel_id, len(order)),
+        "target_id": pd.Categorical(target_table[target_id_col].take(order).to_numpy(), categories=target_ids),
+        "forward_primers_seq": target_table[forward_primers_seq_col].take(order).to_numpy(),
+        "reverse_primers_seq": target_table[reverse_primers_seq_col].take(order).to_numpy(),
+    })
+    if location_cols:
+        # Both primers of a pair are on the chrom and strand of the target
+        primer_cols = {"forward_primers_location_start": forward_primers_start_col,
+                       "forward_primers_location_end": forward_primers_end_col,
+                       "reverse_primers_location_start": reverse_primers_start_col,
+                       "reverse_primers_location_end": reverse_primers_end_col,
+                       "location_chrom": chrom_col, "location_strand": strand_col}
+        for name, col in primer_cols.items():
+            primers[name] = _take_column(
+                target_table[col], order, name.endswith(("_start", "_end")))
+    return {"panels": panels, "targets": targets, "primers": primers}
+
+
+def write_columnar(tables, output_dir, file_format="parquet", compression="zstd"):
+    """
+    Write columnar tables, as returned by microhaplotype_table_to_columnar or panel_info_table_to_columnar, to a
+    directory with one file per table. Requires pyarrow.
+
+    :param tables: a dict of table name to dataframe
+    :param output_dir: the directory to write the tables to, created if it does not exist
+    :param file_format: "parquet" or "feather"
+    :param compression: the codec to compress the files with, e.g. "zstd", "lz4" or None
+    :return: a list of the paths written
+    """
+    if file_format not in COLUMNAR_FORMATS:
+        raise ValueError(
+            f"Unknown columnar format {file_format}, expected one of {', '.join(COLUMNAR_FORMATS)}")
+    if not importlib.util.find_spec("pyarrow"):
+        raise ValueError(
+            "Columnar export requires the pyarrow package, install it with pip install pyarrow")
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for name, table in tables.items():
+        path = os.path.join(output_dir, f"{name}{COLUMNAR_FORMATS[file_format]}")
+        if file_format == "parquet":
+            table.to_parquet(path, index=False, compression=compression)
+        else:
+            table.to_feather(path, compression=compression)
+        paths.append(path)
+    return paths
+
+
+def _categorical(column):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.remove_unused_categories().array
+    return pd.Categorical(column)
+
+
+def _constant_column(value, length):
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), categories=[value])
+
+
+def _take_column(column, rows, as_int=False):
+    # Coordinates are 64-bit integers, as in the PMO dictionaries
+    values = column.take(rows)
+    return (values.astype(np.int64) if as_int else values).to_numpy()
@@ -0,0 +1,87 @@
+import gzip
+import importlib
+import importlib.util
+import io
+import os
+
+# Codecs by file suffix, so a compressed file can be written by giving its name
+SUFFIX_CODECS = {".gz": "gzip", ".zst": "zstd"}
+CODEC_SUFFIXES = {codec: suffix for suffix, codec in SUFFIX_CODECS.items()}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+_MAGIC = {b"\x1f\x8b": "gzip", b"\x28\xb5\x2f\xfd": "zstd"}
+
+
+def available_codecs():
+    """Get the compression codecs that can be used here, zstd needs the optional zstandard package."""
+    return ["gzip"] + (["zstd"] if importlib.util.find_spec("zstandard") else [])
+
+
+def codec_from_path(path):
+    """Get the codec implied by the suffix of a path, or None for an uncompressed file."""
+    return SUFFIX_CODECS.get(os.path.splitext(str(path))[1].lower())
+
+
+def codec_from_header(header):
+    """Get the codec of a file from its first bytes, or None for an uncompressed file."""
+    return next((codec for magic, codec in _MAGIC.items() if header.startswith(magic)), None)
+
+
+def open_text_output(path, compression=None, compression_level=None):
+    """
+    Open a path, or a binary stream such as standard output, to write text to, compressing it as it is written.
+
+    :param path: the path or writable binary stream to write to. A stream must be compressed and is left open
+        when the returned stream is closed
+    :param compression: "gzip", "zstd" or "none", defaults to the codec implied by the suffix of the path
+    :param compression_level: the codec's compression level, defaults to a level balancing speed and size
+    :return: a writable text stream
+    """
+    is_stream = hasattr(path, "write")
+    codec = compression or (None if is_stream else codec_from_path(path))
+    if codec in (None, "none"):
+        if is_stream:
+            raise ValueError("Uncompressed text is written to a stream directly")
+        return open(path, "w")
+    level = DEFAULT_LEVELS[codec] if compression_level is None and codec in DEFAULT_LEVELS else compression_level
+    if codec == "gzip":
+        if is_stream:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=path, mode="wb", compresslevel=level), encoding="utf-8")
+        return gzip.open(path, "wt", compresslevel=level)
+    if codec == "zstd":
+        compressor = _zstandard().ZstdCompressor(level=level)
+        if is_stream:
+            return io.TextIOWrapper(compressor.stream_writer(path, closefd=False), encoding="utf-8")
+        return io.TextIOWrapper(compressor.stream_writer(open(path, "wb")), encoding="utf-8")
+    raise ValueError(
+        f"Unknown compression {codec}, expected one of {', '.join(['none'] + available_codecs())}")
+
+
+def open_text_input(source):
+    """
+    Open a path or binary stream to read text from, decompressing it if it starts with a gzip or zstd header.
+
+    :param source: the path or readable seekable stream, e.g. an uploaded file
+    :return: a readable text stream, which closes source when closed
+    """
+    raw = source if hasattr(source, "read") else open(source, "rb")
+    if hasattr(raw, "seek"):
+        raw.seek(0)
+    header = raw.read(4)
+    raw.seek(0)
+    if isinstance(header, str):
+        # Already a text stream
+        return raw
+    codec = codec_from_header(header)
+    if codec == "gzip":
+        raw = gzip.GzipFile(fileobj=raw, mode="rb")
+    elif codec == "zstd":
+        raw = _zstandard().ZstdDecompressor().stream_reader(raw)
+    return io.TextIOWrapper(raw, encoding="utf-8")
+
+
+def _zstandard():
+    try:
+        return importlib.import_module("zstandard")
+    except ImportError:
+        raise ValueError(
+            "zstd compression requires the zstandard package, install it with pip install zstandard")
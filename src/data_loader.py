@@ -1,11 +1,225 @@
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 import io
+from src.instrumentation import instrumented
 
+# PMO fields whose columns hold repeated identifiers or sequences, stored as categoricals so each value is held once
+CATEGORICAL_FIELDS = {"sampleID", "locus", "asv", "target_id"}
+# PMO fields whose columns hold counts or coordinates, stored as 32-bit integers when they fit
+INTEGER_FIELDS = {"reads", "forward_primers_start", "forward_primers_end", "reverse_primers_start",
+                  "reverse_primers_end", "insert_start", "insert_end"}
 
-def load_csv(file):
-    """Load a CSV file into a pandas DataFrame."""
+
+@instrumented("load_csv")
+def load_csv(file, field_mapping=None, additional_cols=None):
+    """
+    Load a CSV file into a pandas DataFrame.
+
+    If a field mapping is given only the mapped and additional columns are read, using the pyarrow parser
+    when it is installed. Identifier columns are stored as categoricals, holding numbers if all of their values
+    are numbers, so they sort as in the untyped table. Count and coordinate columns are stored as 32-bit
+    integers when their values fit.
+    """
+    _rewind(file)
+    try:
+        if field_mapping is None:
+            df = pd.read_csv(file, sep='\t')
+            return df
+        usecols = list(dict.fromkeys(
+            list(field_mapping.values()) + list(additional_cols or [])))
+        dtype = {field_mapping[field]: "category"
+                 for field in CATEGORICAL_FIELDS if field in field_mapping}
+        df = pd.read_csv(file, sep='\t', usecols=usecols,
+                         dtype=dtype, engine=_fast_engine())
+    except Exception as e:
+        raise ValueError(f"Failed to read CSV: {e}")
+    for field in CATEGORICAL_FIELDS.intersection(field_mapping):
+        col = field_mapping[field]
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = _numeric_categories(df[col])
+    for field in INTEGER_FIELDS.intersection(field_mapping):
+        col = field_mapping[field]
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = _compact_integers(df[col])
+    return df
+
+
+def read_csv_columns(file):
+    """Read only the header of a CSV file and return its column names."""
+    _rewind(file)
     try:
-        df = pd.read_csv(file, sep='\t')
-        return df
+        return pd.read_csv(file, sep='\t', nrows=0).columns.tolist()
     except Exception as e:
         raise ValueError(f"Failed to read CSV: {e}")
+
+
+def read_common_columns(files):
+    """
+    Read the headers of several CSV files, checking that they all have the same columns so that one field
+    mapping applies to all of them.
+
+    :param files: the paths or file-like objects of the CSV files
+    :return: the column names of the first file
+    """
+    return _check_common_columns(files, [read_csv_columns(file) for file in files])
+
+
+@instrumented("load_csvs")
+def load_csvs(files, field_mapping=None, additional_cols=None, max_workers=None):
+    """
+    Load several CSV files with the same columns, e.g. one per plate of a run, into a single pandas DataFrame,
+    in the given order and with categorical columns sharing one set of categories.
+
+    When the pyarrow parser is installed and the files have their columns in the same order, the files are joined
+    without their repeated headers and parsed once, so the parser splits the work across its threads regardless of
+    how the rows are spread over the files. Otherwise the files are parsed concurrently in a thread pool and
+    concatenated with concat_tables.
+
+    :param files: the paths or file-like objects of the CSV files
+    :param field_mapping: the mapping of the PMO fields to the columns, as for load_csv
+    :param additional_cols: additional columns to read, as for load_csv
+    :param max_workers: the number of threads of the thread pool, defaults to that of a ThreadPoolExecutor
+    :return: the concatenated DataFrame
+    """
+    files = list(files)
+    if not files:
+        raise ValueError("No files to load")
+    headers = [read_csv_columns(file) for file in files]
+    _check_common_columns(files, headers)
+    if len(files) == 1:
+        return load_csv(files[0], field_mapping, additional_cols)
+    if _fast_engine() == "pyarrow" and all(header == headers[0] for header in headers):
+        return load_csv(io.BytesIO(_join_csv_bytes(files)), field_mapping, additional_cols)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tables = list(executor.map(
+            lambda file: load_csv(file, field_mapping, additional_cols), files))
+    return concat_tables(tables)
+
+
+def concat_tables(tables):
+    """
+    Concatenate tables with the same columns, combining the categories of categorical columns.
+
+    :param tables: the DataFrames to concatenate, which are not modified
+    :return: the concatenated DataFrame, in the column order of the first table
+    """
+    columns = {}
+    for col in tables[0].columns:
+        parts = [table[col] for table in tables]
+        if any(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            parts = [part.astype("category") for part in parts]
+            if len({part.cat.categories.dtype for part in parts}) > 1:
+                parts = _common_categories(parts)
+            columns[col] = pd.api.types.union_categoricals(parts, sort_categories=True)
+        else:
+            columns[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def _common_categories(parts):
+    # Numeric IDs are given one numeric type, e.g. float when a table has a missing ID as the single-file loader
+    # does, and are only combined as text if other tables hold text IDs. Tables without IDs fit either.
+    numeric = [not len(part.cat.categories) or pd.api.types.is_numeric_dtype(part.cat.categories)
+               for part in parts]
+    numeric_dtypes = [part.cat.categories.dtype for part, is_numeric in zip(parts, numeric)
+                      if is_numeric and len(part.cat.categories)]
+    if numeric_dtypes:
+        dtype = np.result_type(*numeric_dtypes)
+        parts = [part.cat.rename_categories(part.cat.categories.astype(dtype)) if is_numeric else part
+                 for part, is_numeric in zip(parts, numeric)]
+    if not all(numeric):
+        parts = [part.cat.rename_categories(part.cat.categories.astype(str)) for part in parts]
+    return parts
+
+
+def iter_csv_chunks(file, chunksize=100_000):
+    """Lazily load a CSV file as a sequence of pandas DataFrames of at most chunksize rows."""
+    _rewind(file)
+    try:
+        reader = pd.read_csv(file, sep='\t', chunksize=chunksize)
+        for chunk in reader:
+            yield chunk
+    except Exception as e:
+        raise ValueError(f"Failed to read CSV: {e}")
+
+
+def _check_common_columns(files, headers):
+    columns = headers[0]
+    errors = []
+    for i, (file, header) in enumerate(zip(files[1:], headers[1:]), start=1):
+        missing = [col for col in columns if col not in header]
+        extra = [col for col in header if col not in columns]
+        problems = ([f"is missing columns {missing}"] if missing else []) + \
+            ([f"has extra columns {extra}"] if extra else [])
+        if problems:
+            errors.append(f"{_file_name(file, i)} {' and '.join(problems)}")
+    if errors:
+        raise ValueError(
+            f"The files do not have the same columns as {_file_name(files[0], 0)}:\n" + "\n".join(errors))
+    return columns
+
+
+def _numeric_categories(column):
+    # Categorical columns are parsed as strings, so IDs the untyped loader reads as numbers are turned back into
+    # numbers, ordered by value rather than as text ("2" before "10")
+    categories = column.cat.categories
+    if not len(categories) or pd.api.types.is_numeric_dtype(categories):
+        return column
+    try:
+        numbers = pd.to_numeric(categories).to_numpy()
+    except (ValueError, TypeError):
+        return column
+    codes = column.cat.codes.to_numpy()
+    if (codes < 0).any():
+        # As in the untyped table, integer columns with missing values hold floats
+        numbers = numbers.astype(float)
+        values = np.where(codes >= 0, numbers[codes], np.nan)
+    else:
+        values = numbers[codes]
+    return pd.Series(pd.Categorical(values), index=column.index, name=column.name)
+
+
+def _compact_integers(column):
+    # Narrower types save little more and could overflow if the counts are added to, so 32 bits is the smallest
+    dtype = np.uint32 if (column >= 0).all() else np.int32
+    limits = np.iinfo(dtype)
+    if column.min() >= limits.min and column.max() <= limits.max:
+        return column.astype(dtype)
+    return column
+
+
+def _fast_engine():
+    return "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+
+
+def _rewind(file):
+    # Uploaded files are read more than once across a page run
+    if hasattr(file, "seek"):
+        file.seek(0)
+
+
+def _file_name(file, position):
+    # Uploaded files have a name, other file-like objects are named by their position
+    name = file if isinstance(file, str) else getattr(file, "name", None)
+    return str(name) if name else f"file {position + 1}"
+
+
+def _join_csv_bytes(files):
+    # The contents of the files, keeping only the header of the first
+    parts = []
+    for i, file in enumerate(files):
+        if hasattr(file, "read"):
+            _rewind(file)
+            data = file.read()
+            data = data.encode() if isinstance(data, str) else data
+        else:
+            with open(file, "rb") as f:
+                data = f.read()
+        if i > 0:
+            data = data[data.find(b"\n") + 1:] if b"\n" in data else b""
+        if data and not data.endswith(b"\n"):
+            data += b"\n"
+        parts.append(data)
+    return b"".join(parts)
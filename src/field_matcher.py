@@ -1,10 +1,16 @@
-from fuzzywuzzy import process
+from fuzzywuzzy import fuzz, process, utils
 from collections import Counter
+import numpy as np
 import pandas as pd
-import streamlit as st
+from src.instrumentation import instrumented
 
+# Minimum fuzzy score (0-100) for a column to be matched to a schema field, below which the field is left unmatched
+DEFAULT_SCORE_THRESHOLD = 60
 
-def auto_match_fields(field_names, target_schema, method="fuzzy", api_key=None):
+
+@instrumented("auto_match_fields")
+def auto_match_fields(field_names, target_schema, method="fuzzy", api_key=None, backend=None,
+                      score_threshold=DEFAULT_SCORE_THRESHOLD):
     """
     Matches column names to a target schema using fuzzy matching or AI.
 
@@ -12,93 +18,174 @@ def auto_match_fields(field_names, target_schema, method="fuzzy", api_key=None):
         field_names (list): List of column names to be matched.
         target_schema (list): List of standard schema fields to match against.
         method (str): Matching method, either "fuzzy" or "ai".
-        api_key (str, optional): OpenAI API key (required for AI matching).
+        api_key (str, optional): OpenAI API key (required for AI matching with OpenAI).
+        backend (MatcherBackend, optional): The backend to use for AI matching, e.g. the local stand-in.
+        score_threshold (int): Minimum score (0-100) for a field name to be matched by fuzzy matching.
 
     Returns:
-        dict: A dictionary mapping each field name to the best-matched schema field.
+        dict: A dictionary mapping each schema field to the best-matched field name. Schema fields
+        without a good enough match are left out.
+        list: A list of unused field names that could not be matched.
     """
     if method == "fuzzy":
-        return fuzzy_match_fields(field_names, target_schema)
-    # TODO: Make the AI work
+        return fuzzy_match_fields(field_names, target_schema, score_threshold)
     elif method == "ai":
-        if not api_key:
-            raise ValueError("API key is required for AI-based matching.")
-        return ai_match_fields(field_names, target_schema, api_key)
+        return ai_match_fields(field_names, target_schema, api_key, backend)
     else:
         raise ValueError("Invalid method. Choose 'fuzzy' or 'ai'.")
 
 
-def fuzzy_match_fields(field_names, target_schema):
+def fuzzy_match_fields(field_names, target_schema, score_threshold=DEFAULT_SCORE_THRESHOLD):
     """
     Matches field names to the target schema using fuzzy matching, ensuring 
     that each target schema field is only matched to one field name.
 
+    The similarity of every field name to every schema field is scored once, and the
+    one-to-one assignment maximising the total score is chosen, so the result does not
+    depend on the order of the field names. Pairs scoring below the threshold are never
+    matched, so a schema field is left unmatched rather than given an unrelated column.
+
     Args:
         field_names (list): List of column names to be matched.
         target_schema (list): List of standard schema fields to match against.
+        score_threshold (int): Minimum score (0-100) for a field name to be matched.
 
     Returns:
-        dict: A dictionary mapping each field name to the best-matched schema field.
+        dict: A dictionary mapping each schema field to the best-matched field name.
         list: A list of unused field names that could not be matched.
     """
+    scores = fuzzy_score_matrix(field_names, target_schema)
+    # Pairs below the threshold add nothing to the total, so they cannot take a column from a better pair
+    assignment = optimal_assignment(np.where(scores >= score_threshold, scores, 0))
+
     matches = {}
-    unused_field_names = []  # To store any unused field names
+    for schema_idx, field_idx in sorted(assignment.items()):
+        if scores[field_idx, schema_idx] >= score_threshold:
+            matches[target_schema[schema_idx]] = field_names[field_idx]
 
-    for field in field_names:
-        # TODO: change this so it's not dependent on order. Maximise across scores.
-        best_match = process.extractOne(field, target_schema)
-        best_match_field = best_match[0]
+    matched_fields = set(matches.values())
+    unused_field_names = [
+        field for field in field_names if field not in matched_fields]
+    return matches, unused_field_names
 
-        # Check if the best match has already been used
-        if best_match_field not in matches.keys():
-            matches[best_match_field] = field
-        else:
-            unused_field_names.append(field)
 
-    return matches, unused_field_names
+def fuzzy_score_matrix(field_names, target_schema):
+    """
+    Scores the similarity of every field name to every schema field.
 
+    Args:
+        field_names (list): List of column names to be matched.
+        target_schema (list): List of standard schema fields to match against.
 
-def ai_match_fields(field_names, target_schema, api_key):
+    Returns:
+        numpy.ndarray: A matrix of fuzzy match scores (0-100) with a row for each
+        field name and a column for each schema field.
+    """
+    # Preprocess each string once, and score each distinct field name against all schema fields in one call
+    processed_schema = dict(enumerate(
+        utils.full_process(field, force_ascii=True) for field in target_schema))
+    field_codes, processed_fields = pd.factorize(np.asarray(
+        [utils.full_process(field, force_ascii=True) for field in field_names], dtype=object))
+    unique_scores = np.zeros((len(processed_fields), len(target_schema)))
+    for i, field in enumerate(processed_fields):
+        # Names without any letters or digits score 0 against everything
+        if not field:
+            continue
+        for _, score, j in process.extractWithoutOrder(field, processed_schema, processor=None,
+                                                       scorer=_prescored_wratio):
+            unique_scores[i, j] = score
+    return unique_scores[field_codes]
+
+
+def _prescored_wratio(field, schema_field):
+    # Both strings have already been processed
+    return fuzz.WRatio(field, schema_field, full_process=False)
+
+
+def optimal_assignment(scores):
+    """
+    Finds the one-to-one assignment of rows to columns that maximises the total score,
+    using the Hungarian algorithm.
+
+    Args:
+        scores (numpy.ndarray): A matrix of scores.
+
+    Returns:
+        dict: A dictionary mapping column indices to their assigned row indices. Only
+        min(rows, columns) columns are assigned.
+    """
+    n_rows, n_cols = scores.shape
+    if n_rows == 0 or n_cols == 0:
+        return {}
+    # Assign each of the fewer columns to one of the rows
+    cost = -np.asarray(scores, dtype=float).T
+    transposed = n_cols > n_rows
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    # Potentials and matching are 1-indexed, with index 0 as the unmatched sentinel
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        min_v = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while match[j0] != 0:
+            used[j0] = True
+            reduced = cost[match[j0] - 1] - u[match[j0]] - v[1:]
+            free = ~used[1:]
+            improved = free & (reduced < min_v[1:])
+            min_v[1:][improved] = reduced[improved]
+            way[1:][improved] = j0
+            candidates = np.where(free, min_v[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            used_cols = np.flatnonzero(used)
+            u[match[used_cols]] += delta
+            v[used_cols] -= delta
+            min_v[1:][free] -= delta
+            j0 = j1
+        # Follow the augmenting path back to the start
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    assignment = {}
+    for j in range(1, m + 1):
+        if match[j]:
+            row, col = match[j] - 1, j - 1
+            if transposed:
+                row, col = col, row
+            assignment[row] = col
+    return assignment
+
+
+def ai_match_fields(field_names, target_schema, api_key=None, backend=None):
     """
     Matches field names to the target schema using AI.
 
+    Replies are cached by the columns, the schema and the model, so the same columns are only sent once.
+
     Args:
         field_names (list): List of column names to be matched.
         target_schema (list): List of standard schema fields to match against.
-        api_key (str): OpenAI API key.
+        api_key (str, optional): OpenAI API key, used if no backend is given.
+        backend (MatcherBackend, optional): The backend suggesting the matches, defaults to default_backend.
 
     Returns:
-        dict: A dictionary mapping each field name to the best-matched schema field.
+        dict: A dictionary mapping each schema field to the matched field name.
+        list: A list of unused field names that could not be matched.
     """
-    import openai
-
-    openai.api_key = api_key
-    system_message = (
-        "You are an assistant that helps map column names to a standard schema. "
-        "Given a list of column names and a target schema, match each column to the most relevant schema field."
-    )
-    user_message = (
-        f"Columns: {field_names}\n"
-        f"Target Schema: {target_schema}\n\n"
-        "Provide the result as a JSON object where each column name is a key, "
-        "and the value is the most relevant field from the schema."
-    )
-
-    try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message},
-            ],
-            max_tokens=3000,
-            temperature=0.3,
-        )
-        # Extract and evaluate the JSON response
-        matches = eval(response['choices'][0]['message']['content'].strip())
-        return matches
-    except Exception as e:
-        raise RuntimeError(f"AI matching failed: {e}")
+    from src import ai_matcher
+
+    if backend is None:
+        backend = ai_matcher.default_backend(api_key)
+    return ai_matcher.ai_match_fields(field_names, target_schema, backend)
 
 
 def check_for_duplicates(field_mapping):
@@ -122,7 +209,10 @@ def check_for_duplicates(field_mapping):
     return True
 
 
-def interactive_field_mapping(field_mapping, df_columns):
+def interactive_field_mapping(field_mapping, df_columns, target_schema=None):
+    # Imported here so the matching functions can be used without streamlit
+    import streamlit as st
+
     updated_mapping = {}
 
     for field, suggested_match in field_mapping.items():
@@ -142,6 +232,17 @@ def interactive_field_mapping(field_mapping, df_columns):
                     suggested_match) if suggested_match else 0
             )
 
+    # Schema fields without a good enough match start empty rather than on an unrelated column
+    for field in target_schema or []:
+        if field not in field_mapping:
+            selected = st.selectbox(
+                f"Select match for {field}",
+                options=df_columns,
+                index=None
+            )
+            if selected is not None:
+                updated_mapping[field] = selected
+
     return updated_mapping
 
 
@@ -24,3 +24,48 @@ def render_header():
         # Add title and subtitle
         st.title("PMO File Builder")
         st.markdown("**Streamlined Workflow for Generating PMO Files**")
+
+
+def render_profile_report(report):
+    """
+    Show the stages recorded by a conversion profile as a table.
+    """
+    import pandas as pd
+
+    st.write(f"Conversion took {report.total_seconds:.2f} seconds:")
+    stages = pd.DataFrame(report.to_records())
+    # Indent nested stages under the stage that called them
+    stages["stage"] = [" " * depth + name for depth,
+                       name in zip(stages["depth"], stages["stage"])]
+    stages = stages.drop(columns="depth")
+    if not report.track_memory:
+        stages = stages.drop(columns="peak_memory_bytes")
+    st.dataframe(stages, hide_index=True)
+
+
+def render_violations(violations):
+    """
+    Show the problems found by validating an input table.
+    """
+    import pandas as pd
+    from src.validation import violations_to_records
+
+    st.error(f"Found {len(violations)} problem(s) in the table, fix them and transform again:")
+    st.dataframe(pd.DataFrame(violations_to_records(violations)).drop(columns="examples"), hide_index=True)
+
+
+def render_job_progress(job, poll_seconds=0.5):
+    """
+    Show the progress of a background job with a button to cancel it, rerunning the page when it finishes.
+    """
+    @st.fragment(run_every=poll_seconds)
+    def poll():
+        if job.finished:
+            st.rerun()
+        text = f"{job.done} of {job.total} {job.unit} converted" if job.total else "Loading and checking the table"
+        st.progress(job.fraction, text=text)
+        if st.button("Cancel", key=f"cancel_{job.key}",
+                     help="Stops the conversion for every session waiting on the same inputs."):
+            job.cancel()
+
+    poll()
@@ -0,0 +1,185 @@
+import hashlib
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from src.instrumentation import instrumented
+from src.transformer import RepresentativeSequenceIndex, create_detected_microhaplotype_dict, create_representative_microhaplotype_table, microhaplotype_table_to_pmo_dict
+
+
+@dataclass
+class MhapConversion:
+    """The PMO component converted from a microhaplotype table, with the hashes needed to update it."""
+    bioinfo_id: str
+    columns: list
+    sample_hashes: dict
+    pmo_data: dict
+    rebuilt_samples: list = field(default_factory=list)
+    removed_samples: list = field(default_factory=list)
+    added_sequences: int = 0
+
+
+def transform_mhap_info_incremental(df, bioinfo_id, field_mapping, additional_hap_detected_cols=None, previous=None):
+    """Convert or update the conversion of a microhaplotype table based on the provided field mapping."""
+    return update_microhaplotype_pmo_dict(
+        df, bioinfo_id, previous, sampleID_col=field_mapping["sampleID"], locus_col=field_mapping['locus'], mhap_col=field_mapping['asv'], reads_col=field_mapping['reads'], additional_hap_detected_cols=additional_hap_detected_cols)
+
+
+@instrumented("update_microhaplotype_pmo_dict")
+def update_microhaplotype_pmo_dict(
+    contents: pd.DataFrame,
+    bioinfo_id: str,
+    previous: MhapConversion | None = None,
+    sampleID_col: str = 'sampleID',
+    locus_col: str = 'locus',
+    mhap_col: str = 'asv',
+    reads_col: str = 'reads',
+    additional_hap_detected_cols: list | None = None
+):
+    """
+    Convert a dataframe of microhaplotype calls as microhaplotype_table_to_pmo_dict does, rebuilding only the
+    samples whose rows changed since a previous conversion of the same bioinformatics run.
+
+    Samples are compared by a hash of their rows. The experiment_samples of new and changed samples are rebuilt,
+    those of samples no longer in the table are removed and the rest are reused from the previous conversion.
+    Sequences not seen before are added to the representative microhaplotype sequences with new IDs, while
+    existing sequences keep their IDs, even if no sample calls them any more, so the IDs of unchanged samples
+    stay valid. The previous conversion is not modified.
+
+    The table is converted in full if there is no previous conversion, or if it was of another run or of other
+    columns.
+
+    :param contents: The dataframe containing microhaplotype calls
+    :param bioinfo_id: the bioinformatics ID of the microhaplotype table
+    :param previous: the MhapConversion returned for the previous version of the table, or None
+    :param sampleID_col: the name of the column containing the sample IDs
+    :param locus_col: the name of the column containing the locus IDs
+    :param mhap_col: the name of the column containing the microhaplotype sequence
+    :param reads_col: the name of the column containing the reads counts
+    :param additional_hap_detected_cols: optional additional columns to add to the microhaplotype detected dictionary
+    :return: a MhapConversion holding the PMO component, the sample hashes and what was rebuilt
+    """
+    columns = [sampleID_col, locus_col, mhap_col, reads_col] + \
+        list(additional_hap_detected_cols or [])
+    sample_hashes = sample_content_hashes(contents, sampleID_col, columns)
+
+    if previous is None or previous.bioinfo_id != bioinfo_id or previous.columns != columns:
+        pmo_data = microhaplotype_table_to_pmo_dict(
+            contents, bioinfo_id, sampleID_col, locus_col, mhap_col, reads_col, additional_hap_detected_cols)
+        targets = pmo_data["representative_microhaplotype_sequences"][bioinfo_id]["targets"]
+        return MhapConversion(bioinfo_id, columns, sample_hashes, pmo_data,
+                              rebuilt_samples=list(
+                                  pmo_data["microhaplotypes_detected"][bioinfo_id]["experiment_samples"]),
+                              added_sequences=sum(len(target["seqs"]) for target in targets.values()))
+
+    changed = {sample_id for sample_id, digest in sample_hashes.items()
+               if previous.sample_hashes.get(sample_id) != digest}
+    removed = [sample_id for sample_id in previous.sample_hashes
+               if sample_id not in sample_hashes]
+    # Rows without a sample ID are not in any sample, but their sequences are representative sequences
+    samples = contents[sampleID_col]
+    rows = contents[samples.isin(list(changed)).to_numpy() | samples.isna().to_numpy()]
+
+    previous_detected = previous.pmo_data["microhaplotypes_detected"][bioinfo_id]
+    previous_representative = previous.pmo_data["representative_microhaplotype_sequences"][bioinfo_id]
+    targets, added_sequences = extend_representative_microhaplotype_dict(
+        previous_representative["targets"], rows, locus_col, mhap_col)
+    touched_loci = rows[locus_col].dropna().unique().tolist()
+    rebuilt = create_detected_microhaplotype_dict(
+        rows, sampleID_col, locus_col, mhap_col, reads_col,
+        {locus: targets[locus] for locus in touched_loci}, additional_hap_detected_cols)
+
+    # Samples are kept in the sorted order of a full conversion
+    previous_samples = previous_detected["experiment_samples"]
+    experiment_samples = {}
+    for sample_id in sample_hashes:
+        sample = rebuilt.get(sample_id) if sample_id in changed else previous_samples.get(sample_id)
+        if sample is not None:
+            experiment_samples[sample_id] = sample
+
+    pmo_data = {
+        **previous.pmo_data,
+        "microhaplotypes_detected": {
+            **previous.pmo_data["microhaplotypes_detected"],
+            bioinfo_id: {**previous_detected, "experiment_samples": experiment_samples}},
+        "representative_microhaplotype_sequences": {
+            **previous.pmo_data["representative_microhaplotype_sequences"],
+            bioinfo_id: {**previous_representative, "targets": targets}},
+    }
+    return MhapConversion(bioinfo_id, columns, sample_hashes, pmo_data,
+                          rebuilt_samples=[sample_id for sample_id in sample_hashes if sample_id in changed],
+                          removed_samples=removed, added_sequences=added_sequences)
+
+
+def sample_content_hashes(contents, sampleID_col, columns):
+    """
+    Hash the rows of each sample of a microhaplotype table.
+
+    Rows are hashed by value with pandas, so the hashes do not depend on whether a column is categorical or on
+    the width of its integer type, and the row hashes of each sample are combined in table order.
+
+    :param contents: The dataframe containing microhaplotype calls
+    :param sampleID_col: the name of the column containing the sample IDs
+    :param columns: the columns whose values are hashed
+    :return: a dict of sample ID to hex digest, in sorted sample order, without rows missing a sample ID
+    """
+    row_hashes = pd.util.hash_pandas_object(
+        contents[columns], index=False).to_numpy()
+    sample_codes, sample_ids = pd.factorize(contents[sampleID_col], sort=True)
+    order = np.argsort(sample_codes, kind="stable")
+    order = order[sample_codes[order] >= 0]
+    offsets = np.concatenate(
+        ([0], np.cumsum(np.bincount(sample_codes[order], minlength=len(sample_ids)))))
+    ordered_hashes = row_hashes[order]
+    return {
+        sample_id: hashlib.blake2b(ordered_hashes[start:end].tobytes(), digest_size=16).hexdigest()
+        for sample_id, start, end in zip(sample_ids.tolist(), offsets[:-1].tolist(), offsets[1:].tolist())
+    }
+
+
+def extend_representative_microhaplotype_dict(representative_microhaplotype_dict, microhaplotype_table, locus_col,
+                                              mhap_col):
+    """
+    Add the sequences of a calls table missing from a representative microhaplotype dictionary.
+
+    New sequences are numbered after the existing sequences of their locus, in order of first appearance, and the
+    IDs of existing sequences are unchanged. Loci are kept in sorted order.
+
+    :param representative_microhaplotype_dict: Dictionary of representative microhaplotypes, which is not modified.
+    :param microhaplotype_table: The parsed microhaplotype calls table.
+    :param locus_col: The name of the column containing the locus IDs.
+    :param mhap_col: The name of the column containing the microhaplotype sequence.
+    :return: The extended dictionary and the number of sequences added.
+    """
+    unique_table = create_representative_microhaplotype_table(
+        microhaplotype_table, locus_col, mhap_col)
+    loci, seqs = unique_table[locus_col].tolist(), unique_table[mhap_col].tolist()
+
+    # Only the existing sequences of the loci of the table are interned to look the table's sequences up
+    known_loci, known_seqs = [], []
+    for locus in dict.fromkeys(loci):
+        for microhaplotype in representative_microhaplotype_dict.get(locus, {"seqs": {}})["seqs"].values():
+            known_loci.append(locus)
+            known_seqs.append(microhaplotype["seq"])
+    is_known = RepresentativeSequenceIndex(known_loci, known_seqs).find(loci, seqs) >= 0
+
+    targets = dict(representative_microhaplotype_dict)
+    added = 0
+    for locus, seq, known in zip(loci, seqs, is_known.tolist()):
+        if known:
+            continue
+        # Copy the target the first time a sequence is added to it
+        if locus not in targets or targets[locus] is representative_microhaplotype_dict.get(locus):
+            target = targets.get(locus, {"seqs": {}})
+            targets[locus] = {**target, "seqs": dict(target["seqs"])}
+        seqs_of_locus = targets[locus]["seqs"]
+        idx = len(seqs_of_locus)
+        while f"{locus}.{idx}" in seqs_of_locus:
+            idx += 1
+        microhaplotype_id = f"{locus}.{idx}"
+        seqs_of_locus[microhaplotype_id] = {
+            "microhaplotype_id": microhaplotype_id, "seq": seq}
+        added += 1
+
+    if any(locus not in representative_microhaplotype_dict for locus in targets):
+        targets = {locus: targets[locus] for locus in sorted(targets)}
+    return targets, added
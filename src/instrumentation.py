@@ -0,0 +1,149 @@
+import contextvars
+import functools
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+# The report being collected in the current context, None when profiling is disabled
+_active_report = contextvars.ContextVar("active_report", default=None)
+# tracemalloc and its peak are shared by the whole process, so profiles tracking memory run one at a time, e.g.
+# when conversion jobs of several sessions run in background threads together. Reentrant so profiles can be nested
+_memory_profile_lock = threading.RLock()
+# Tracing is started by the first profile tracking memory and stopped by the last, unless it was already on
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_owns_tracing = False
+
+
+@dataclass
+class StageTiming:
+    """Timing of one stage of a conversion."""
+    stage: str
+    seconds: float
+    rows: int | None = None
+    peak_memory_bytes: int | None = None
+    depth: int = 0
+
+
+@dataclass
+class ProfileReport:
+    """The stages recorded while profiling, in the order they finished."""
+    track_memory: bool = False
+    stages: list = field(default_factory=list)
+    _open_peaks: list = field(default_factory=list, repr=False)
+
+    @property
+    def total_seconds(self):
+        return sum(s.seconds for s in self.stages if s.depth == 0)
+
+    def to_records(self):
+        """Get the stages as a list of dictionaries, e.g. to build a table."""
+        return [asdict(s) for s in self.stages]
+
+
+@contextmanager
+def profile(track_memory=False):
+    """
+    Record the stages run inside the block.
+
+    Profiles can be nested and can run in several threads at once, e.g. in conversion jobs. Profiles tracking
+    memory wait for each other, since tracemalloc and its peak are global to the process. tracemalloc is started
+    by the outermost of them and stopped when it ends, unless it was already tracing before.
+
+    :param track_memory: whether to measure the peak memory of each stage with tracemalloc, which slows
+        the conversion down
+    :return: a ProfileReport that is filled in as stages finish
+    """
+    report = ProfileReport(track_memory=track_memory)
+    if track_memory:
+        _memory_profile_lock.acquire()
+        _start_tracing()
+    token = _active_report.set(report)
+    try:
+        yield report
+    finally:
+        _active_report.reset(token)
+        if track_memory:
+            _stop_tracing()
+            _memory_profile_lock.release()
+
+
+def _start_tracing():
+    global _tracing_users, _owns_tracing
+    with _tracing_lock:
+        if _tracing_users == 0:
+            _owns_tracing = not tracemalloc.is_tracing()
+            if _owns_tracing:
+                tracemalloc.start()
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _owns_tracing:
+            tracemalloc.stop()
+
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    Record the block as a stage of the active profile. Does nothing when not profiling.
+
+    :return: the StageTiming being recorded, or None when not profiling, so the block can set its rows
+    """
+    report = _active_report.get()
+    if report is None:
+        yield None
+        return
+
+    depth = len(report._open_peaks)
+    start_memory = None
+    if report.track_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        # Keep the enclosing stage's peak so far before measuring this stage from here
+        if report._open_peaks:
+            report._open_peaks[-1] = max(report._open_peaks[-1], peak)
+        tracemalloc.reset_peak()
+        start_memory = current
+    report._open_peaks.append(0)
+    timing = StageTiming(name, 0.0, rows, None, depth)
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing.seconds = time.perf_counter() - start
+        inner_peak = report._open_peaks.pop()
+        if report.track_memory:
+            peak = max(tracemalloc.get_traced_memory()[1], inner_peak)
+            timing.peak_memory_bytes = peak - start_memory
+            if report._open_peaks:
+                report._open_peaks[-1] = max(report._open_peaks[-1], peak)
+        report.stages.append(timing)
+
+
+def instrumented(name, count_rows=True):
+    """
+    Decorate a function to record its calls as a stage. The rows are those of the first argument if it is
+    a table or list, otherwise those of the returned table.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active_report.get() is None:
+                return func(*args, **kwargs)
+            with stage(name) as timing:
+                result = func(*args, **kwargs)
+                if not count_rows:
+                    return result
+                first = args[0] if args else None
+                if isinstance(first, list) or hasattr(first, "shape"):
+                    timing.rows = len(first)
+                elif hasattr(result, "shape"):
+                    timing.rows = len(result)
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from src.progress import reporting_progress
+
+DEFAULT_MAX_WORKERS = 2
+# Number of finished jobs kept so their results can be collected, e.g. after the page was rerun
+MAX_FINISHED_JOBS = 8
+
+# The job queue of the app, created by get_conversion_jobs on first use
+_conversion_jobs = None
+_conversion_jobs_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been cancelled."""
+
+
+@dataclass
+class Job:
+    """A function running in the background, with the progress it has reported."""
+    key: str
+    done: int = 0
+    total: int | None = None
+    unit: str = ""
+    future: object = field(default=None, repr=False)
+    _cancel_requested: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self):
+        return self.future is not None and self.future.done()
+
+    @property
+    def cancelled(self):
+        if not self._cancel_requested.is_set() or not self.finished:
+            return False
+        return self.future.cancelled() or isinstance(self.future.exception(), JobCancelled)
+
+    @property
+    def failed(self):
+        return self.finished and not self.cancelled and self.future.exception() is not None
+
+    @property
+    def fraction(self):
+        """The fraction of the work done, between 0 and 1."""
+        if self.finished:
+            return 1.0
+        return min(self.done / self.total, 1.0) if self.total else 0.0
+
+    @property
+    def cancel_requested(self):
+        """Whether the job has been asked to stop, even if it is still running until its next progress report."""
+        return self._cancel_requested.is_set()
+
+    def cancel(self):
+        """
+        Ask the job to stop at its next progress report, or not to start if it is still queued. The job is stopped
+        for everyone who submitted it, not only the caller.
+        """
+        self._cancel_requested.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def report(self, done, total, unit=""):
+        """Record the progress of the job, raising JobCancelled if it has been cancelled so the work stops."""
+        if self._cancel_requested.is_set():
+            raise JobCancelled(f"Job {self.key} was cancelled")
+        self.done, self.total, self.unit = done, total, unit
+
+    def result(self, timeout=None):
+        """Wait for the job and get its result, raising the exception it failed with."""
+        try:
+            return self.future.result(timeout)
+        except CancelledError:
+            raise JobCancelled(f"Job {self.key} was cancelled")
+
+
+class JobQueue:
+    """
+    A pool of background threads running jobs keyed by their inputs.
+
+    Submitting a job with the key of a running or finished job returns that job rather than running it again,
+    unless it failed or was asked to stop. A job is shared by everyone who submitted it, so cancelling it stops
+    it for all of them, and they have to submit it again to get its result. Jobs run in threads rather than processes, so their progress can be read
+    and they can be cancelled while they run, and they share the in-memory table cache.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_finished=MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="pmo-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) in the background as the job key.
+
+        :param key: the key of the job, e.g. from job_key
+        :param func: the function to run, which may call src.progress.report_progress
+        :return: the Job
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.cancel_requested and not job.failed:
+                self._jobs.move_to_end(key)
+                return job
+            job = Job(key)
+            self._jobs[key] = job
+            self._evict_finished()
+        job.future = self._executor.submit(_run_job, job, func, args, kwargs)
+        return job
+
+    def get(self, key):
+        """Get the job stored under key, or None."""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def cancel(self, key):
+        """Cancel the job stored under key, if there is one."""
+        job = self.get(key)
+        if job is not None:
+            job.cancel()
+
+    def _evict_finished(self):
+        finished = [key for key, job in self._jobs.items() if job.finished]
+        for key in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[key]
+
+
+def _run_job(job, func, args, kwargs):
+    if job._cancel_requested.is_set():
+        raise JobCancelled(f"Job {job.key} was cancelled")
+    with reporting_progress(job.report):
+        return func(*args, **kwargs)
+
+
+def job_key(*parts):
+    """Create the key of a job from its inputs, e.g. the hash of the input file, the field mapping and the ID."""
+    signature = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(signature.encode(), digest_size=20).hexdigest()
+
+
+def get_conversion_jobs():
+    """
+    Get the job queue shared by all sessions of the app, so the same conversion submitted twice is only run once.
+    The queue and its threads are created on first use.
+    """
+    global _conversion_jobs
+    with _conversion_jobs_lock:
+        if _conversion_jobs is None:
+            _conversion_jobs = JobQueue(max_workers=int(
+                os.environ.get("PMO_JOB_WORKERS", DEFAULT_MAX_WORKERS)))
+        return _conversion_jobs
+
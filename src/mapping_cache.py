@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.getcwd(), "mapping_cache", "mappings.json")
+# Mappings kept, the oldest saved are evicted first. A mapping is saved again each time a conversion uses it,
+# but not when it is only read, which happens on every rerun of a page.
+DEFAULT_MAX_ENTRIES = 200
+
+
+def mapping_cache_key(field_names, target_schema, method):
+    """
+    Creates the cache key of a header signature.
+
+    Args:
+        field_names (list): List of column names to be matched.
+        target_schema (list): List of standard schema fields to match against.
+        method (str): Matching method, either "fuzzy" or "ai".
+
+    Returns:
+        str: A hash of the column names, the target schema and the method.
+    """
+    signature = json.dumps([list(field_names), list(target_schema), method])
+    return hashlib.sha256(signature.encode()).hexdigest()
+
+
+def get_cached_mapping(field_names, target_schema, method, cache_path=DEFAULT_CACHE_PATH):
+    """
+    Gets the stored mapping for a header signature. Only reads the cache file, so it is cheap to call on
+    every rerun of a page.
+
+    Args:
+        field_names (list): List of column names to be matched.
+        target_schema (list): List of standard schema fields to match against.
+        method (str): Matching method, either "fuzzy" or "ai".
+        cache_path (str): Path of the cache file.
+
+    Returns:
+        tuple: The field mapping and the list of unused field names, or None if there is no stored mapping.
+    """
+    entries = _load_entries(cache_path)
+    entry = entries.get(mapping_cache_key(field_names, target_schema, method))
+    if entry is None:
+        return None
+    return entry["mapping"], entry["unused_field_names"]
+
+
+def save_mapping(field_names, target_schema, method, field_mapping, cache_path=DEFAULT_CACHE_PATH,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    Stores the mapping accepted for a header signature, replacing any previous mapping. The oldest saved
+    entries are evicted when there are more than max_entries, whether or not they have been read since.
+
+    Args:
+        field_names (list): List of column names that were matched.
+        target_schema (list): List of standard schema fields they were matched against.
+        method (str): Matching method, either "fuzzy" or "ai".
+        field_mapping (dict): The mapping of schema fields to column names to store.
+        cache_path (str): Path of the cache file.
+        max_entries (int): Maximum number of mappings to keep.
+    """
+    entries = _load_entries(cache_path)
+    mapped_fields = set(field_mapping.values())
+    entries[mapping_cache_key(field_names, target_schema, method)] = {
+        "field_names": list(field_names),
+        "target_schema": list(target_schema),
+        "method": method,
+        "mapping": dict(field_mapping),
+        "unused_field_names": [field for field in field_names if field not in mapped_fields],
+        "saved_at": time.time(),
+    }
+    if len(entries) > max_entries:
+        oldest_saved = sorted(entries, key=lambda key: _saved_at(entries[key]))
+        for key in oldest_saved[:len(entries) - max_entries]:
+            del entries[key]
+    _save_entries(entries, cache_path)
+
+
+def invalidate_mapping(field_names, target_schema, method, cache_path=DEFAULT_CACHE_PATH):
+    """
+    Removes the stored mapping for a header signature.
+
+    Returns:
+        bool: True if a mapping was removed.
+    """
+    entries = _load_entries(cache_path)
+    removed = entries.pop(mapping_cache_key(
+        field_names, target_schema, method), None)
+    if removed is not None:
+        _save_entries(entries, cache_path)
+    return removed is not None
+
+
+def clear_mapping_cache(cache_path=DEFAULT_CACHE_PATH):
+    """Removes all stored mappings."""
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+
+
+def cached_auto_match_fields(field_names, target_schema, method="fuzzy", api_key=None,
+                             cache_path=DEFAULT_CACHE_PATH):
+    """
+    Matches column names to a target schema, reusing the stored mapping of the same header signature
+    if there is one. A new match is not stored, the mapping is only saved with save_mapping once the user
+    has accepted it, e.g. when the data is transformed.
+
+    Args:
+        field_names (list): List of column names to be matched.
+        target_schema (list): List of standard schema fields to match against.
+        method (str): Matching method, either "fuzzy" or "ai".
+        api_key (str, optional): OpenAI API key (required for AI matching).
+        cache_path (str): Path of the cache file.
+
+    Returns:
+        dict: A dictionary mapping each schema field to the matched field name.
+        list: A list of unused field names.
+        bool: True if the mapping was taken from the cache.
+    """
+    cached = get_cached_mapping(
+        field_names, target_schema, method, cache_path)
+    if cached is not None:
+        return cached[0], cached[1], True
+
+    from src.field_matcher import auto_match_fields
+    field_mapping, unused_field_names = auto_match_fields(
+        field_names, target_schema, method=method, api_key=api_key)
+    return field_mapping, unused_field_names, False
+
+
+def _saved_at(entry):
+    # Caches written before the key was renamed store the time as last_used
+    return entry.get("saved_at", entry.get("last_used", 0))
+
+
+def _load_entries(cache_path):
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # A missing or unreadable cache is treated as empty
+        return {}
+
+
+def _save_entries(entries, cache_path):
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    # Write to a temporary file first so concurrent sessions never read a partial cache
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entries, f)
+    os.replace(tmp_path, cache_path)
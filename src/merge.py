@@ -0,0 +1,157 @@
+from array import array
+from src.compression import open_text_output
+from src.pmo_reader import read_pmo
+from src.pmo_writer import merge_pmo_components, write_member, write_object_end, write_object_start
+from src.sequence_store import SequenceStore
+
+MERGED_SECTIONS = ("panel_info", "microhaplotypes_detected",
+                   "representative_microhaplotype_sequences")
+
+
+def merge_pmo(panels, runs, output, representative_id, indent=4, compression=None, compression_level=None):
+    """
+    Merge panels and the microhaplotype information of many bioinformatics runs into a single PMO file.
+
+    The same sequence at the same locus is stored once in the merged representative microhaplotype sequences and
+    the haplotype IDs of every run are rewritten to the merged IDs, which are numbered in order of first appearance
+    across the runs. Runs are read and written one at a time, so only one run and the index of unique sequences are
+    held in memory, with the sequences interned in a SequenceStore.
+
+    :param panels: an iterable of panel components, as dictionaries or paths or streams of PMO JSON
+    :param runs: an iterable of microhaplotype components, as dictionaries or paths or streams of PMO JSON
+    :param output: the path or writable text stream to write the PMO to
+    :param representative_id: the ID of the merged representative microhaplotype sequences
+    :param indent: the number of spaces to indent by, or None for compact output
+    :param compression: "gzip", "zstd" or "none" to compress the file as it is written, defaults to the codec
+        implied by the suffix of the output path (.gz or .zst)
+    :param compression_level: the codec's compression level
+    :return: a dict of the number of runs, samples and unique representative sequences written
+    """
+    if hasattr(output, "write"):
+        return _merge_pmo(panels, runs, output, representative_id, indent)
+    with open_text_output(output, compression, compression_level) as f:
+        return _merge_pmo(panels, runs, f, representative_id, indent)
+
+
+def load_component(source):
+    """Load a PMO component from a dictionary, or a path or readable stream of JSON, which may be compressed."""
+    if isinstance(source, dict):
+        return source
+    return read_pmo(source)
+
+
+def _merge_pmo(panels, runs, out, representative_id, indent):
+    # Sections other than the merged ones are small and combined as write_pmo would
+    other_sections = {}
+    out.write("{")
+    panel_info = merge_pmo_components(
+        _split_sections(load_component(panel), other_sections) for panel in panels).get("panel_info", {})
+    if panel_info:
+        write_member(out, "panel_info", panel_info, 1, True, indent)
+
+    # Merged representative sequences, with the number of sequences of each locus and the number in the merged ID
+    # of each sequence, by handle
+    store = SequenceStore()
+    locus_counts = {}
+    merged_numbers = array("l")
+    run_ids = set()
+    n_samples = 0
+    write_object_start(out, "microhaplotypes_detected",
+                       1, not panel_info, indent)
+    for run in runs:
+        component = _split_sections(load_component(run), other_sections)
+        representative_sets = component.get(
+            "representative_microhaplotype_sequences", {})
+        for bioinfo_id, detected in component.get("microhaplotypes_detected", {}).items():
+            if bioinfo_id in run_ids:
+                raise ValueError(
+                    f"Bioinformatics run {bioinfo_id} is in more than one of the merged runs")
+            id_map = _register_representative_seqs(
+                _representative_set(representative_sets, bioinfo_id), store, locus_counts, merged_numbers)
+            detected = _rewrite_haplotype_ids(detected, id_map, bioinfo_id)
+            write_member(out, bioinfo_id, detected, 2, not run_ids, indent)
+            run_ids.add(bioinfo_id)
+            n_samples += len(detected.get("experiment_samples", {}))
+    write_object_end(out, 2, bool(run_ids), indent)
+
+    write_object_start(
+        out, "representative_microhaplotype_sequences", 1, False, indent)
+    write_object_start(out, representative_id, 2, True, indent)
+    write_member(out, "representative_microhaplotype_id",
+                 representative_id, 3, True, indent)
+    write_object_start(out, "targets", 3, False, indent)
+    # Sequences are unpacked one locus at a time as they are written
+    handles_by_locus = store.handles_by_locus()
+    for i, locus in enumerate(sorted(locus_counts)):
+        handles = handles_by_locus.get(locus, [])
+        target = {"seqs": {}}
+        for handle, seq in zip(handles, store.sequences(handles)):
+            microhaplotype_id = f"{locus}.{merged_numbers[handle]}"
+            target["seqs"][microhaplotype_id] = {"microhaplotype_id": microhaplotype_id, "seq": seq}
+        write_member(out, locus, target, 4, i == 0, indent)
+    write_object_end(out, 4, bool(locus_counts), indent)
+    write_object_end(out, 3, True, indent)
+    write_object_end(out, 2, True, indent)
+
+    for section, entries in other_sections.items():
+        write_member(out, section, entries, 1, False, indent)
+    write_object_end(out, 1, True, indent)
+    return {"runs": len(run_ids), "samples": n_samples,
+            "representative_sequences": len(store)}
+
+
+def _split_sections(component, other_sections):
+    # Move the sections that are not merged by this module into other_sections
+    for section, entries in component.items():
+        if section not in MERGED_SECTIONS:
+            other_sections.setdefault(section, {}).update(entries)
+    return component
+
+
+def _representative_set(representative_sets, bioinfo_id):
+    if bioinfo_id in representative_sets:
+        return representative_sets[bioinfo_id]
+    # A component merged before holds one set shared by all of its runs
+    if len(representative_sets) == 1:
+        return next(iter(representative_sets.values()))
+    raise ValueError(
+        f"No representative microhaplotype sequences found for bioinformatics run {bioinfo_id}")
+
+
+def _register_representative_seqs(representative_set, store, locus_counts, merged_numbers):
+    # Map the run's haplotype IDs to the merged IDs, adding the sequences not seen in earlier runs
+    loci, microhaplotype_ids, seqs = [], [], []
+    id_map = {}
+    for locus, target in representative_set.get("targets", {}).items():
+        locus_counts.setdefault(locus, 0)
+        id_map.setdefault(locus, {})
+        for microhaplotype_id, microhaplotype in target.get("seqs", {}).items():
+            loci.append(locus)
+            microhaplotype_ids.append(microhaplotype_id)
+            seqs.append(microhaplotype["seq"])
+    handles, is_new = store.intern_many(loci, seqs)
+    for locus, microhaplotype_id, handle, new in zip(loci, microhaplotype_ids, handles.tolist(), is_new.tolist()):
+        if new:
+            merged_numbers.append(locus_counts[locus])
+            locus_counts[locus] += 1
+        id_map[locus][microhaplotype_id] = f"{locus}.{merged_numbers[handle]}"
+    return id_map
+
+
+def _rewrite_haplotype_ids(detected, id_map, bioinfo_id):
+    # Components may be shared with the caller, so the rewritten entries are copies
+    experiment_samples = {}
+    for sample_id, sample in detected.get("experiment_samples", {}).items():
+        target_results = {}
+        for locus, target_result in sample.get("target_results", {}).items():
+            locus_map = id_map.get(locus, {})
+            microhaplotypes = {}
+            for haplotype_id, haplotype in target_result["microhaplotypes"].items():
+                if haplotype_id not in locus_map:
+                    raise ValueError(
+                        f"No representative sequence found for haplotype {haplotype_id} of run {bioinfo_id}")
+                merged_id = locus_map[haplotype_id]
+                microhaplotypes[merged_id] = {**haplotype, "haplotype_id": merged_id}
+            target_results[locus] = {**target_result, "microhaplotypes": microhaplotypes}
+        experiment_samples[sample_id] = {**sample, "target_results": target_results}
+    return {**detected, "experiment_samples": experiment_samples}
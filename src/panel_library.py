@@ -0,0 +1,148 @@
+import json
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from src.serializer import dumps
+
+DEFAULT_LIBRARY_DIR = os.path.join(os.getcwd(), "saved_panels")
+DEFAULT_DB_PATH = os.path.join(DEFAULT_LIBRARY_DIR, "panels.sqlite")
+COMPRESSION_LEVEL = 6
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS panels (
+    panel_id TEXT PRIMARY KEY,
+    genome_name TEXT,
+    genome_version TEXT,
+    target_count INTEGER NOT NULL,
+    created REAL NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS panels_by_created ON panels (created);
+"""
+
+
+def save_panel(panel_id, panel_data, db_path=DEFAULT_DB_PATH):
+    """
+    Stores a panel in the library, replacing any panel saved with the same ID.
+
+    Args:
+        panel_id (str): Identifier the panel is saved under.
+        panel_data (dict): The panel information, as returned by transform_panel_info.
+        db_path (str): Path of the library database.
+    """
+    body = dumps(panel_data).encode()
+    genome, targets = _summarise(panel_data)
+    with _connect(db_path) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO panels VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (panel_id, genome.get("name"), genome.get("version"), len(targets), time.time(), len(body),
+             zlib.compress(body, COMPRESSION_LEVEL)))
+
+
+def load_panel(panel_id, db_path=DEFAULT_DB_PATH):
+    """
+    Loads a panel from the library.
+
+    Returns:
+        dict: The panel information.
+
+    Raises:
+        KeyError: If no panel is saved under panel_id.
+    """
+    with _connect(db_path) as conn:
+        row = conn.execute(
+            "SELECT body FROM panels WHERE panel_id = ?", (panel_id,)).fetchone()
+    if row is None:
+        raise KeyError(f"No saved panel named {panel_id}")
+    return json.loads(zlib.decompress(row[0]))
+
+
+def list_panels(db_path=DEFAULT_DB_PATH):
+    """
+    Lists the saved panels, most recently saved first, without reading their bodies.
+
+    Returns:
+        list: A dictionary per panel with its panel_id, genome_name, genome_version, target_count,
+        created time and uncompressed size_bytes.
+    """
+    with _connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            "SELECT panel_id, genome_name, genome_version, target_count, created, size_bytes "
+            "FROM panels ORDER BY created DESC").fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_saved_panels(db_path=DEFAULT_DB_PATH):
+    """Gets the IDs of the saved panels, most recently saved first."""
+    return [panel["panel_id"] for panel in list_panels(db_path)]
+
+
+def delete_panel(panel_id, db_path=DEFAULT_DB_PATH):
+    """
+    Removes a panel from the library.
+
+    Returns:
+        bool: True if a panel was removed.
+    """
+    with _connect(db_path) as conn:
+        removed = conn.execute(
+            "DELETE FROM panels WHERE panel_id = ?", (panel_id,)).rowcount
+    return removed > 0
+
+
+def import_legacy_panels(legacy_dir, db_path=DEFAULT_DB_PATH):
+    """
+    Imports the panels saved as JSON files by older versions, skipping IDs already in the library.
+
+    Returns:
+        int: The number of panels imported.
+    """
+    saved = set(get_saved_panels(db_path))
+    imported = 0
+    for name in sorted(os.listdir(legacy_dir)):
+        if not name.endswith(".json"):
+            continue
+        panel_id = name[:-len(".json")]
+        if panel_id in saved:
+            continue
+        try:
+            with open(os.path.join(legacy_dir, name)) as f:
+                panel_data = json.load(f)
+            # Older versions stored the panel as an encoded JSON string
+            if isinstance(panel_data, str):
+                panel_data = json.loads(panel_data)
+        except (OSError, ValueError):
+            continue
+        save_panel(panel_id, panel_data, db_path)
+        imported += 1
+    return imported
+
+
+def _summarise(panel_data):
+    # A panel holds a single entry under panel_info
+    panels = panel_data.get("panel_info", {}) if isinstance(
+        panel_data, dict) else {}
+    panel = next(iter(panels.values()), {})
+    return panel.get("target_genome") or {}, panel.get("targets") or {}
+
+
+@contextmanager
+def _connect(db_path):
+    is_new = not os.path.exists(db_path)
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        if is_new:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # The JSON files of older versions sit next to a newly created library
+            import_legacy_panels(os.path.dirname(db_path) or ".", db_path)
+        # Commits on success and rolls back on error
+        with conn:
+            yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,101 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.pmo_writer import merge_pmo_components
+from src.transformer import check_additional_columns_exist, create_representative_microhaplotype_table, detect_microhaplotypes, detected_microhaplotypes_to_dict, representative_microhaplotype_table_to_dict
+
+
+def transform_mhap_runs(runs, field_mapping, additional_hap_detected_cols=None, max_workers=None):
+    """
+    Convert the microhaplotype tables of several bioinformatics runs in a pool of worker processes.
+
+    Workers sort the calls and assign the representative microhaplotype IDs, and send back the representative table
+    and the rows as integer codes, from which the dictionaries are built here as each run finishes. The result is
+    the same as converting the runs one by one with transform_mhap_info, including the types of the keys.
+
+    :param runs: a dictionary of bioinformatics ID to the dataframe of microhaplotype calls of that run
+    :param field_mapping: the mapping of the PMO fields to the columns of the tables
+    :param additional_hap_detected_cols: optional additional columns to add to the microhaplotypes detected
+    :param max_workers: the number of worker processes, defaults to the number of CPUs
+    :return: a dict of both the microhaplotypes_detected and representative_microhaplotype_sequences of all runs, in the order of runs
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_transform_run, df, field_mapping, additional_hap_detected_cols)
+                   for df in runs.values()]
+        results = []
+        for bioinfo_id, future in zip(runs, futures):
+            representative_table, detected = future.result()
+            results.append(_output_data(bioinfo_id, representative_table, detected_microhaplotypes_to_dict(detected),
+                                        field_mapping))
+    return merge_pmo_components(results)
+
+
+def transform_mhap_info_sharded(df, bioinfo_id, field_mapping, additional_hap_detected_cols=None, max_workers=None,
+                                n_shards=None):
+    """
+    Convert one large microhaplotype table by splitting its samples into shards converted in a pool of worker processes.
+
+    Representative microhaplotype IDs are assigned once over the whole table, and each shard holds a contiguous
+    range of the sorted sample IDs, so the merged result matches transform_mhap_info. Each shard is sent only the
+    columns used and the representative microhaplotypes of its loci, and sends back its rows as integer codes.
+
+    :param df: the dataframe containing the microhaplotype calls
+    :param bioinfo_id: the bioinformatics ID of the microhaplotype table
+    :param field_mapping: the mapping of the PMO fields to the columns of the table
+    :param additional_hap_detected_cols: optional additional columns to add to the microhaplotypes detected
+    :param max_workers: the number of worker processes, defaults to the number of CPUs
+    :param n_shards: the number of shards to split the samples into, defaults to the number of workers
+    :return: a dict of both the microhaplotypes_detected and representative_microhaplotype_sequences
+    """
+    sampleID_col, locus_col = field_mapping["sampleID"], field_mapping["locus"]
+    mhap_col, reads_col = field_mapping["asv"], field_mapping["reads"]
+    check_additional_columns_exist(df, additional_hap_detected_cols)
+    n_shards = n_shards or max_workers or os.cpu_count()
+
+    representative_table = create_representative_microhaplotype_table(
+        df, locus_col, mhap_col)
+
+    # Assign contiguous ranges of the sorted sample IDs to each shard
+    sample_codes, sample_ids = pd.factorize(df[sampleID_col], sort=True)
+    sample_shards = np.arange(len(sample_ids)) * \
+        n_shards // max(len(sample_ids), 1)
+    row_shards = np.where(sample_codes >= 0,
+                          sample_shards[sample_codes], -1)
+    columns = list(dict.fromkeys(
+        [sampleID_col, locus_col, mhap_col, reads_col] + list(additional_hap_detected_cols or [])))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for shard in range(n_shards):
+            shard_rows = df.loc[row_shards == shard, columns]
+            if shard_rows.empty:
+                continue
+            shard_representatives = representative_table[
+                representative_table[locus_col].isin(shard_rows[locus_col].unique())]
+            futures.append(executor.submit(detect_microhaplotypes, shard_rows, sampleID_col, locus_col, mhap_col,
+                                           reads_col, shard_representatives, additional_hap_detected_cols))
+        detected_mhap_dict = {}
+        for future in futures:
+            detected_mhap_dict.update(
+                detected_microhaplotypes_to_dict(future.result()))
+
+    return _output_data(bioinfo_id, representative_table, detected_mhap_dict, field_mapping)
+
+
+def _transform_run(df, field_mapping, additional_hap_detected_cols):
+    # The representative table and the detected rows of one run, which are small to send back to the parent
+    locus_col, mhap_col = field_mapping["locus"], field_mapping["asv"]
+    representative_table = create_representative_microhaplotype_table(
+        df, locus_col, mhap_col)
+    detected = detect_microhaplotypes(df, field_mapping["sampleID"], locus_col, mhap_col, field_mapping["reads"],
+                                      representative_table, additional_hap_detected_cols)
+    return representative_table, detected
+
+
+def _output_data(bioinfo_id, representative_table, detected_mhap_dict, field_mapping):
+    representative_microhaplotype_dict = representative_microhaplotype_table_to_dict(
+        representative_table, field_mapping["locus"], field_mapping["asv"])
+    return {"microhaplotypes_detected": {bioinfo_id: {'experiment_samples': detected_mhap_dict}},
+            "representative_microhaplotype_sequences": {bioinfo_id: {"representative_microhaplotype_id": bioinfo_id, 'targets': representative_microhaplotype_dict}}
+            }
@@ -0,0 +1,214 @@
+import json
+import mmap
+import os
+import re
+from src.compression import codec_from_header, open_text_input
+
+
+def read_pmo(source):
+    """
+    Read a PMO file, decompressing it if it was written with gzip or zstd compression.
+
+    :param source: the path or readable seekable stream of the PMO, e.g. an uploaded file
+    :return: a dict of the PMO
+    """
+    stream = open_text_input(source)
+    try:
+        return json.load(stream)
+    finally:
+        if not hasattr(source, "read"):
+            stream.close()
+        elif stream is not source:
+            # Leave the caller's stream open
+            stream.detach()
+
+
+# Paths of the entries that are indexed, "*" matches any key
+INDEXED_ENTRIES = {
+    "panel_info": ("panel_info", "*", "targets", "*"),
+    "microhaplotypes_detected": ("microhaplotypes_detected", "*", "experiment_samples", "*"),
+    "representative_microhaplotype_sequences": ("representative_microhaplotype_sequences", "*", "targets", "*"),
+}
+INDEX_SUFFIX = ".index.json"
+INDEX_VERSION = 1
+# JSON strings and the structural characters, numbers and literals need no tokens to find where entries end
+_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_TOKEN = re.compile(_STRING + rb'|[{}\[\]:,]')
+# The next bracket outside of a string
+_NEXT_BRACKET = re.compile(
+    rb'[^"{}\[\]]*(?:' + _STRING + rb'[^"{}\[\]]*)*([{}\[\]])')
+
+
+class PMOReader:
+    """
+    Random access to the entries of a PMO file without parsing the whole file.
+
+    A sidecar index of the byte range of every panel target, experiment sample and representative microhaplotype
+    target is built on first use, stored next to the file, or at index_path, and rebuilt when the file changes.
+    If the index cannot be stored it is kept in memory. Entries are read by
+    parsing only their byte range of the memory mapped file. Compressed files cannot be read at random and must be
+    read with read_pmo.
+
+    Use as a context manager, or call close when done.
+    """
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self._file = open(path, "rb")
+        if codec_from_header(self._file.read(4)):
+            self._file.close()
+            raise ValueError(
+                f"{path} is compressed, decompress it to read it by entry")
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = load_pmo_index(
+            path, index_path) or build_pmo_index(path, index_path)
+
+    def keys(self, section, entry_id=None):
+        """
+        List the IDs of a section, e.g. the bioinformatics IDs of microhaplotypes_detected, or the keys of one
+        of its entries, e.g. the sample IDs of one bioinformatics run.
+        """
+        entries = self.index["entries"][section]
+        if entry_id is None:
+            return list(entries)
+        return list(entries[entry_id])
+
+    def get(self, section, entry_id, key):
+        """
+        Read one indexed entry, e.g. get("microhaplotypes_detected", bioinfo_id, sample_id).
+
+        Raises:
+            KeyError: If the file has no such entry.
+        """
+        start, end = self.index["entries"][section][entry_id][key]
+        return json.loads(self._buffer[start:end])
+
+    def get_sample(self, bioinfo_id, sample_id):
+        """Read the experiment sample entry of a bioinformatics run, with its target_results."""
+        return self.get("microhaplotypes_detected", bioinfo_id, sample_id)
+
+    def get_panel_target(self, panel_id, target_id):
+        """Read a target of a panel, with its primers."""
+        return self.get("panel_info", panel_id, target_id)
+
+    def get_representative_target(self, representative_id, locus):
+        """Read the representative microhaplotype sequences of a locus."""
+        return self.get("representative_microhaplotype_sequences", representative_id, locus)
+
+    def close(self):
+        self._buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def build_pmo_index(path, index_path=None):
+    """
+    Index the byte ranges of the entries of an uncompressed PMO file in a single scan and store the index in a
+    sidecar file. If the sidecar cannot be written, e.g. next to a file on a read-only mount, the index is still
+    returned but is built again the next time the file is opened.
+
+    :param path: the path of the PMO file
+    :param index_path: the path to store the index at, defaults to the PMO path followed by .index.json, e.g. a
+        path in a writable cache directory for files in a shared data directory
+    :return: a dict of the index
+    """
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        if stat.st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                entries = _index_entries(buffer)
+        else:
+            entries = {section: {} for section in INDEXED_ENTRIES}
+    index = {"version": INDEX_VERSION, "size": stat.st_size,
+             "mtime_ns": stat.st_mtime_ns, "entries": entries}
+    index_path = index_path or f"{path}{INDEX_SUFFIX}"
+    # Write to a temporary file first so a concurrent reader never loads a partial index
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(tmp_path, index_path)
+    except OSError:
+        # The index cannot be stored, e.g. on a read-only mount, so it is only kept in memory
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return index
+
+
+def load_pmo_index(path, index_path=None):
+    """Load the sidecar index of a PMO file, or None if there is none or the file changed since it was built."""
+    try:
+        with open(index_path or f"{path}{INDEX_SUFFIX}") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(path)
+    if (index.get("version"), index.get("size"), index.get("mtime_ns")) != (INDEX_VERSION, stat.st_size,
+                                                                            stat.st_mtime_ns):
+        return None
+    return index
+
+
+def _index_entries(buffer):
+    entries = {section: {} for section in INDEXED_ENTRIES}
+    # The key paths of the open objects that may hold indexed entries, and the key whose value comes next
+    open_paths = []
+    key = None
+    expect_key = False
+    pos = 0
+    while True:
+        match = _TOKEN.search(buffer, pos)
+        if match is None:
+            break
+        token = match.group()
+        pos = match.end()
+        if token[:1] == b'"':
+            if expect_key:
+                key = json.loads(token)
+                expect_key = False
+        elif token == b",":
+            expect_key = bool(open_paths)
+        elif token in (b"{", b"["):
+            path = open_paths[-1] + (key,) if open_paths else ()
+            match_kind = _match_entry_path(path)
+            if token == b"{" and match_kind == "entry":
+                end = _skip_value(buffer, pos)
+                entries[path[0]].setdefault(path[1], {})[
+                    path[3]] = (match.start(), end)
+                pos = end
+            elif token == b"{" and match_kind == "ancestor":
+                open_paths.append(path)
+                expect_key = True
+            else:
+                pos = _skip_value(buffer, pos)
+        elif token in (b"}", b"]"):
+            open_paths.pop()
+            expect_key = False
+    return entries
+
+
+def _match_entry_path(path):
+    for pattern in INDEXED_ENTRIES.values():
+        if len(path) <= len(pattern) and all(p == "*" or p == k for p, k in zip(pattern, path)):
+            return "entry" if len(path) == len(pattern) else "ancestor"
+    return None
+
+
+def _skip_value(buffer, pos):
+    # Find the end of the object or array opened just before pos
+    depth = 1
+    for match in _NEXT_BRACKET.finditer(buffer, pos):
+        if match.group(1) in (b"{", b"["):
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    raise ValueError("The PMO file ends before all of its objects are closed")
@@ -0,0 +1,110 @@
+from src.compression import open_text_output
+from src.instrumentation import instrumented
+from src.serializer import dumps, encode_members, json_key, reindent
+
+# Objects with up to this many members are written member by member, larger ones in batches of encoded members
+NESTED_OBJECT_MEMBERS = 8
+BATCH_CHARS = 1024 ** 2
+
+
+@instrumented("write_pmo", count_rows=False)
+def write_pmo(components, output, indent=4, compression=None, compression_level=None):
+    """
+    Write PMO components as a single PMO JSON document.
+
+    Components are the dictionaries returned by the transformer (e.g. panel information and microhaplotype
+    information). Their top level sections are merged, so several components may contribute entries to the same
+    section, and the result is serialized straight to the output without building the JSON string in memory.
+
+    :param components: an iterable of PMO component dictionaries
+    :param output: the path or writable text stream to write the PMO to
+    :param indent: the number of spaces to indent by, or None for compact output
+    :param compression: "gzip", "zstd" or "none" to compress the file as it is written, defaults to the codec
+        implied by the suffix of the output path (.gz or .zst)
+    :param compression_level: the codec's compression level
+    """
+    pmo = merge_pmo_components(components)
+    if hasattr(output, "write"):
+        write_json(pmo, output, indent)
+    else:
+        with open_text_output(output, compression, compression_level) as f:
+            write_json(pmo, f, indent)
+
+
+def merge_pmo_components(components):
+    """
+    Merge PMO components into one dictionary, combining the entries of sections that appear in several components.
+
+    :param components: an iterable of PMO component dictionaries
+    :return: a dictionary of the merged PMO
+    """
+    pmo = {}
+    for component in components:
+        for section, entries in component.items():
+            pmo.setdefault(section, {}).update(entries)
+    return pmo
+
+
+def write_json(obj, out, indent=4, depth=0):
+    """
+    Serialize obj to out chunk by chunk, formatted as json.dumps(obj, indent=indent) would be at the given depth.
+
+    Objects with many members are encoded in batches of members with the serializer's C accelerated encoder, so
+    the whole document is never held as one string and the pure Python encoder is not used for indented output.
+    """
+    if not isinstance(obj, dict) or not obj:
+        out.write(dumps(obj, indent, depth))
+        return
+    out.write("{")
+    if len(obj) <= NESTED_OBJECT_MEMBERS:
+        # Small objects, such as the top levels of a PMO, may hold large objects so are written member by member
+        for i, (key, value) in enumerate(obj.items()):
+            write_member(out, key, value, depth + 1, i == 0, indent)
+    else:
+        batch, batch_chars, first = [], 0, True
+        for item in obj.items():
+            batch.append(encode_members([item], indent))
+            batch_chars += len(batch[-1])
+            if batch_chars >= BATCH_CHARS:
+                _write_members(out, batch, depth + 1, first, indent)
+                batch, batch_chars, first = [], 0, False
+        if batch:
+            _write_members(out, batch, depth + 1, first, indent)
+    write_object_end(out, depth + 1, True, indent)
+
+
+def write_member(out, key, value, depth, first, indent=4):
+    """Write one key/value pair of an object whose members are depth levels deep."""
+    _write_key(out, key, depth, first, indent)
+    write_json(value, out, indent, depth)
+
+
+def write_object_start(out, key, depth, first, indent=4):
+    """Write the key of a member whose object value will be written incrementally, and open that object."""
+    _write_key(out, key, depth, first, indent)
+    out.write("{")
+
+
+def write_object_end(out, depth, has_members, indent=4):
+    """Close an object whose members were written depth levels deep."""
+    if has_members and indent is not None:
+        out.write("\n" + " " * (indent * (depth - 1)))
+    out.write("}")
+
+
+def _write_members(out, members, depth, first, indent):
+    if not first:
+        out.write(",")
+    if indent is None:
+        out.write(",".join(members))
+    else:
+        out.write("\n" + " " * (indent * depth))
+        out.write(reindent(",".join(members), indent, depth))
+
+
+def _write_key(out, key, depth, first, indent):
+    if not first:
+        out.write(",")
+    if indent is not None:
+        out.write("\n" + " " * (indent * depth))
+    out.write(json_key(key) + (":" if indent is None else ": "))
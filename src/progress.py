@@ -0,0 +1,33 @@
+import contextvars
+from contextlib import contextmanager
+
+# The function receiving the progress of the work running in the current context, None when nothing is listening
+_active_reporter = contextvars.ContextVar("active_progress_reporter", default=None)
+
+
+def report_progress(done, total, unit=""):
+    """
+    Report the progress of the running work. Does nothing unless a reporter is set with reporting_progress.
+
+    :param done: the number of units of work done
+    :param total: the total number of units of work
+    :param unit: what is counted, e.g. "samples"
+    :raises: whatever the reporter raises, e.g. JobCancelled if the job has been cancelled, so the work stops here
+    """
+    reporter = _active_reporter.get()
+    if reporter is not None:
+        reporter(done, total, unit)
+
+
+@contextmanager
+def reporting_progress(reporter):
+    """
+    Send the progress reported in this context to reporter.
+
+    :param reporter: a function called as reporter(done, total, unit)
+    """
+    token = _active_reporter.set(reporter)
+    try:
+        yield
+    finally:
+        _active_reporter.reset(token)
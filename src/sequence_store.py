@@ -0,0 +1,314 @@
+import numpy as np
+import pandas as pd
+
+# 2-bit codes of the bases, other characters (e.g. IUPAC ambiguity codes) are marked invalid
+_INVALID = 255
+_CODES = np.full(256, _INVALID, dtype=np.uint8)
+_CODES[np.frombuffer(b"ACGT", dtype=np.uint8)] = np.arange(4, dtype=np.uint8)
+# The four bases held in each packed byte, lowest bits first
+_UNPACKED = np.frombuffer(b"ACGT", dtype=np.uint8)[
+    (np.arange(256)[:, None] >> (2 * np.arange(4))) & 3]
+
+
+class SequenceStore:
+    """
+    Interns (locus, sequence) pairs, giving each unique pair an integer handle in order of first appearance.
+
+    Sequences of only A, C, G and T are packed at 2 bits per base into one array, and other sequences, e.g. with
+    IUPAC ambiguity codes, are kept as strings. Pairs are found by a 64-bit hash held in a few sorted arrays, so
+    there is no Python object for each sequence other than those kept as strings.
+    """
+
+    def __init__(self):
+        self._locus_ids = {}
+        self._locus_names = []
+        # Arrays grown by doubling their capacity, so adding many small batches takes linear time overall
+        self._packed = _GrowingArray(np.uint8)
+        self._locus_codes = _GrowingArray(np.int32)
+        self._lengths = _GrowingArray(np.int32)
+        # Offset of each sequence in _packed, -1 for sequences kept as strings
+        self._offsets = _GrowingArray(np.int64)
+        self._strings = {}
+        # The index is a list of sorted runs of hashes and their handles, from largest to smallest, and a run is
+        # merged into the one before it once that is no more than twice its size, so there are O(log n) runs
+        self._runs = []
+
+    def __len__(self):
+        return len(self._lengths)
+
+    @property
+    def nbytes(self):
+        """The memory used by the sequences and the index, in bytes."""
+        arrays = [self._packed, self._locus_codes, self._lengths, self._offsets]
+        return sum(array.nbytes for array in arrays) + \
+            sum(hashes.nbytes + handles.nbytes for hashes, handles in self._runs) + \
+            sum(len(seq) for seq in self._strings.values())
+
+    def intern(self, locus, seq):
+        """Get the handle of a locus and sequence, adding it if it is new."""
+        return int(self.intern_many([locus], [seq])[0][0])
+
+    def intern_many(self, loci, seqs):
+        """
+        Get the handles of pairs of loci and sequences, adding the new pairs in order of first appearance.
+
+        :param loci: the locus of each pair
+        :param seqs: the sequence of each pair
+        :return: an array of the handle of each pair and a boolean array marking the pairs that were added
+        """
+        loci, seqs = list(loci), list(seqs)
+        is_new = np.zeros(len(seqs), dtype=bool)
+        if not seqs:
+            return np.zeros(0, dtype=np.int64), is_new
+        # Loci are coded in order of first appearance
+        batch_codes, batch_loci = pd.factorize(np.asarray(loci, dtype=object))
+        locus_codes = np.array([self._locus_code(locus) for locus in batch_loci], dtype=np.int32)[batch_codes]
+        batch = _Batch(seqs, locus_codes)
+        handles = self._find(batch)
+
+        # New pairs repeated within the batch get the handle of their first appearance
+        batch_handles = {}
+        new_rows = []
+        for i in np.flatnonzero(handles < 0).tolist():
+            key = (int(batch.locus_codes[i]), seqs[i])
+            if key not in batch_handles:
+                batch_handles[key] = len(self) + len(new_rows)
+                new_rows.append(i)
+                is_new[i] = True
+            handles[i] = batch_handles[key]
+        if new_rows:
+            self._add(batch, np.array(new_rows, dtype=np.int64))
+        return handles, is_new
+
+    def find_many(self, loci, seqs):
+        """
+        Get the handles of pairs of loci and sequences without adding the pairs that are not stored.
+
+        :param loci: the locus of each pair
+        :param seqs: the sequence of each pair
+        :return: an array of the handle of each pair, -1 for pairs that are not stored
+        """
+        loci, seqs = list(loci), list(seqs)
+        if not seqs:
+            return np.zeros(0, dtype=np.int64)
+        batch_codes, batch_loci = pd.factorize(np.asarray(loci, dtype=object))
+        # Pairs of a locus that is not stored cannot be found
+        locus_codes = np.array([self._locus_ids.get(locus, -1) for locus in batch_loci], dtype=np.int32)[batch_codes]
+        handles = np.full(len(seqs), -1, dtype=np.int64)
+        known = np.flatnonzero(locus_codes >= 0)
+        if known.size:
+            handles[known] = self._find(_Batch([seqs[i] for i in known.tolist()], locus_codes[known]))
+        return handles
+
+    def locus(self, handle):
+        """Get the locus of a handle."""
+        return self._locus_names[self._locus_codes.values[handle]]
+
+    def sequence(self, handle):
+        """Get the sequence of a handle."""
+        return self.sequences([handle])[0]
+
+    def sequences(self, handles):
+        """
+        Get the sequences of several handles, unpacking the packed sequences together.
+
+        :param handles: the handles
+        :return: a list of the sequences
+        """
+        handles = np.asarray(handles, dtype=np.int64)
+        offsets, lengths = self._offsets.values[handles], self._lengths.values[handles]
+        packed = offsets >= 0
+        text = _UNPACKED[self._packed.values[_ranges(offsets[packed], (lengths[packed] + 3) // 4)]].tobytes().decode("ascii")
+        seqs = []
+        start = 0
+        for handle, is_packed, length in zip(handles.tolist(), packed.tolist(), lengths.tolist()):
+            if is_packed:
+                seqs.append(text[start:start + length])
+                start += (length + 3) // 4 * 4
+            else:
+                seqs.append(self._strings[handle])
+        return seqs
+
+    def handles_by_locus(self):
+        """Get the handles of each locus, in order of first appearance, with the loci in sorted order."""
+        locus_codes = self._locus_codes.values
+        order = np.argsort(locus_codes, kind="stable")
+        bounds = np.searchsorted(locus_codes[order], np.arange(len(self._locus_names) + 1))
+        return {name: order[bounds[code]:bounds[code + 1]]
+                for code, name in sorted(enumerate(self._locus_names), key=lambda item: item[1])}
+
+    def _locus_code(self, locus):
+        if locus not in self._locus_ids:
+            self._locus_ids[locus] = len(self._locus_names)
+            self._locus_names.append(locus)
+        return self._locus_ids[locus]
+
+    def _find(self, batch):
+        # The handles of the pairs of a batch that are already stored, -1 for the others
+        handles = np.full(len(batch.seqs), -1, dtype=np.int64)
+        # A pair is stored at most once, so it is in at most one run
+        for run_hashes, run_handles in self._runs:
+            rows = np.flatnonzero(handles < 0)
+            if not rows.size:
+                break
+            handles[rows] = self._find_in_run(batch, rows, run_hashes, run_handles)
+        return handles
+
+    def _find_in_run(self, batch, rows, run_hashes, run_handles):
+        # The handles of some pairs of a batch in one sorted run of the index, -1 for those not in the run
+        locus_codes, lengths, offsets, stored = self._locus_codes.values, self._lengths.values, \
+            self._offsets.values, self._packed.values
+        handles = np.full(len(rows), -1, dtype=np.int64)
+        first = np.searchsorted(run_hashes, batch.hashes[rows], side="left")
+        last = np.searchsorted(run_hashes, batch.hashes[rows], side="right")
+        hits = np.flatnonzero(last > first)
+        batch_rows = rows[hits]
+        candidates = run_handles[first[hits]]
+
+        # Check that the pair with the same hash holds the same locus and sequence
+        same = (locus_codes[candidates] == batch.locus_codes[batch_rows]) & \
+            (lengths[candidates] == batch.lengths[batch_rows]) & \
+            ((offsets[candidates] >= 0) == batch.packable[batch_rows])
+        packed = np.flatnonzero(same & batch.packable[batch_rows])
+        n_bytes = batch.n_bytes[batch_rows[packed]]
+        differs = batch.packed[_ranges(batch.byte_starts[batch_rows[packed]], n_bytes)] != \
+            stored[_ranges(offsets[candidates[packed]], n_bytes)]
+        same[packed] = np.bincount(np.repeat(np.arange(len(packed)), n_bytes), weights=differs,
+                                   minlength=len(packed)) == 0
+        for j in np.flatnonzero(same & ~batch.packable[batch_rows]).tolist():
+            same[j] = self._strings[int(candidates[j])] == batch.seqs[batch_rows[j]]
+        handles[hits[same]] = candidates[same]
+
+        # Other pairs with the same hash are compared one by one, which only happens on a hash collision
+        for j in np.flatnonzero(~same).tolist():
+            i = batch_rows[j]
+            for position in range(first[hits[j]] + 1, last[hits[j]]):
+                handle = int(run_handles[position])
+                if locus_codes[handle] == batch.locus_codes[i] and self.sequence(handle) == batch.seqs[i]:
+                    handles[hits[j]] = handle
+                    break
+        return handles
+
+    def _add(self, batch, rows):
+        first_handle = len(self)
+        packable = batch.packable[rows]
+        n_bytes = np.where(packable, batch.n_bytes[rows], 0)
+        offsets = np.where(packable, len(self._packed) + np.cumsum(n_bytes) - n_bytes, -1)
+        for i in np.flatnonzero(~packable).tolist():
+            self._strings[first_handle + i] = batch.seqs[rows[i]]
+        self._packed.extend(batch.packed[_ranges(batch.byte_starts[rows], n_bytes)])
+        self._offsets.extend(offsets)
+        self._lengths.extend(batch.lengths[rows])
+        self._locus_codes.extend(batch.locus_codes[rows])
+
+        # Add the new hashes as a sorted run, merging it with the runs before it that are not much larger
+        new_hashes = batch.hashes[rows]
+        order = np.argsort(new_hashes, kind="stable")
+        run = (new_hashes[order], first_handle + order)
+        while self._runs and len(self._runs[-1][0]) <= 2 * len(run[0]):
+            run = _merge_runs(self._runs.pop(), run)
+        self._runs.append(run)
+
+
+class _Batch:
+    """The sequences of one call to intern_many, packed and hashed together."""
+
+    def __init__(self, seqs, locus_codes):
+        self.seqs = seqs
+        self.locus_codes = locus_codes
+        self.lengths = np.fromiter(map(len, seqs), dtype=np.int64, count=len(seqs))
+        self.packable = np.zeros(len(seqs), dtype=bool)
+        self.n_bytes = np.zeros(len(seqs), dtype=np.int64)
+        self.byte_starts = np.zeros(len(seqs), dtype=np.int64)
+        self.hashes = np.zeros(len(seqs), dtype=np.uint64)
+        blocks = []
+        size = 0
+        # Sequences of the same length are packed and hashed together as the rows of a matrix
+        order = np.argsort(self.lengths, kind="stable")
+        for rows in np.split(order, np.flatnonzero(np.diff(self.lengths[order])) + 1):
+            length = int(self.lengths[rows[0]])
+            # Characters outside ASCII are replaced by one byte each, which is not a base
+            chars = np.frombuffer("".join([seqs[i] for i in rows.tolist()]).encode("ascii", errors="replace"),
+                                  dtype=np.uint8).reshape(len(rows), length)
+            self.hashes[rows] = _hash(chars, self.lengths[rows], locus_codes[rows])
+
+            # A sequence is packed if all of its characters are bases
+            codes = _CODES[chars]
+            packable = (codes != _INVALID).all(axis=1)
+            packed = _pack(codes[packable])
+            n_bytes = packed.shape[1]
+            packed_rows = rows[packable]
+            self.packable[packed_rows] = True
+            self.n_bytes[packed_rows] = n_bytes
+            self.byte_starts[packed_rows] = size + np.arange(len(packed_rows)) * n_bytes
+            blocks.append(packed.ravel())
+            size += packed.size
+        self.packed = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.uint8)
+
+
+class _GrowingArray:
+    """A numpy array that values are appended to, with its capacity doubled when it is full."""
+
+    def __init__(self, dtype):
+        self._data = np.zeros(0, dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def values(self):
+        """The values appended so far, as a view that is only valid until the next extend."""
+        return self._data[:self._size]
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+    def extend(self, values):
+        end = self._size + len(values)
+        if end > len(self._data):
+            data = np.zeros(max(end, 2 * len(self._data)), dtype=self._data.dtype)
+            data[:self._size] = self._data[:self._size]
+            self._data = data
+        self._data[self._size:end] = values
+        self._size = end
+
+
+def _merge_runs(earlier, later):
+    # Merge two sorted runs of the index, keeping the pairs of the earlier run first among equal hashes
+    hashes = np.concatenate((earlier[0], later[0]))
+    order = np.argsort(hashes, kind="stable")
+    return hashes[order], np.concatenate((earlier[1], later[1]))[order]
+
+
+def _pack(codes):
+    # Pack the rows of a matrix of 2-bit codes 4 per byte, lowest bits first, padding the last byte
+    padded = np.zeros((codes.shape[0], -(-codes.shape[1] // 4) * 4), dtype=np.uint8)
+    padded[:, :codes.shape[1]] = codes
+    return padded[:, 0::4] | (padded[:, 1::4] << 2) | (padded[:, 2::4] << 4) | (padded[:, 3::4] << 6)
+
+
+def _ranges(starts, lengths):
+    # The positions of several ranges, concatenated
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+
+
+def _hash(chars, lengths, locus_codes):
+    # Hash the rows of a matrix of characters 8 bytes at a time, mixed with their length and locus
+    padded = np.zeros((chars.shape[0], -(-chars.shape[1] // 8) * 8), dtype=np.uint8)
+    padded[:, :chars.shape[1]] = chars
+    words = padded.view(np.uint64)
+    with np.errstate(over="ignore"):
+        hashes = lengths.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) ^ \
+            locus_codes.astype(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F)
+        for column in range(words.shape[1]):
+            hashes = _mix(hashes ^ words[:, column])
+    return hashes
+
+
+def _mix(values):
+    # The splitmix64 finaliser, spreading nearby values over the whole range
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
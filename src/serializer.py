@@ -0,0 +1,144 @@
+import json
+import numpy as np
+import pandas as pd
+
+_QUOTE, _BACKSLASH, _COMMA = ord('"'), ord("\\"), ord(",")
+_OPEN_BRACE, _OPEN_BRACKET = ord("{"), ord("[")
+_CLOSE_BRACE, _CLOSE_BRACKET = ord("}"), ord("]")
+_NEWLINE, _SPACE = ord("\n"), ord(" ")
+_STRUCTURAL = np.zeros(256, dtype=bool)
+_STRUCTURAL[[_COMMA, _OPEN_BRACE, _OPEN_BRACKET,
+             _CLOSE_BRACE, _CLOSE_BRACKET]] = True
+
+
+def to_native(value):
+    """
+    Convert a numpy or pandas value that the json module cannot encode to native Python values.
+
+    Numpy scalars become Python scalars, numpy arrays and pandas columns become lists (with missing values in
+    non-numeric columns as None) and pandas missing values become None.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Series, pd.Index, pd.Categorical, pd.api.extensions.ExtensionArray)):
+        return column_to_native(pd.Series(value, copy=False) if not isinstance(value, pd.Series) else value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if value is pd.NA or value is pd.NaT:
+        return None
+    raise TypeError(
+        f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+
+def column_to_native(column: pd.Series):
+    """
+    Convert a column to a list of native Python values, with missing values in non-numeric columns as None.
+
+    :param column: the column to convert
+    :return: a list of the column values
+    """
+    values = column.tolist()
+    if not pd.api.types.is_numeric_dtype(column):
+        for i in np.flatnonzero(column.isna().to_numpy()):
+            values[i] = None
+    return values
+
+
+# The C accelerated encoder is only used without indentation, so indented output is produced by re-indenting its
+# output, encoded with the separators json.dumps uses when indenting
+_ENCODER = json.JSONEncoder(separators=(",", ": "), default=to_native)
+_COMPACT_ENCODER = json.JSONEncoder(separators=(",", ":"), default=to_native)
+
+
+def dumps(obj, indent=None, depth=0):
+    """
+    Serialize obj to a JSON string, also accepting numpy and pandas values, using the C accelerated encoder for
+    indented output too.
+
+    With an indent the output is exactly what json.dumps(obj, indent=indent) writes. Without one it is compact,
+    with the separators "," and ":", where json.dumps(obj) would write ", " and ": ".
+
+    :param obj: the object to serialize
+    :param indent: the number of spaces to indent by, or None for compact output with no spaces
+    :param depth: the nesting depth obj is written at, to indent it as a value inside an enclosing document
+    :return: the JSON string
+    """
+    if indent is None:
+        return _COMPACT_ENCODER.encode(obj)
+    return reindent(_ENCODER.encode(obj), indent, depth)
+
+
+def encode_members(items, indent=None):
+    """Serialize the key/value pairs of an object, without its braces, joined as dumps would join them."""
+    encoder = _COMPACT_ENCODER if indent is None else _ENCODER
+    key_separator = ":" if indent is None else ": "
+    return ",".join(f"{json_key(key)}{key_separator}{encoder.encode(value)}" for key, value in items)
+
+
+def json_key(key):
+    """Encode an object key the way json.dumps does, including non-string keys."""
+    if not isinstance(key, str):
+        key = _COMPACT_ENCODER.encode(key)
+    return _COMPACT_ENCODER.encode(key)
+
+
+def reindent(text, indent, depth=0):
+    """
+    Indent JSON produced with the separators (",", ": ") as json.dumps(indent=indent) would.
+
+    The structural characters outside of strings are found with array operations, so the text is re-indented
+    without a Python loop. The text may be a sequence of object members rather than a single value, with depth
+    the nesting depth of the members.
+    """
+    # Non-ASCII characters are escaped by the encoder, so every character is one byte
+    chars = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+    n = len(chars)
+    candidates = np.flatnonzero(_STRUCTURAL[chars])
+    if not candidates.size:
+        return text
+
+    # Characters are inside a string if an odd number of unescaped quotes come before them
+    quotes = _unescaped_quotes(chars)
+    structural = candidates[np.searchsorted(quotes, candidates) % 2 == 0]
+    kinds = chars[structural]
+    opens = (kinds == _OPEN_BRACE) | (kinds == _OPEN_BRACKET)
+    closes = (kinds == _CLOSE_BRACE) | (kinds == _CLOSE_BRACKET)
+    depth_after = depth + np.cumsum(opens.astype(np.int64) - closes)
+
+    # Newlines go after opening brackets and commas and before closing brackets, followed by the indent.
+    # Empty objects and arrays stay on one line
+    empty = np.zeros(len(structural), dtype=bool)
+    empty[:-1] = opens[:-1] & closes[1:] & (
+        structural[1:] == structural[:-1] + 1)
+    break_after = (opens & ~empty) | (kinds == _COMMA)
+    break_before = closes.copy()
+    break_before[1:] &= ~empty[:-1]
+    breaks = np.concatenate(
+        (structural[break_after] + 1, structural[break_before]))
+    widths = 1 + indent * np.concatenate(
+        (depth_after[break_after], depth_after[break_before]))
+    order = np.argsort(breaks, kind="stable")
+    breaks, widths = breaks[order], widths[order]
+
+    # Shift each run of characters between breaks by the width inserted before it
+    shifts = np.concatenate(([0], np.cumsum(widths)))
+    run_lengths = np.diff(breaks, prepend=0, append=n)
+    out = np.full(n + int(shifts[-1]), _SPACE, dtype=np.uint8)
+    out[np.arange(n) + np.repeat(shifts, run_lengths)] = chars
+    out[breaks + shifts[:-1]] = _NEWLINE
+    return out.tobytes().decode("ascii")
+
+
+def _unescaped_quotes(chars):
+    # Positions of the quotes that start or end strings, a quote is escaped by an odd number of backslashes
+    quotes = np.flatnonzero(chars == _QUOTE)
+    backslashes = np.flatnonzero(chars == _BACKSLASH)
+    if not backslashes.size or not quotes.size:
+        return quotes
+    new_run = np.diff(backslashes, prepend=-2) != 1
+    run_start_of = backslashes[new_run][np.cumsum(new_run) - 1]
+    before = np.minimum(np.searchsorted(
+        backslashes, quotes - 1), len(backslashes) - 1)
+    after_backslash = backslashes[before] == quotes - 1
+    run_lengths = quotes - run_start_of[before]
+    return quotes[~(after_backslash & (run_lengths % 2 == 1))]
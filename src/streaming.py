@@ -0,0 +1,151 @@
+import pandas as pd
+from src.compression import open_text_output
+from src.data_loader import iter_csv_chunks
+from src.pmo_writer import write_member, write_object_end, write_object_start
+from src.transformer import check_additional_columns_exist, create_detected_microhaplotype_dict, create_representative_microhaplotype_table
+
+
+def stream_mhap_info(file, output, bioinfo_id, field_mapping, additional_hap_detected_cols=None, chunksize=100_000, indent=4,
+                     compression=None, compression_level=None):
+    """Stream a microhaplotype table into a PMO file based on the provided field mapping."""
+    return stream_microhaplotype_table_to_pmo(
+        file, output, bioinfo_id, sampleID_col=field_mapping["sampleID"], locus_col=field_mapping['locus'], mhap_col=field_mapping['asv'], reads_col=field_mapping['reads'], additional_hap_detected_cols=additional_hap_detected_cols, chunksize=chunksize, indent=indent,
+        compression=compression, compression_level=compression_level)
+
+
+def stream_microhaplotype_table_to_pmo(
+    file,
+    output,
+    bioinfo_id: str,
+    sampleID_col: str = 'sampleID',
+    locus_col: str = 'locus',
+    mhap_col: str = 'asv',
+    reads_col: str = 'reads',
+    additional_hap_detected_cols: list | None = None,
+    chunksize: int = 100_000,
+    indent: int | None = 4,
+    compression: str | None = None,
+    compression_level: int | None = None
+):
+    """
+    Convert a microhaplotype calls table into the PMO microhaplotype JSON without loading the whole table into memory.
+
+    The table is read in chunks and each sample's experiment_samples entry is written as soon as all of its rows
+    have been read, so the rows of each sample must be contiguous in the input (e.g. sorted by sampleID). Only the
+    unique locus and sequence pairs are kept for the whole run, so peak memory is bounded by the largest sample.
+    For input sorted by sampleID the output is identical to microhaplotype_table_to_pmo_dict.
+
+    :param file: The path or buffer of the tab separated microhaplotype calls table
+    :param output: The path or writable text stream to write the JSON to
+    :param bioinfo_id: the bioinformatics ID of the microhaplotype table
+    :param sampleID_col: the name of the column containing the sample IDs
+    :param locus_col: the name of the column containing the locus IDs
+    :param mhap_col: the name of the column containing the microhaplotype sequence
+    :param reads_col: the name of the column containing the reads counts
+    :param additional_hap_detected_cols: optional additional columns to add to the microhaplotype detected dictionary
+    :param chunksize: the number of rows to read at a time
+    :param indent: the number of spaces to indent the JSON by, or None for compact output
+    :param compression: "gzip", "zstd" or "none" to compress the file as it is written, defaults to the codec implied by the suffix of the output path (.gz or .zst)
+    :param compression_level: the codec's compression level
+    :return: the number of samples written
+    """
+    if hasattr(output, "write"):
+        return _stream_microhaplotype_table(file, output, bioinfo_id, sampleID_col, locus_col, mhap_col, reads_col,
+                                            additional_hap_detected_cols, chunksize, indent)
+    with open_text_output(output, compression, compression_level) as f:
+        return _stream_microhaplotype_table(file, f, bioinfo_id, sampleID_col, locus_col, mhap_col, reads_col,
+                                            additional_hap_detected_cols, chunksize, indent)
+
+
+def _stream_microhaplotype_table(file, out, bioinfo_id, sampleID_col, locus_col, mhap_col, reads_col,
+                                 additional_hap_detected_cols, chunksize, indent):
+    # Representative sequences seen so far, locus -> {seq: microhaplotype_id}
+    representative_seqs = {}
+    written_samples = set()
+
+    out.write("{")
+    write_object_start(out, "microhaplotypes_detected", 1, True, indent)
+    write_object_start(out, bioinfo_id, 2, True, indent)
+    write_object_start(out, "experiment_samples", 3, True, indent)
+
+    pending = None
+    for chunk in iter_csv_chunks(file, chunksize=chunksize):
+        check_additional_columns_exist(chunk, additional_hap_detected_cols)
+        # IDs are numbered in order of first appearance, as in the full table
+        _register_representative_seqs(
+            chunk, locus_col, mhap_col, representative_seqs)
+
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+        # The last sample of the chunk may continue in the next one
+        samples = chunk[sampleID_col]
+        run_starts = (samples.ne(samples.shift())).to_numpy().nonzero()[0]
+        pending = chunk.iloc[run_starts[-1]:] if len(run_starts) else None
+        complete = chunk.iloc[:run_starts[-1]] if len(run_starts) else chunk
+        _write_samples(out, complete, sampleID_col, locus_col, mhap_col, reads_col,
+                       additional_hap_detected_cols, representative_seqs, written_samples, indent)
+
+    if pending is not None:
+        _write_samples(out, pending, sampleID_col, locus_col, mhap_col, reads_col,
+                       additional_hap_detected_cols, representative_seqs, written_samples, indent)
+
+    write_object_end(out, 4, bool(written_samples), indent)
+    write_object_end(out, 3, True, indent)
+    write_object_end(out, 2, True, indent)
+
+    write_object_start(
+        out, "representative_microhaplotype_sequences", 1, False, indent)
+    write_object_start(out, bioinfo_id, 2, True, indent)
+    write_member(out, "representative_microhaplotype_id",
+                 bioinfo_id, 3, True, indent)
+    write_object_start(out, "targets", 3, False, indent)
+    for i, locus in enumerate(sorted(representative_seqs)):
+        target = {"seqs": {
+            microhaplotype_id: {"microhaplotype_id": microhaplotype_id, "seq": seq}
+            for seq, microhaplotype_id in representative_seqs[locus].items()
+        }}
+        write_member(out, locus, target, 4, i == 0, indent)
+    write_object_end(out, 4, bool(representative_seqs), indent)
+    write_object_end(out, 3, True, indent)
+    write_object_end(out, 2, True, indent)
+    write_object_end(out, 1, True, indent)
+    return len(written_samples)
+
+
+def _register_representative_seqs(chunk, locus_col, mhap_col, representative_seqs):
+    unique_table = create_representative_microhaplotype_table(
+        chunk, locus_col, mhap_col)
+    for locus, seq in zip(unique_table[locus_col].tolist(), unique_table[mhap_col].tolist()):
+        locus_seqs = representative_seqs.setdefault(locus, {})
+        if seq not in locus_seqs:
+            locus_seqs[seq] = f"{locus}.{len(locus_seqs)}"
+
+
+def _write_samples(out, table, sampleID_col, locus_col, mhap_col, reads_col,
+                   additional_hap_detected_cols, representative_seqs, written_samples, indent):
+    table = table[table[sampleID_col].notna() & table[locus_col].notna()]
+    if table.empty:
+        return
+    samples = table[sampleID_col]
+    sample_order = pd.unique(samples)
+    n_runs = int(samples.ne(samples.shift()).sum())
+    repeated = written_samples.intersection(sample_order)
+    if n_runs != len(sample_order) or repeated:
+        raise ValueError(
+            f"The microhaplotype table must be grouped by {sampleID_col} to be streamed")
+
+    # Only the representative sequences used by these samples are needed
+    unique_table = create_representative_microhaplotype_table(
+        table, locus_col, mhap_col)
+    representative_dict = {}
+    for locus, seq in zip(unique_table[locus_col].tolist(), unique_table[mhap_col].tolist()):
+        microhaplotype_id = representative_seqs[locus][seq]
+        representative_dict.setdefault(locus, {"seqs": {}})["seqs"][microhaplotype_id] = {
+            "microhaplotype_id": microhaplotype_id, "seq": seq}
+    detected_mhap_dict = create_detected_microhaplotype_dict(
+        table, sampleID_col, locus_col, mhap_col, reads_col, representative_dict, additional_hap_detected_cols)
+
+    for sample_id in sample_order:
+        write_member(out, sample_id, detected_mhap_dict[sample_id], 4,
+                     not written_samples, indent)
+        written_samples.add(sample_id)
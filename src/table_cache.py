@@ -0,0 +1,138 @@
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+from collections import OrderedDict
+from src.data_loader import load_csv, load_csvs
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+HASH_BLOCK_SIZE = 1024 ** 2
+
+
+class TableCache:
+    """
+    A least recently used cache of parsed tables, bounded by their total memory use.
+
+    Tables evicted from memory are written as Feather files to spill_dir, if one is given and pyarrow is
+    installed, and read back from there on a later miss. Cached tables are shared between callers and must
+    not be modified.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir if importlib.util.find_spec(
+            "pyarrow") else None
+        self._tables = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get the table stored under key, or None."""
+        with self._lock:
+            if key in self._tables:
+                self._tables.move_to_end(key)
+                return self._tables[key]
+        spill_path = self._spill_path(key)
+        if spill_path and os.path.exists(spill_path):
+            import pandas as pd
+            df = pd.read_feather(spill_path)
+            self.put(key, df)
+            return df
+        return None
+
+    def put(self, key, df):
+        """Store a table under key, evicting the least recently used tables to stay within max_bytes."""
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            self._total_bytes += size - self._sizes.get(key, 0)
+            self._tables[key] = df
+            self._sizes[key] = size
+            self._tables.move_to_end(key)
+            evicted = []
+            while len(self._tables) > 1 and self._total_bytes > self.max_bytes:
+                old_key, old_df = self._tables.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(old_key)
+                evicted.append((old_key, old_df))
+        for old_key, old_df in evicted:
+            self._spill(old_key, old_df)
+
+    def clear(self):
+        """Remove all tables from memory and from the spill directory."""
+        with self._lock:
+            self._tables.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+        if self.spill_dir and os.path.isdir(self.spill_dir):
+            for name in os.listdir(self.spill_dir):
+                if name.endswith(".feather"):
+                    os.remove(os.path.join(self.spill_dir, name))
+
+    def _spill_path(self, key):
+        if not self.spill_dir:
+            return None
+        return os.path.join(self.spill_dir, f"{key}.feather")
+
+    def _spill(self, key, df):
+        spill_path = self._spill_path(key)
+        if spill_path and not os.path.exists(spill_path):
+            os.makedirs(self.spill_dir, exist_ok=True)
+            tmp_path = f"{spill_path}.{os.getpid()}.tmp"
+            df.to_feather(tmp_path)
+            os.replace(tmp_path, spill_path)
+
+
+# Shared by all sessions of the app, so a rerun or a second upload of the same file is not parsed again
+table_cache = TableCache(spill_dir=os.environ.get("PMO_TABLE_CACHE_DIR"))
+
+
+def content_hash(file):
+    """Hash the contents of a file path or file-like object."""
+    digest = hashlib.blake2b(digest_size=20)
+    if hasattr(file, "read"):
+        file.seek(0)
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), type(file.read(0))()):
+            digest.update(block.encode() if isinstance(block, str) else block)
+        file.seek(0)
+    else:
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def load_csv_cached(file, field_mapping=None, additional_cols=None, cache=None):
+    """
+    Load a CSV file as load_csv does, reusing the parsed table if the same contents were loaded before
+    with the same field mapping and additional columns.
+    """
+    if cache is None:
+        cache = table_cache
+    options = json.dumps([field_mapping, additional_cols], sort_keys=True)
+    key = hashlib.blake2b(
+        f"{content_hash(file)}:{options}".encode(), digest_size=20).hexdigest()
+    df = cache.get(key)
+    if df is None:
+        df = load_csv(file, field_mapping, additional_cols)
+        cache.put(key, df)
+    return df
+
+
+def load_csvs_cached(files, field_mapping=None, additional_cols=None, max_workers=None, cache=None):
+    """
+    Load several CSV files with the same columns into one table as load_csvs does, reusing the combined table if
+    the same files were loaded before in the same order with the same field mapping and additional columns.
+    """
+    if cache is None:
+        cache = table_cache
+    files = list(files)
+    options = json.dumps([field_mapping, additional_cols], sort_keys=True)
+    hashes = ",".join(content_hash(file) for file in files)
+    key = hashlib.blake2b(
+        f"{hashes}:{options}".encode(), digest_size=20).hexdigest()
+    df = cache.get(key)
+    if df is None:
+        df = load_csvs(files, field_mapping, additional_cols, max_workers)
+        cache.put(key, df)
+    return df
@@ -1,6 +1,10 @@
-import json
+from dataclasses import dataclass, field
 import pandas as pd
 import numpy as np
+from src.instrumentation import instrumented
+from src.progress import report_progress
+from src.sequence_store import SequenceStore
+from src.serializer import column_to_native
 
 
 def transform_mhap_info(df, bioinfo_id, field_mapping, additional_hap_detected_cols=None):
@@ -26,6 +30,7 @@ def transform_panel_info(df, panel_id, field_mapping, target_genome_info, additi
     return transformed_df
 
 
+@instrumented("microhaplotype_table_to_pmo_dict")
 def microhaplotype_table_to_pmo_dict(
     contents: pd.DataFrame,
     bioinfo_id: str,
@@ -48,20 +53,22 @@ def microhaplotype_table_to_pmo_dict(
     :return: a dict of both the haplotypes_detected and representative_haplotype_sequences
     """
 
-    representative_microhaplotype_dict = create_representative_microhaplotype_dict(
+    representative_table = create_representative_microhaplotype_table(
         contents, locus_col, mhap_col)
+    representative_microhaplotype_dict = representative_microhaplotype_table_to_dict(
+        representative_table, locus_col, mhap_col)
 
-    detected_mhap_dict = create_detected_microhaplotype_dict(contents, sampleID_col, locus_col,
-                                                             mhap_col, reads_col, representative_microhaplotype_dict,
-                                                             additional_hap_detected_cols)
+    detected = detect_microhaplotypes(contents, sampleID_col, locus_col, mhap_col, reads_col,
+                                      representative_table, additional_hap_detected_cols)
+    detected_mhap_dict = detected_microhaplotypes_to_dict(detected)
 
     output_data = {"microhaplotypes_detected": {bioinfo_id: {'experiment_samples': detected_mhap_dict}},
                    "representative_microhaplotype_sequences": {bioinfo_id: {"representative_microhaplotype_id": bioinfo_id, 'targets': representative_microhaplotype_dict}}
                    }
-    output_data = json.dumps(output_data, indent=4)
     return output_data
 
 
+@instrumented("create_representative_microhaplotype_dict")
 def create_representative_microhaplotype_dict(
         microhaplotype_table: pd.DataFrame,
         locus_col: str,
@@ -75,100 +82,342 @@ def create_representative_microhaplotype_dict(
     :param mhap_col: The name of the column containing the microhaplotype sequence.
     :return: A dictionary formatted for JSON output with representative microhaplotype sequences.
     """
-    # Drop duplicates and reset index
-    unique_table = microhaplotype_table[[
-        locus_col, mhap_col]].drop_duplicates().reset_index(drop=True)
-
-    json_data = {
-        locus: {
-            "seqs": {
-                f"{locus}.{idx}": {
-                    "microhaplotype_id": f"{locus}.{idx}",
-                    "seq": seq
-                }
-                for idx, seq in enumerate(group[mhap_col])
-            }
+    unique_table = create_representative_microhaplotype_table(
+        microhaplotype_table, locus_col, mhap_col)
+    return representative_microhaplotype_table_to_dict(unique_table, locus_col, mhap_col)
+
+
+def representative_microhaplotype_table_to_dict(
+        unique_table: pd.DataFrame,
+        locus_col: str,
+        mhap_col: str
+):
+    """
+    Convert a table of representative microhaplotypes into the representative microhaplotype JSON-like dictionary.
+
+    :param unique_table: Table of representative microhaplotypes, as from create_representative_microhaplotype_table.
+    :param locus_col: The name of the column containing the locus IDs.
+    :param mhap_col: The name of the column containing the microhaplotype sequence.
+    :return: A dictionary formatted for JSON output with representative microhaplotype sequences.
+    """
+    # Loci are output in sorted order, sequences in order of first appearance
+    unique_table = unique_table.sort_values(locus_col, kind="stable")
+    json_data = {}
+    for locus, seq, microhaplotype_id in zip(unique_table[locus_col].tolist(),
+                                             unique_table[mhap_col].tolist(),
+                                             unique_table["microhaplotype_id"].tolist()):
+        if locus not in json_data:
+            json_data[locus] = {"seqs": {}}
+        json_data[locus]["seqs"][microhaplotype_id] = {
+            "microhaplotype_id": microhaplotype_id,
+            "seq": seq
         }
-        for locus, group in unique_table.groupby(locus_col)
-    }
 
     return json_data
 
 
-def create_detected_microhaplotype_dict(
+def create_representative_microhaplotype_table(
+        microhaplotype_table: pd.DataFrame,
+        locus_col: str,
+        mhap_col: str
+):
+    """
+    Assign a representative microhaplotype ID to each unique locus and sequence pair of the calls table.
+
+    :param microhaplotype_table: The parsed microhaplotype calls table.
+    :param locus_col: The name of the column containing the locus IDs.
+    :param mhap_col: The name of the column containing the microhaplotype sequence.
+    :return: A dataframe with one row per unique locus and sequence pair, in order of first appearance, with the locus, the sequence and its microhaplotype_id.
+    """
+    # Factorize each column once so that pairs are deduplicated on integer codes
+    locus_codes, loci = pd.factorize(microhaplotype_table[locus_col])
+    seq_codes, seqs = pd.factorize(
+        microhaplotype_table[mhap_col], use_na_sentinel=False)
+    # Rows without a locus are not assigned an ID
+    has_locus = locus_codes >= 0
+    pair_codes = locus_codes[has_locus].astype(
+        np.int64) * len(seqs) + seq_codes[has_locus]
+    _, unique_pairs = pd.factorize(pair_codes)
+
+    unique_table = pd.DataFrame({
+        locus_col: loci.take(unique_pairs // len(seqs)),
+        mhap_col: seqs.take(unique_pairs % len(seqs)),
+    })
+    # Number the sequences of each locus in order of first appearance
+    seq_numbers = unique_table.groupby(locus_col, sort=False, observed=True).cumcount()
+    unique_table["microhaplotype_id"] = [
+        f"{locus}.{idx}" for locus, idx in zip(unique_table[locus_col].tolist(), seq_numbers.tolist())]
+    return unique_table
+
+
+def representative_microhaplotype_dict_to_table(
+        representative_microhaplotype_dict: dict,
+        locus_col: str,
+        mhap_col: str
+):
+    """
+    Flatten a representative microhaplotype dictionary back into a table.
+
+    :param representative_microhaplotype_dict: Dictionary of representative microhaplotypes.
+    :param locus_col: The name to give the column containing the locus IDs.
+    :param mhap_col: The name to give the column containing the microhaplotype sequence.
+    :return: A dataframe with the locus, the sequence and the microhaplotype_id of each representative microhaplotype.
+    """
+    records = [
+        (locus, seq["seq"], seq["microhaplotype_id"])
+        for locus, reps in representative_microhaplotype_dict.items()
+        for seq in reps["seqs"].values()
+    ]
+    return pd.DataFrame.from_records(records, columns=[locus_col, mhap_col, "microhaplotype_id"])
+
+
+def attach_representative_microhaplotype_ids(
+        microhaplotype_table: pd.DataFrame,
+        representative_table: pd.DataFrame,
+        locus_col: str,
+        mhap_col: str
+):
+    """
+    Look up the representative microhaplotype ID of every row of the calls table.
+
+    The representative sequences are interned in a SequenceStore and only the unique locus and sequence pairs of
+    the calls table are looked up in it, so each sequence string is only hashed once.
+
+    :param microhaplotype_table: The parsed microhaplotype calls table.
+    :param representative_table: Table of representative microhaplotypes, as from create_representative_microhaplotype_table.
+    :param locus_col: The name of the column containing the locus IDs.
+    :param mhap_col: The name of the column containing the microhaplotype sequence.
+    :return: An array of microhaplotype IDs aligned with the rows of the calls table.
+    """
+    # Later entries win if the same sequence was given more than one ID
+    representative_table = representative_table.drop_duplicates(
+        [locus_col, mhap_col], keep="last")
+    representatives = RepresentativeSequenceIndex(
+        representative_table[locus_col].tolist(), representative_table[mhap_col].tolist())
+
+    # Code the rows by their locus and sequence pair, rows without a locus have no pair
+    locus_codes, loci = pd.factorize(microhaplotype_table[locus_col])
+    seq_codes, seqs = pd.factorize(
+        microhaplotype_table[mhap_col], use_na_sentinel=False)
+    has_locus = locus_codes >= 0
+    row_pairs = np.full(len(locus_codes), -1, dtype=np.int64)
+    pair_codes, unique_pairs = pd.factorize(
+        locus_codes[has_locus].astype(np.int64) * len(seqs) + seq_codes[has_locus])
+    row_pairs[has_locus] = pair_codes
+
+    pair_positions = representatives.find(loci.take(unique_pairs // len(seqs)).tolist(),
+                                          seqs.take(unique_pairs % len(seqs)).tolist())
+    positions = np.append(pair_positions, -1)[row_pairs]
+    missing = np.flatnonzero(positions < 0)
+    if missing.size:
+        row = microhaplotype_table.iloc[missing[0]]
+        raise ValueError(
+            f"No representative haplotype ID found for {row[mhap_col]} at locus {row[locus_col]}")
+    return representative_table["microhaplotype_id"].to_numpy()[positions]
+
+
+class RepresentativeSequenceIndex:
+    """
+    The position of each locus and sequence pair of a list of representative microhaplotypes, with the sequences
+    interned in a SequenceStore.
+    """
+
+    def __init__(self, loci, seqs):
+        self._store = SequenceStore()
+        is_text = np.fromiter((isinstance(seq, str) for seq in seqs), dtype=bool, count=len(seqs))
+        text_rows = np.flatnonzero(is_text)
+        handles, _ = self._store.intern_many(
+            [loci[i] for i in text_rows.tolist()], [seqs[i] for i in text_rows.tolist()])
+        self._handle_rows = np.empty(len(self._store), dtype=np.int64)
+        self._handle_rows[handles] = text_rows
+        # Missing sequences cannot be interned, and are kept by locus
+        self._other_rows = {(loci[i], _other_seq_key(seqs[i])): i
+                            for i in np.flatnonzero(~is_text).tolist()}
+
+    def find(self, loci, seqs):
+        """Get the position of each pair, -1 for pairs that are not in the table."""
+        positions = np.full(len(seqs), -1, dtype=np.int64)
+        is_text = np.fromiter((isinstance(seq, str) for seq in seqs), dtype=bool, count=len(seqs))
+        text_rows = np.flatnonzero(is_text)
+        handles = self._store.find_many(
+            [loci[i] for i in text_rows.tolist()], [seqs[i] for i in text_rows.tolist()])
+        positions[text_rows] = np.where(handles >= 0, self._handle_rows[np.maximum(handles, 0)], -1) \
+            if len(self._handle_rows) else -1
+        for i in np.flatnonzero(~is_text).tolist():
+            positions[i] = self._other_rows.get((loci[i], _other_seq_key(seqs[i])), -1)
+        return positions
+
+
+def _other_seq_key(seq):
+    # Missing values are not equal to themselves, so they are all keyed as None
+    return None if pd.isna(seq) else seq
+
+
+@dataclass
+class DetectedMicrohaplotypes:
+    """
+    The rows of a microhaplotype calls table sorted by sample and locus, as integer codes into their unique values.
+
+    This is compact enough to send between processes, and is turned into the detected microhaplotype dictionary by
+    detected_microhaplotypes_to_dict.
+    """
+    sample_ids: list
+    sample_codes: np.ndarray
+    locus_ids: list
+    locus_codes: np.ndarray
+    haplotype_ids: list
+    haplotype_codes: np.ndarray
+    read_counts: pd.Series
+    # Additional columns by the name to give them in the output
+    additional_values: dict = field(default_factory=dict)
+
+    def __len__(self):
+        return len(self.sample_codes)
+
+
+@instrumented("detect_microhaplotypes")
+def detect_microhaplotypes(
     microhaplotype_table: pd.DataFrame,
     sampleID_col: str,
     locus_col: str,
     mhap_col: str,
     reads_col: str,
-    representative_microhaplotype_dict: dict,
+    representative_table: pd.DataFrame,
     additional_hap_detected_cols: list | None = None
 ):
     """
-    Convert the read-in microhaplotype calls table into the detected microhaplotype dictionary.
+    Sort the read-in microhaplotype calls table by sample and locus and look up the representative microhaplotype
+    ID of every row.
 
     :param microhaplotype_table: Parsed microhaplotype calls table.
     :param sampleID_col: Column containing the sample IDs.
     :param locus_col: Column containing the locus IDs.
     :param mhap_col: Column containing the microhaplotype sequences.
     :param reads_col: Column containing the read counts.
-    :param representative_microhaplotype_dict: Dictionary of representative microhaplotypes.
-    :param additional_hap_detected_cols: Optional additional columns to add to the microhaplotypes detected, the key is the pandas column and the value is what to name it in the output.
-    :return: A dictionary of detected microhaplotype results.
+    :param representative_table: Table of representative microhaplotypes, as from create_representative_microhaplotype_table.
+    :param additional_hap_detected_cols: Optional additional columns to add to the microhaplotypes detected.
+    :return: The DetectedMicrohaplotypes of the table.
     """
     # Validate additional columns if provided
     if additional_hap_detected_cols:
         check_additional_columns_exist(
             microhaplotype_table, additional_hap_detected_cols)
 
-    # Map sequences to representative haplotype IDs for fast lookup
-    rep_hap_map = {
-        (locus, seq["seq"]): seq["microhaplotype_id"]
-        for locus, reps in representative_microhaplotype_dict.items()
-        for seq in reps["seqs"].values()
-    }
+    # Rows without a sample or locus ID are dropped, as groupby would do
+    table = microhaplotype_table[
+        microhaplotype_table[sampleID_col].notna() & microhaplotype_table[locus_col].notna()]
+    # Sort once by sample then locus, keeping the original row order within each locus
+    table = table.sort_values([sampleID_col, locus_col], kind="stable")
+
+    # Codes are in order of first appearance, so a new sample or locus starts wherever its code changes
+    sample_codes, sample_ids = pd.factorize(table[sampleID_col])
+    locus_codes, locus_ids = pd.factorize(table[locus_col])
+    haplotype_codes, haplotype_ids = pd.factorize(attach_representative_microhaplotype_ids(
+        table, representative_table, locus_col, mhap_col))
+    return DetectedMicrohaplotypes(
+        sample_ids=sample_ids.tolist(), sample_codes=_compact_codes(sample_codes, len(sample_ids)),
+        locus_ids=locus_ids.tolist(), locus_codes=_compact_codes(locus_codes, len(locus_ids)),
+        haplotype_ids=haplotype_ids.tolist(),
+        haplotype_codes=_compact_codes(haplotype_codes, len(haplotype_ids)),
+        read_counts=table[reads_col].reset_index(drop=True),
+        additional_values={col: table[col].reset_index(drop=True)
+                           for col in additional_hap_detected_cols or []})
+
+
+@instrumented("detected_microhaplotypes_to_dict")
+def detected_microhaplotypes_to_dict(detected: DetectedMicrohaplotypes):
+    """
+    Build the detected microhaplotype dictionary from the sorted rows of a calls table.
 
-    def build_haplotype_info(row):
-        """Helper to construct haplotype info for each row."""
-        locus, seq = row[locus_col], row[mhap_col]
-        matching_id = rep_hap_map.get((locus, seq))
-        if not matching_id:
-            raise ValueError(
-                f"No representative haplotype ID found for {seq} at locus {locus}")
+    :param detected: The DetectedMicrohaplotypes of the table, as from detect_microhaplotypes.
+    :return: A dictionary of detected microhaplotype results.
+    """
+    sample_codes, locus_codes = detected.sample_codes, detected.locus_codes
+    new_sample = np.ones(len(detected), dtype=bool)
+    new_sample[1:] = sample_codes[1:] != sample_codes[:-1]
+    new_locus = new_sample.copy()
+    new_locus[1:] |= locus_codes[1:] != locus_codes[:-1]
+
+    sample_ids = _take(detected.sample_ids, sample_codes)
+    locus_ids = _take(detected.locus_ids, locus_codes)
+    hap_ids = _take(detected.haplotype_ids, detected.haplotype_codes)
+    read_counts = detected.read_counts.tolist()
+    additional_cols = list(detected.additional_values)
+    additional_values = [values.tolist()
+                         for values in detected.additional_values.values()]
+
+    # Build the JSON-like structure in a single pass over the sorted rows
+    json_data = {}
+    n_samples = int(new_sample.sum())
+    samples_done = 0
+    for i, (sample_id, locus, hap_id, read_count) in enumerate(
+            zip(sample_ids, locus_ids, hap_ids, read_counts)):
+        if new_sample[i]:
+            # Also stops here if the conversion is running as a job that was cancelled
+            report_progress(samples_done, n_samples, "samples")
+            samples_done += 1
+            target_results = {}
+            json_data[sample_id] = {
+                "sample_id": sample_id,
+                "target_results": target_results
+            }
+        if new_locus[i]:
+            microhaplotypes = {}
+            target_results[locus] = {"microhaplotypes": microhaplotypes}
 
         haplotype_info = {
-            "haplotype_id": matching_id,
-            "read_count": row[reads_col],
+            "haplotype_id": hap_id,
+            "read_count": read_count,
         }
+        for input_col, values in zip(additional_cols, additional_values):
+            haplotype_info[input_col] = values[i]
 
-        if additional_hap_detected_cols:
-            haplotype_info.update({input_col: row[input_col]
-                                   for input_col in additional_hap_detected_cols})
-
-        return matching_id, haplotype_info
-
-    # Build the JSON-like structure
-    json_data = (
-        microhaplotype_table
-        .groupby(sampleID_col)
-        .apply(lambda sample_group: {
-            "sample_id": sample_group[sampleID_col].iloc[0],
-            "target_results": {
-                locus: {
-                    "microhaplotypes": {
-                        hap_id: hap_info
-                        for _, row in locus_group.iterrows()
-                        for hap_id, hap_info in [build_haplotype_info(row)]
-                    }
-                }
-                for locus, locus_group in sample_group.groupby(locus_col)
-            }
-        })
-        .to_dict()
-    )
+        microhaplotypes[hap_id] = haplotype_info
+    report_progress(n_samples, n_samples, "samples")
     return json_data
 
 
+@instrumented("create_detected_microhaplotype_dict")
+def create_detected_microhaplotype_dict(
+    microhaplotype_table: pd.DataFrame,
+    sampleID_col: str,
+    locus_col: str,
+    mhap_col: str,
+    reads_col: str,
+    representative_microhaplotype_dict: dict,
+    additional_hap_detected_cols: list | None = None
+):
+    """
+    Convert the read-in microhaplotype calls table into the detected microhaplotype dictionary.
+
+    :param microhaplotype_table: Parsed microhaplotype calls table.
+    :param sampleID_col: Column containing the sample IDs.
+    :param locus_col: Column containing the locus IDs.
+    :param mhap_col: Column containing the microhaplotype sequences.
+    :param reads_col: Column containing the read counts.
+    :param representative_microhaplotype_dict: Dictionary of representative microhaplotypes.
+    :param additional_hap_detected_cols: Optional additional columns to add to the microhaplotypes detected, the key is the pandas column and the value is what to name it in the output.
+    :return: A dictionary of detected microhaplotype results.
+    """
+    representative_table = representative_microhaplotype_dict_to_table(
+        representative_microhaplotype_dict, locus_col, mhap_col)
+    detected = detect_microhaplotypes(microhaplotype_table, sampleID_col, locus_col, mhap_col, reads_col,
+                                      representative_table, additional_hap_detected_cols)
+    return detected_microhaplotypes_to_dict(detected)
+
+
+def _compact_codes(codes, n_values):
+    # Codes of n_values unique values in the smallest unsigned integer type that holds them
+    return codes.astype(np.min_scalar_type(max(n_values - 1, 0)))
+
+
+def _take(values, codes):
+    # The values at the given codes, as a list
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array[codes].tolist()
+
+
 def check_additional_columns_exist(df, additional_column_list):
     if additional_column_list:
         missing_cols = set(additional_column_list) - \
@@ -177,6 +426,7 @@ def check_additional_columns_exist(df, additional_column_list):
             raise ValueError(f"Missing additional columns: {missing_cols}")
 
 
+@instrumented("panel_info_table_to_pmo_dict")
 def panel_info_table_to_pmo_dict(target_table: pd.DataFrame,
                                  panel_id: str,
                                  genome_info: dict,
@@ -238,11 +488,10 @@ def panel_info_table_to_pmo_dict(target_table: pd.DataFrame,
     # Put together components
     panel_info_dict = {"panel_info": {panel_id: {"panel_id": panel_id,
                                                  "target_genome": genome_info, "targets": targets_dict}}}
-    # Convert to json format
-    panel_info_json = json.dumps(panel_info_dict, indent=4)
-    return panel_info_json
+    return panel_info_dict
 
 
+@instrumented("create_targets_dict")
 def create_targets_dict(
     target_table: pd.DataFrame,
     target_id_col: str,
@@ -284,62 +533,90 @@ def create_targets_dict(
     check_columns_unique_for_target(
         target_table, target_id_col, columns_to_check)
 
+    # Group the rows by target once, keeping targets in order of first appearance
+    # and the primer pairs of each target in their original order
+    target_codes, target_ids = pd.factorize(target_table[target_id_col])
+    order = np.argsort(target_codes, kind="stable")
+    order = order[target_codes[order] >= 0]
+    offsets = np.concatenate(
+        ([0], np.cumsum(np.bincount(target_codes[order], minlength=len(target_ids)))))
+    first_rows = order[offsets[:-1]]
+
+    def column_values(col, rows, as_int=False):
+        values = target_table[col].take(rows)
+        return (values.astype(np.int64) if as_int else values).tolist()
+
+    def target_values(col, as_int=False):
+        return column_values(col, first_rows, as_int)
+
+    def row_values(col, as_int=False):
+        return column_values(col, order, as_int)
+
+    target_info = {}
+    if gene_id_col:
+        target_info["gene_id"] = target_values(gene_id_col)
+    if target_type_col:
+        target_info["target_type"] = target_values(target_type_col)
+    if additional_target_info_cols:
+        for col in additional_target_info_cols:
+            target_info[col] = convert_column_to_native(
+                target_table[col].take(first_rows))
+    if location_info_cols:
+        insert_locations = [
+            {"chrom": chrom, "start": start, "end": end, "strand": strand}
+            for chrom, start, end, strand in zip(target_values(chrom_col), target_values(insert_start_col, as_int=True),
+                                                 target_values(insert_end_col, as_int=True), target_values(strand_col))
+        ]
+
+    # Extract primer information for each row
+    fwd_primers = [{"seq": seq}
+                   for seq in row_values(forward_primers_seq_col)]
+    rev_primers = [{"seq": seq}
+                   for seq in row_values(reverse_primers_seq_col)]
+    if location_info_cols:
+        chroms = row_values(chrom_col)
+        strands = row_values(strand_col)
+        for primers, start_col, end_col in [(fwd_primers, forward_primers_start_col, forward_primers_end_col),
+                                            (rev_primers, reverse_primers_start_col, reverse_primers_end_col)]:
+            for primer_dict, chrom, end, start, strand in zip(primers, chroms, row_values(end_col, as_int=True),
+                                                              row_values(start_col, as_int=True), strands):
+                primer_dict["location"] = {
+                    "chrom": chrom,
+                    "end": end,
+                    "start": start,
+                    "strand": strand
+                }
+
     # Put targets together in dictionary
     targets_dict = {}
-    for target_id in target_table[target_id_col].unique():
-        target_df = target_table.loc[target_table[target_id_col] == target_id]
+    for i, target_id in enumerate(target_ids.tolist()):
+        report_progress(i, len(target_ids), "targets")
+        start, end = offsets[i], offsets[i + 1]
         target_dict = {
             "target_id": target_id,
-            "forward_primers": [],
-            "reverse_primers": [],
+            "forward_primers": fwd_primers[start:end],
+            "reverse_primers": rev_primers[start:end],
         }
-        if gene_id_col:
-            target_dict["gene_id"] = target_df[gene_id_col].iloc[0]
-        if target_type_col:
-            target_dict["target_type"] = target_df[target_type_col].iloc[0]
-        if additional_target_info_cols:
-            for col in additional_target_info_cols:
-                value = target_df[col].iloc[0]
-                # Convert numpy types to native Python types
-                if isinstance(value, (np.integer, np.int64)):
-                    value = int(value)
-                elif isinstance(value, (np.floating, np.float64)):
-                    value = float(value)
-                elif pd.isna(value):
-                    value = None
-                target_dict[col] = value
+        for key, values in target_info.items():
+            target_dict[key] = values[i]
         # Add insert location info if location_info_cols are provided
         if location_info_cols:
-            target_dict["insert_location"] = {
-                "chrom": target_df[chrom_col].iloc[0],
-                "start": int(target_df[insert_start_col].iloc[0]),
-                "end": int(target_df[insert_end_col].iloc[0]),
-                "strand": target_df[strand_col].iloc[0]
-            }
-        # Extract primer information for each row
-        for _, row in target_df.iterrows():
-            fwd_primer_dict = {"seq": row[forward_primers_seq_col]}
-            rev_primer_dict = {"seq": row[reverse_primers_seq_col]}
-            if location_info_cols:
-                fwd_primer_dict["location"] = {
-                    "chrom": row[chrom_col],
-                    "end": int(row[forward_primers_end_col]),
-                    "start": int(row[forward_primers_start_col]),
-                    "strand": row[strand_col]
-                }
-                rev_primer_dict["location"] = {
-                    "chrom": row[chrom_col],
-                    "end": int(row[reverse_primers_end_col]),
-                    "start": int(row[reverse_primers_start_col]),
-                    "strand": row[strand_col]
-                }
-            target_dict["forward_primers"].append(fwd_primer_dict)
-            target_dict["reverse_primers"].append(rev_primer_dict)
-
+            target_dict["insert_location"] = insert_locations[i]
         targets_dict[target_id] = target_dict
+    report_progress(len(target_ids), len(target_ids), "targets")
     return targets_dict
 
 
+def convert_column_to_native(column: pd.Series):
+    """
+    Convert a column to a list of native Python values, with missing values in non-numeric columns as None.
+
+    :param column: the column to convert
+    :return: a list of the column values
+    """
+    return column_to_native(column)
+
+
 def check_location_columns(
     forward_primers_start_col,
     forward_primers_end_col,
@@ -369,11 +646,18 @@ def check_location_columns(
     return None
 
 
+@instrumented("check_columns_unique_for_target")
 def check_columns_unique_for_target(df, target_id_col, columns_to_check):
+    columns_to_check = list(dict.fromkeys(columns_to_check))
+    if not columns_to_check:
+        return
+    # Count the values of all columns for each target in a single grouped pass
+    counts = df.groupby(target_id_col, observed=True)[columns_to_check].nunique()
+    errors = []
     for col in columns_to_check:
-        duplicates = df.groupby(target_id_col)[col].nunique()
-        duplicates = duplicates[duplicates > 1]
-        if not duplicates.empty:
-            duplicate_targets = duplicates.index.tolist()
-            raise ValueError(
+        duplicate_targets = counts.index[counts[col].to_numpy() > 1].tolist()
+        if duplicate_targets:
+            errors.append(
                 f"The following target_ids have multiple unique {col}: {duplicate_targets}")
+    if errors:
+        raise ValueError("\n".join(errors))
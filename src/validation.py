@@ -0,0 +1,204 @@
+from dataclasses import asdict, dataclass, field
+import numpy as np
+import pandas as pd
+from src.instrumentation import instrumented
+
+# Number of example rows or targets named in a violation message
+MAX_EXAMPLES = 10
+# Optional coordinate fields of the panel table, as (start, end) pairs
+COORDINATE_FIELDS = [("forward_primers_start", "forward_primers_end"),
+                     ("reverse_primers_start", "reverse_primers_end"),
+                     ("insert_start", "insert_end")]
+# PMO fields that must be mapped to a column of each table
+REQUIRED_PANEL_FIELDS = ["target_id", "forward_primers", "reverse_primers"]
+REQUIRED_MHAP_FIELDS = ["sampleID", "locus", "asv", "reads"]
+
+
+@dataclass
+class Violation:
+    """A problem found in an input table."""
+    check: str
+    column: str | None
+    message: str
+    count: int = 0
+    examples: list = field(default_factory=list)
+
+
+class ValidationError(ValueError):
+    """Raised with every violation found in an input table."""
+
+    def __init__(self, violations):
+        self.violations = violations
+        super().__init__("\n".join(v.message for v in violations))
+
+
+def violations_to_records(violations):
+    """Get violations as a list of dictionaries, e.g. to build a table."""
+    return [asdict(v) for v in violations]
+
+
+def raise_for_violations(violations):
+    """Raise a ValidationError listing all of the violations, if there are any."""
+    if violations:
+        raise ValidationError(violations)
+
+
+@instrumented("validate_panel_table")
+def validate_panel_table(df, field_mapping, additional_target_info_cols=None, unique_per_target_cols=None):
+    """
+    Check a panel information table before it is transformed, returning every violation rather than
+    stopping at the first.
+
+    Checks that the required fields are mapped, that the mapped and additional columns exist, that target IDs
+    and primer sequences are present, that the coordinates of any mapped start and end fields are non-negative
+    integers with the start before the end, and that the additional columns and unique_per_target_cols have a
+    single value per target.
+
+    :param df: the panel information table
+    :param field_mapping: the mapping of the PMO fields to the columns of the table
+    :param additional_target_info_cols: additional columns to be added to the target information
+    :param unique_per_target_cols: other columns that must have one value per target, e.g. the chromosome
+    :return: a list of Violations, empty if the table is valid
+    """
+    violations = _unmapped_fields(field_mapping, REQUIRED_PANEL_FIELDS) + _missing_columns(
+        df, field_mapping, additional_target_info_cols)
+    present = set(df.columns)
+    target_id_col = field_mapping.get("target_id")
+
+    for pmo_field in REQUIRED_PANEL_FIELDS:
+        col = field_mapping.get(pmo_field)
+        if col in present:
+            violations += _null_values(df, col, pmo_field)
+    for start_field, end_field in COORDINATE_FIELDS:
+        start_col, end_col = field_mapping.get(
+            start_field), field_mapping.get(end_field)
+        if start_col in present and end_col in present:
+            violations += _coordinate_violations(df, start_col, end_col)
+
+    if target_id_col in present:
+        columns_to_check = [col for col in dict.fromkeys(
+            list(additional_target_info_cols or []) + list(unique_per_target_cols or [])) if col in present]
+        violations += _not_unique_for_target(df,
+                                             target_id_col, columns_to_check)
+    return violations
+
+
+@instrumented("validate_mhap_table")
+def validate_mhap_table(df, field_mapping, additional_hap_detected_cols=None):
+    """
+    Check a microhaplotype table before it is transformed, returning every violation rather than stopping
+    at the first.
+
+    Checks that the required fields are mapped, that the mapped and additional columns exist, that sample IDs,
+    loci and sequences are present, that read counts are non-negative integers, and that no sequence is called
+    twice for the same sample and locus.
+
+    :param df: the microhaplotype table
+    :param field_mapping: the mapping of the PMO fields to the columns of the table
+    :param additional_hap_detected_cols: additional columns to be added to the microhaplotypes detected
+    :return: a list of Violations, empty if the table is valid
+    """
+    violations = _unmapped_fields(field_mapping, REQUIRED_MHAP_FIELDS) + _missing_columns(
+        df, field_mapping, additional_hap_detected_cols)
+    present = set(df.columns)
+    for pmo_field in REQUIRED_MHAP_FIELDS:
+        col = field_mapping.get(pmo_field)
+        if col in present:
+            violations += _null_values(df, col, pmo_field)
+
+    reads_col = field_mapping.get("reads")
+    if reads_col in present:
+        reads = df[reads_col]
+        if not pd.api.types.is_numeric_dtype(reads):
+            violations.append(Violation(
+                "read_count", reads_col, f"Read counts in {reads_col} are not numbers", len(df)))
+        else:
+            values = reads.to_numpy(dtype=float, na_value=np.nan)
+            not_whole = (np.round(values) != values) & ~np.isnan(values)
+            invalid = np.flatnonzero((values < 0) | not_whole)
+            if invalid.size:
+                violations.append(_row_violation(
+                    "read_count", reads_col, f"Read counts in {reads_col} are not non-negative whole numbers",
+                    df, invalid))
+
+    key_cols = [field_mapping.get(pmo_field)
+                for pmo_field in ["sampleID", "locus", "asv"]]
+    if all(col in present for col in key_cols):
+        duplicated = np.flatnonzero(df.duplicated(key_cols).to_numpy())
+        if duplicated.size:
+            violations.append(_row_violation(
+                "duplicate_call", None,
+                f"The same sequence is called more than once for a sample and locus ({', '.join(key_cols)})",
+                df, duplicated))
+    return violations
+
+
+def _unmapped_fields(field_mapping, required_fields):
+    return [Violation("unmapped_field", None, f"No column is mapped to {pmo_field}")
+            for pmo_field in required_fields if field_mapping.get(pmo_field) is None]
+
+
+def _missing_columns(df, field_mapping, additional_cols):
+    violations = []
+    for pmo_field, col in field_mapping.items():
+        if col is not None and col not in df.columns:
+            violations.append(Violation(
+                "missing_column", col, f"Column {col} mapped to {pmo_field} is missing"))
+    for col in additional_cols or []:
+        if col not in df.columns:
+            violations.append(Violation(
+                "missing_column", col, f"Additional column {col} is missing"))
+    return violations
+
+
+def _null_values(df, col, pmo_field):
+    missing = np.flatnonzero(df[col].isna().to_numpy())
+    if not missing.size:
+        return []
+    return [_row_violation("missing_value", col, f"Column {col} mapped to {pmo_field} has empty values",
+                           df, missing)]
+
+
+def _coordinate_violations(df, start_col, end_col):
+    starts = pd.to_numeric(df[start_col], errors="coerce").to_numpy(
+        dtype=float, na_value=np.nan)
+    ends = pd.to_numeric(df[end_col], errors="coerce").to_numpy(
+        dtype=float, na_value=np.nan)
+    not_integer = np.isnan(starts) | np.isnan(ends) | (
+        np.round(starts) != starts) | (np.round(ends) != ends)
+    invalid = np.flatnonzero(not_integer | (starts < 0) | (starts > ends))
+    if not invalid.size:
+        return []
+    return [_row_violation("coordinates", f"{start_col}, {end_col}",
+                           f"Coordinates {start_col} and {end_col} are not whole numbers with 0 <= start <= end",
+                           df, invalid)]
+
+
+def _not_unique_for_target(df, target_id_col, columns_to_check):
+    if not columns_to_check:
+        return []
+    # Count the values of every column for each target in a single grouped pass
+    counts = df.groupby(target_id_col, observed=True)[
+        columns_to_check].nunique()
+    violations = []
+    for col in columns_to_check:
+        targets = counts.index[counts[col].to_numpy() > 1].tolist()
+        if targets:
+            violations.append(Violation(
+                "not_unique_for_target", col,
+                f"The following target_ids have multiple unique {col}: {_examples(targets)}",
+                len(targets), targets[:MAX_EXAMPLES]))
+    return violations
+
+
+def _row_violation(check, column, message, df, positions):
+    # Report the rows by their index labels, as shown when the table is displayed
+    rows = df.index[positions[:MAX_EXAMPLES]].tolist()
+    return Violation(check, column, f"{message}, e.g. rows {_examples(rows, len(positions))}",
+                     len(positions), rows)
+
+
+def _examples(values, count=None):
+    count = len(values) if count is None else count
+    shown = ", ".join(str(value) for value in values[:MAX_EXAMPLES])
+    return shown if count <= MAX_EXAMPLES else f"{shown} and {count - MAX_EXAMPLES} more"
@@ -0,0 +1,100 @@
+import json
+import threading
+import pytest
+from src.ai_matcher import LocalMatcherBackend, MatcherBackend, ResponseCache, ai_match_sheets, parse_reply
+
+SCHEMA = ["sampleID", "locus", "asv", "reads"]
+COLUMNS = ["sample", "target", "sequence", "reads", "plate"]
+REPLY = {"sample": "sampleID", "target": "locus", "sequence": "asv", "reads": "reads"}
+MAPPING = {"sampleID": "sample", "locus": "target", "asv": "sequence", "reads": "reads"}
+
+
+class FakeBackend(MatcherBackend):
+    """Replies with the given text for each sheet, by its first column, counting the requests."""
+    model = "fake"
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def suggest(self, field_names, target_schema):
+        with self._lock:
+            self.requests.append(field_names[0])
+        reply = self.replies[field_names[0]]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.mark.parametrize("reply", [
+    json.dumps(REPLY),
+    f"```json\n{json.dumps(REPLY, indent=2)}\n```",
+    f"  ```\n{json.dumps(REPLY)}\n```\n",
+])
+def test_parse_reply_reads_plain_and_fenced_json(reply):
+    assert parse_reply(reply, COLUMNS, SCHEMA) == (MAPPING, ["plate"])
+
+
+@pytest.mark.parametrize("reply", ["", None, "sample -> sampleID", "```json\n{\"sample\": \n```", "[1, 2]"])
+def test_parse_reply_rejects_replies_that_are_not_json_objects(reply):
+    with pytest.raises(RuntimeError, match="AI matching failed"):
+        parse_reply(reply, COLUMNS, SCHEMA)
+
+
+def test_parse_reply_ignores_unknown_matches_and_keeps_the_first_column_of_a_field():
+    reply = {"plate": "sampleID", "sample": "sampleID", "unknown": "locus", "target": "gene", "reads": "reads"}
+
+    matches, unused = parse_reply(json.dumps(reply), COLUMNS, SCHEMA)
+
+    # sample comes before plate in the columns
+    assert matches["sampleID"] == "sample" and matches["reads"] == "reads"
+    assert "gene" not in matches and "unknown" not in matches.values()
+    assert "plate" in unused
+
+
+def test_parse_reply_fuzzy_matches_the_fields_the_reply_leaves_out():
+    reply = {"sample": "sampleID", "sequence": "asv"}
+
+    matches, unused = parse_reply(json.dumps(reply), ["sample", "locus_name", "sequence", "read_count"], SCHEMA)
+
+    assert matches == {"sampleID": "sample", "locus": "locus_name", "asv": "sequence", "reads": "read_count"}
+    assert unused == []
+
+
+def test_matcher_backend_is_abstract():
+    with pytest.raises(TypeError):
+        MatcherBackend()
+
+
+def test_sheets_are_requested_once_and_cached():
+    backend = FakeBackend({"sample": json.dumps(REPLY), "reads": json.dumps({"reads": "reads"})})
+    cache = ResponseCache()
+    sheets = [(COLUMNS, SCHEMA), (["reads"], SCHEMA), (COLUMNS, SCHEMA)]
+
+    results = ai_match_sheets(sheets, backend, cache=cache)
+    again = ai_match_sheets(sheets, backend, cache=cache)
+
+    assert results == again
+    assert results[0] == results[2] == (MAPPING, ["plate"])
+    assert results[1] == ({"reads": "reads"}, [])
+    assert sorted(backend.requests) == ["reads", "sample"]
+
+
+def test_valid_replies_are_cached_when_another_sheet_fails():
+    backend = FakeBackend({"sample": json.dumps(REPLY), "bad": "not json", "down": OSError("timed out")})
+    cache = ResponseCache()
+
+    with pytest.raises(RuntimeError, match="not valid JSON"):
+        ai_match_sheets([(["bad"], SCHEMA), (COLUMNS, SCHEMA), (["down"], SCHEMA)], backend, cache=cache)
+    with pytest.raises(RuntimeError, match="timed out"):
+        ai_match_sheets([(["down"], SCHEMA)], backend, cache=cache)
+
+    assert ai_match_sheets([(COLUMNS, SCHEMA)], backend, cache=cache) == [(MAPPING, ["plate"])]
+    assert backend.requests.count("sample") == 1 and backend.requests.count("down") == 2
+
+
+def test_local_backend_replies_with_the_fuzzy_matches():
+    reply = LocalMatcherBackend().suggest(["sampleID", "locus", "asv", "reads"], SCHEMA)
+
+    assert json.loads(reply) == {field: field for field in SCHEMA}
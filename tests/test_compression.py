@@ -0,0 +1,54 @@
+import gzip
+import io
+import pytest
+from src import compression
+from src.compression import codec_from_path, open_text_input, open_text_output
+
+TEXT = '{"seq": "ACGT", "name": "é☃"}\n' * 100
+
+CODECS = ["none", "gzip", pytest.param("zstd", marks=pytest.mark.skipif(
+    "zstd" not in compression.available_codecs(), reason="zstandard is not installed"))]
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_file_round_trip(tmp_path, codec):
+    path = tmp_path / "pmo.json"
+
+    with open_text_output(str(path), codec) as f:
+        f.write(TEXT)
+
+    assert compression.codec_from_header(path.read_bytes()[:4]) == (None if codec == "none" else codec)
+    with open_text_input(str(path)) as f:
+        assert f.read() == TEXT
+
+
+@pytest.mark.parametrize("codec", CODECS[1:])
+def test_stream_round_trip(codec):
+    stream = io.BytesIO()
+
+    with open_text_output(stream, codec) as f:
+        f.write(TEXT)
+
+    assert not stream.closed
+    with open_text_input(io.BytesIO(stream.getvalue())) as f:
+        assert f.read() == TEXT
+
+
+def test_codec_is_taken_from_the_suffix(tmp_path):
+    path = tmp_path / "pmo.json.gz"
+
+    with open_text_output(str(path)) as f:
+        f.write(TEXT)
+
+    assert codec_from_path(path) == "gzip" and codec_from_path(tmp_path / "pmo.json") is None
+    assert gzip.decompress(path.read_bytes()).decode() == TEXT
+
+
+def test_uncompressed_stream_is_rejected():
+    with pytest.raises(ValueError):
+        open_text_output(io.BytesIO())
+
+
+def test_unknown_codec_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unknown compression"):
+        open_text_output(str(tmp_path / "pmo.json"), "brotli")
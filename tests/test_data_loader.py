@@ -0,0 +1,70 @@
+import importlib.util
+import io
+import pandas as pd
+import pytest
+from src import data_loader
+from src.data_loader import concat_tables, load_csv, load_csvs
+
+MAPPING = {"sampleID": "sample", "locus": "locus", "asv": "asv", "reads": "reads"}
+HEADER = "sample\tlocus\tasv\treads\n"
+
+
+@pytest.fixture(params=["c", pytest.param("pyarrow", marks=pytest.mark.skipif(
+    not importlib.util.find_spec("pyarrow"), reason="pyarrow is not installed"))])
+def engine(request, monkeypatch):
+    # With the C parser the files are parsed one by one and combined by concat_tables, with pyarrow they are
+    # joined and parsed once
+    monkeypatch.setattr(data_loader, "_fast_engine", lambda: request.param)
+    return request.param
+
+
+def plate(*rows):
+    return io.BytesIO((HEADER + "".join("\t".join(map(str, row)) + "\n" for row in rows)).encode())
+
+
+def test_loading_several_files_matches_loading_them_as_one(engine):
+    plates = [[(10, "locus_1", "ACGT", 5), (2, "locus_2", "ACGA", 7)],
+              [(2, "locus_1", "ACGT", 3), (1, "locus_3", "TTTT", 1)]]
+
+    df = load_csvs([plate(*rows) for rows in plates], MAPPING)
+
+    assert df.equals(load_csv(plate(*plates[0], *plates[1]), MAPPING))
+    assert list(df["sample"].cat.categories) == [1, 2, 10]
+    assert str(df["reads"].dtype) == "uint32"
+
+
+def test_numeric_ids_with_a_missing_id_are_combined_as_numbers(engine):
+    # The second plate has a missing sample ID, so its IDs load as floats and the first plate's as integers
+    plates = [[(1, "locus_1", "ACGT", 5)], [("", "locus_1", "ACGT", 3), (1, "locus_2", "ACGA", 7)]]
+
+    df = load_csvs([plate(*rows) for rows in plates], MAPPING)
+
+    assert df["sample"].tolist()[::2] == [1.0, 1.0]
+    assert df["sample"].isna().tolist() == [False, True, False]
+    assert df.equals(load_csv(plate(*plates[0], *plates[1]), MAPPING))
+
+
+def test_numeric_and_text_ids_are_combined_as_text(engine):
+    plates = [[(1, "locus_1", "ACGT", 5), (2, "locus_1", "ACGA", 1)],
+              [("1", "locus_1", "ACGT", 3), ("x2", "locus_2", "ACGA", 7)]]
+
+    df = load_csvs([plate(*rows) for rows in plates], MAPPING)
+
+    assert df["sample"].tolist() == ["1", "2", "1", "x2"]
+    assert list(df["sample"].cat.categories) == ["1", "2", "x2"]
+
+
+def test_concat_tables_keeps_numeric_categories_of_an_empty_table():
+    tables = [pd.DataFrame({"sample": pd.Categorical([3, 1])}), pd.DataFrame({"sample": pd.Categorical([])})]
+
+    df = concat_tables(tables)
+
+    assert df["sample"].tolist() == [3, 1]
+    assert list(df["sample"].cat.categories) == [1, 3]
+
+
+def test_files_with_different_columns_are_rejected(engine):
+    other = io.BytesIO(b"sample\tlocus\tasv\tcount\n1\tlocus_1\tACGT\t5\n")
+
+    with pytest.raises(ValueError, match="missing columns \\['reads'\\]"):
+        load_csvs([plate((1, "locus_1", "ACGT", 5)), other], MAPPING)
@@ -0,0 +1,99 @@
+import itertools
+import numpy as np
+import pytest
+from fuzzywuzzy import fuzz, utils
+from src.field_matcher import fuzzy_match_fields, fuzzy_score_matrix, optimal_assignment
+
+MHAP_SCHEMA = ["sampleID", "locus", "asv", "reads"]
+
+
+def best_total(scores):
+    # The best total score of a one-to-one assignment, by trying every assignment
+    n_rows, n_cols = scores.shape
+    if n_rows >= n_cols:
+        return max(sum(scores[row, col] for col, row in enumerate(rows))
+                   for rows in itertools.permutations(range(n_rows), n_cols))
+    return max(sum(scores[row, col] for row, col in enumerate(cols))
+               for cols in itertools.permutations(range(n_cols), n_rows))
+
+
+def assignment_total(scores, assignment):
+    assert len(assignment) == min(scores.shape)
+    assert len(set(assignment.values())) == len(assignment)
+    return sum(scores[row, col] for col, row in assignment.items())
+
+
+def test_optimal_assignment_beats_the_greedy_choice():
+    # Taking the best score of the first column first would give 9 + 1
+    scores = np.array([[9.0, 8.0], [7.0, 1.0]])
+
+    assert optimal_assignment(scores) == {0: 1, 1: 0}
+
+
+def test_optimal_assignment_with_tied_scores():
+    scores = np.full((3, 3), 50.0)
+
+    assignment = optimal_assignment(scores)
+
+    assert assignment_total(scores, assignment) == 150
+
+
+@pytest.mark.parametrize("shape", [(5, 2), (2, 5)])
+def test_optimal_assignment_of_non_square_matrix(shape):
+    # More fields than schema fields, and the other way round
+    scores = np.arange(np.prod(shape), dtype=float).reshape(shape) % 7
+
+    assignment = optimal_assignment(scores)
+
+    assert assignment_total(scores, assignment) == best_total(scores)
+
+
+def test_optimal_assignment_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        n_rows, n_cols = rng.integers(1, 7, size=2)
+        # Few distinct values, so ties are common
+        scores = rng.integers(0, rng.choice([5, 100]), size=(n_rows, n_cols)).astype(float)
+
+        assert assignment_total(scores, optimal_assignment(scores)) == best_total(scores)
+
+
+def test_optimal_assignment_of_empty_matrix():
+    assert optimal_assignment(np.zeros((0, 4))) == {}
+    assert optimal_assignment(np.zeros((3, 0))) == {}
+
+
+def test_score_matrix_matches_pairwise_scores():
+    field_names = ["Sample ID", "sample_id", "LOCUS", "asv_col", "#", "", "read count", "plate"]
+
+    scores = fuzzy_score_matrix(field_names, MHAP_SCHEMA)
+
+    expected = [[fuzz.WRatio(utils.full_process(field, force_ascii=True),
+                             utils.full_process(schema_field, force_ascii=True), full_process=False)
+                 for schema_field in MHAP_SCHEMA] for field in field_names]
+    np.testing.assert_array_equal(scores, expected)
+
+
+def test_matches_exact_names_regardless_of_order():
+    field_names = ["reads", "plate", "asv", "sampleID", "locus"]
+
+    matches, unused = fuzzy_match_fields(field_names, MHAP_SCHEMA)
+
+    assert matches == {field: field for field in MHAP_SCHEMA}
+    assert unused == ["plate"]
+    assert fuzzy_match_fields(field_names[::-1], MHAP_SCHEMA)[0] == matches
+
+
+def test_leaves_fields_without_a_good_match_unmatched():
+    matches, unused = fuzzy_match_fields(["sample", "amplicon", "seq", "count"], MHAP_SCHEMA)
+
+    assert matches == {"sampleID": "sample"}
+    assert unused == ["amplicon", "seq", "count"]
+
+
+def test_threshold_of_zero_matches_every_field():
+    matches, unused = fuzzy_match_fields(
+        ["sample", "amplicon", "seq", "count"], MHAP_SCHEMA, score_threshold=0)
+
+    assert set(matches) == set(MHAP_SCHEMA)
+    assert unused == []
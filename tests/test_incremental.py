@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+from benchmarks.generators import generate_microhaplotype_table
+from src.incremental import update_microhaplotype_pmo_dict
+from src.transformer import microhaplotype_table_to_pmo_dict
+
+
+def called_sequences(pmo, bioinfo_id):
+    # The read count of each sequence called at each locus of each sample, regardless of the haplotype IDs
+    targets = pmo["representative_microhaplotype_sequences"][bioinfo_id]["targets"]
+    samples = pmo["microhaplotypes_detected"][bioinfo_id]["experiment_samples"]
+    return {(sample_id, locus, targets[locus]["seqs"][haplotype_id]["seq"]): haplotype["read_count"]
+            for sample_id, sample in samples.items()
+            for locus, result in sample["target_results"].items()
+            for haplotype_id, haplotype in result["microhaplotypes"].items()}
+
+
+@pytest.fixture
+def table():
+    return generate_microhaplotype_table(20, 6, seed=1)
+
+
+@pytest.fixture
+def previous(table):
+    return update_microhaplotype_pmo_dict(table, "run")
+
+
+def test_first_conversion_is_a_full_conversion(table, previous):
+    assert previous.pmo_data == microhaplotype_table_to_pmo_dict(table, "run")
+    assert previous.rebuilt_samples == sorted(table["sampleID"].unique())
+
+
+def test_changed_read_counts_match_a_full_conversion(table, previous):
+    updated = table.copy()
+    resequenced = updated["sampleID"].isin(["sample_000003", "sample_000011"])
+    updated.loc[resequenced, "reads"] += 1
+
+    conversion = update_microhaplotype_pmo_dict(updated, "run", previous)
+
+    full = microhaplotype_table_to_pmo_dict(updated, "run")
+    assert conversion.pmo_data == full
+    assert list(conversion.pmo_data["microhaplotypes_detected"]["run"]["experiment_samples"]) == \
+        list(full["microhaplotypes_detected"]["run"]["experiment_samples"])
+    assert conversion.rebuilt_samples == ["sample_000003", "sample_000011"]
+    assert conversion.added_sequences == 0
+    # Unchanged samples are reused rather than rebuilt
+    samples = conversion.pmo_data["microhaplotypes_detected"]["run"]["experiment_samples"]
+    assert samples["sample_000000"] is \
+        previous.pmo_data["microhaplotypes_detected"]["run"]["experiment_samples"]["sample_000000"]
+
+
+def test_new_sequences_and_samples_match_a_full_conversion(table, previous):
+    new_rows = pd.DataFrame({"sampleID": ["sample_000003", "sample_999999"], "locus": ["locus_00001"] * 2,
+                             "asv": ["ACGTACGT", "ACGTACGT"], "reads": [10, 20]})
+    updated = pd.concat([table[table["sampleID"] != "sample_000005"], new_rows], ignore_index=True)
+
+    conversion = update_microhaplotype_pmo_dict(updated, "run", previous)
+
+    assert called_sequences(conversion.pmo_data, "run") == \
+        called_sequences(microhaplotype_table_to_pmo_dict(updated, "run"), "run")
+    assert conversion.rebuilt_samples == ["sample_000003", "sample_999999"]
+    assert conversion.removed_samples == ["sample_000005"]
+    assert conversion.added_sequences == 1
+    # Sequences keep their IDs, and the new one is numbered after the existing ones of its locus
+    previous_seqs = previous.pmo_data["representative_microhaplotype_sequences"]["run"]["targets"]["locus_00001"][
+        "seqs"]
+    seqs = conversion.pmo_data["representative_microhaplotype_sequences"]["run"]["targets"]["locus_00001"]["seqs"]
+    assert list(seqs)[:-1] == list(previous_seqs)
+    assert seqs[list(seqs)[-1]]["seq"] == "ACGTACGT"
+
+
+def test_other_columns_are_converted_in_full(table, previous):
+    conversion = update_microhaplotype_pmo_dict(table, "run", previous, additional_hap_detected_cols=["reads"])
+
+    assert conversion.rebuilt_samples == previous.rebuilt_samples
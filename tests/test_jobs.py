@@ -0,0 +1,76 @@
+import threading
+import pytest
+from src.jobs import JobCancelled, JobQueue, job_key
+from src.progress import report_progress
+
+
+def work(started, release, result):
+    started.set()
+    release.wait(5)
+    report_progress(1, 1, "samples")
+    return result
+
+
+@pytest.fixture
+def queue():
+    return JobQueue(max_workers=1)
+
+
+def test_same_key_returns_the_running_job(queue):
+    started, release = threading.Event(), threading.Event()
+    key = job_key("table", {"sampleID": "sample"})
+
+    job = queue.submit(key, work, started, release, "result")
+    again = queue.submit(key, work, started, release, "other")
+    release.set()
+
+    assert again is job
+    assert job.result(5) == "result"
+    assert (job.done, job.total, job.unit) == (1, 1, "samples")
+    assert queue.submit(key, work, started, release, "other") is job
+
+
+def test_resubmitting_while_the_cancelled_job_stops_starts_a_new_job(queue):
+    started, release = threading.Event(), threading.Event()
+    job = queue.submit("key", work, started, release, "first")
+    assert started.wait(5)
+
+    job.cancel()
+    # The job is still running until its next progress report
+    assert job.cancel_requested and not job.finished
+    resubmitted = queue.submit("key", work, threading.Event(), release, "second")
+    release.set()
+
+    assert resubmitted is not job
+    with pytest.raises(JobCancelled):
+        job.result(5)
+    assert job.cancelled
+    assert resubmitted.result(5) == "second"
+    assert queue.get("key") is resubmitted
+
+
+def test_cancelling_a_queued_job_stops_it_before_it_starts(queue):
+    started, release = threading.Event(), threading.Event()
+    queue.submit("running", work, started, release, None)
+    queued_started = threading.Event()
+    queued = queue.submit("queued", work, queued_started, release, None)
+
+    queue.cancel("queued")
+    release.set()
+
+    with pytest.raises(JobCancelled):
+        queued.result(5)
+    assert queued.cancelled and not queued.failed
+    assert not queued_started.is_set()
+
+
+def test_failed_job_is_run_again(queue):
+    def fail():
+        raise ValueError("bad table")
+
+    job = queue.submit("key", fail)
+    with pytest.raises(ValueError):
+        job.result(5)
+    assert job.failed
+
+    assert queue.submit("key", lambda: "fixed").result(5) == "fixed"
@@ -0,0 +1,60 @@
+import json
+import pytest
+from src import mapping_cache
+from src.mapping_cache import cached_auto_match_fields, get_cached_mapping, invalidate_mapping, save_mapping
+
+SCHEMA = ["sampleID", "locus", "asv", "reads"]
+COLUMNS = ["sample", "locus", "asv", "reads", "plate"]
+MAPPING = {"sampleID": "sample", "locus": "locus", "asv": "asv", "reads": "reads"}
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "cache" / "mappings.json")
+
+
+def test_saved_mapping_is_read_back(cache_path):
+    save_mapping(COLUMNS, SCHEMA, "fuzzy", MAPPING, cache_path)
+
+    assert get_cached_mapping(COLUMNS, SCHEMA, "fuzzy", cache_path) == (MAPPING, ["plate"])
+    assert get_cached_mapping(COLUMNS, SCHEMA, "ai", cache_path) is None
+    assert get_cached_mapping(COLUMNS[::-1], SCHEMA, "fuzzy", cache_path) is None
+
+    assert invalidate_mapping(COLUMNS, SCHEMA, "fuzzy", cache_path)
+    assert get_cached_mapping(COLUMNS, SCHEMA, "fuzzy", cache_path) is None
+
+
+def test_matching_does_not_save_the_suggestion(cache_path):
+    mapping, unused, from_cache = cached_auto_match_fields(COLUMNS, SCHEMA, cache_path=cache_path)
+
+    assert mapping == MAPPING and unused == ["plate"] and not from_cache
+    assert get_cached_mapping(COLUMNS, SCHEMA, "fuzzy", cache_path) is None
+
+    save_mapping(COLUMNS, SCHEMA, "fuzzy", {**MAPPING, "reads": "plate"}, cache_path)
+    assert cached_auto_match_fields(COLUMNS, SCHEMA, cache_path=cache_path) == (
+        {**MAPPING, "reads": "plate"}, ["reads"], True)
+
+
+def test_oldest_saved_mappings_are_evicted_even_if_read(cache_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(mapping_cache.time, "time", lambda: next(clock))
+    headers = [[f"column_{i}"] for i in range(4)]
+    for header in headers[:3]:
+        save_mapping(header, SCHEMA, "fuzzy", {"sampleID": header[0]}, cache_path, max_entries=3)
+    assert get_cached_mapping(headers[0], SCHEMA, "fuzzy", cache_path) is not None
+
+    save_mapping(headers[3], SCHEMA, "fuzzy", {"sampleID": "column_3"}, cache_path, max_entries=3)
+
+    assert [get_cached_mapping(header, SCHEMA, "fuzzy", cache_path) is not None
+            for header in headers] == [False, True, True, True]
+
+
+def test_unreadable_cache_is_treated_as_empty(cache_path, tmp_path):
+    (tmp_path / "cache").mkdir()
+    with open(cache_path, "w") as f:
+        f.write("{not json")
+
+    assert get_cached_mapping(COLUMNS, SCHEMA, "fuzzy", cache_path) is None
+    save_mapping(COLUMNS, SCHEMA, "fuzzy", MAPPING, cache_path)
+    with open(cache_path) as f:
+        assert len(json.load(f)) == 1
@@ -0,0 +1,79 @@
+import io
+import json
+import pandas as pd
+import pytest
+from benchmarks.generators import generate_panel_table
+from src.merge import merge_pmo
+from src.transformer import microhaplotype_table_to_pmo_dict, panel_info_table_to_pmo_dict
+
+
+def run(bioinfo_id, rows):
+    table = pd.DataFrame(rows, columns=["sampleID", "locus", "asv", "reads"])
+    return microhaplotype_table_to_pmo_dict(table, bioinfo_id)
+
+
+def sequences_by_sample(pmo, bioinfo_id, representative_id):
+    # The sequence and read count of each haplotype of each sample and locus, which merging must not change
+    targets = pmo["representative_microhaplotype_sequences"][representative_id]["targets"]
+    samples = pmo["microhaplotypes_detected"][bioinfo_id]["experiment_samples"]
+    return {(sample_id, locus, targets[locus]["seqs"][haplotype_id]["seq"]): haplotype["read_count"]
+            for sample_id, sample in samples.items()
+            for locus, result in sample["target_results"].items()
+            for haplotype_id, haplotype in result["microhaplotypes"].items()}
+
+
+@pytest.fixture
+def runs():
+    # The second run sees GT at L1 first, and shares AC at L1 and L2 with the first run
+    return [run("run1", [("s1", "L1", "AC", 5), ("s1", "L1", "GT", 3), ("s2", "L2", "AC", 2)]),
+            run("run2", [("s3", "L1", "GT", 4), ("s3", "L1", "TT", 1), ("s4", "L1", "AC", 6),
+                         ("s4", "L3", "CC", 2)])]
+
+
+def test_haplotype_ids_are_remapped_to_the_merged_sequences(runs):
+    out = io.StringIO()
+
+    counts = merge_pmo([], runs, out, "merged")
+
+    merged = json.loads(out.getvalue())
+    targets = merged["representative_microhaplotype_sequences"]["merged"]["targets"]
+    assert {locus: {haplotype_id: seq["seq"] for haplotype_id, seq in target["seqs"].items()}
+            for locus, target in targets.items()} == {
+        "L1": {"L1.0": "AC", "L1.1": "GT", "L1.2": "TT"}, "L2": {"L2.0": "AC"}, "L3": {"L3.0": "CC"}}
+    for component in runs:
+        bioinfo_id = next(iter(component["microhaplotypes_detected"]))
+        assert sequences_by_sample(merged, bioinfo_id, "merged") == \
+            sequences_by_sample(component, bioinfo_id, bioinfo_id)
+    assert merged["microhaplotypes_detected"]["run2"]["experiment_samples"]["s3"]["target_results"]["L1"][
+        "microhaplotypes"]["L1.1"] == {"haplotype_id": "L1.1", "read_count": 4}
+    assert counts == {"runs": 2, "samples": 4, "representative_sequences": 5}
+
+
+def test_merged_file_can_be_merged_again(runs, tmp_path):
+    path = tmp_path / "merged.json.gz"
+    merge_pmo([], runs, str(path), "merged")
+    out = io.StringIO()
+
+    merge_pmo([], [str(path), run("run3", [("s5", "L3", "CC", 7), ("s5", "L3", "GA", 1)])], out, "again")
+
+    merged = json.loads(out.getvalue())
+    assert list(merged["microhaplotypes_detected"]) == ["run1", "run2", "run3"]
+    assert merged["representative_microhaplotype_sequences"]["again"]["targets"]["L3"]["seqs"] == {
+        "L3.0": {"microhaplotype_id": "L3.0", "seq": "CC"}, "L3.1": {"microhaplotype_id": "L3.1", "seq": "GA"}}
+
+
+def test_panels_are_written_before_the_runs(runs):
+    panel = panel_info_table_to_pmo_dict(generate_panel_table(3, primers_per_target=1), "panel",
+                                         {"name": "genome"})
+    out = io.StringIO()
+
+    merge_pmo([panel], runs, out, "merged")
+
+    merged = json.loads(out.getvalue())
+    assert list(merged)[:2] == ["panel_info", "microhaplotypes_detected"]
+    assert merged["panel_info"] == panel["panel_info"]
+
+
+def test_run_in_more_than_one_component_is_rejected(runs):
+    with pytest.raises(ValueError, match="run1"):
+        merge_pmo([], [runs[0], runs[0]], io.StringIO(), "merged")
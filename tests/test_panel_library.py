@@ -0,0 +1,64 @@
+import json
+import pytest
+from benchmarks.generators import generate_panel_table
+from src import panel_library
+from src.panel_library import delete_panel, get_saved_panels, list_panels, load_panel, save_panel
+from src.transformer import panel_info_table_to_pmo_dict
+
+
+def panel(panel_id, n_targets):
+    return panel_info_table_to_pmo_dict(generate_panel_table(n_targets, primers_per_target=2), panel_id,
+                                        {"name": "genome", "version": "1.0"})
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "library" / "panels.sqlite")
+
+
+def test_saved_panel_is_loaded_back(db_path):
+    saved = panel("panel_a", 5)
+
+    save_panel("panel_a", saved, db_path)
+
+    assert load_panel("panel_a", db_path) == saved
+    with pytest.raises(KeyError):
+        load_panel("panel_b", db_path)
+
+
+def test_panels_are_listed_most_recent_first_and_replaced_by_id(db_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(panel_library.time, "time", lambda: next(clock))
+    save_panel("panel_a", panel("panel_a", 5), db_path)
+    save_panel("panel_b", panel("panel_b", 3), db_path)
+    save_panel("panel_a", panel("panel_a", 2), db_path)
+
+    panels = list_panels(db_path)
+
+    assert [p["panel_id"] for p in panels] == ["panel_a", "panel_b"]
+    assert [(p["genome_name"], p["genome_version"], p["target_count"]) for p in panels] == [
+        ("genome", "1.0", 2), ("genome", "1.0", 3)]
+    assert panels[0]["size_bytes"] == len(json.dumps(panel("panel_a", 2), separators=(",", ":")))
+
+
+def test_deleted_panel_is_gone(db_path):
+    save_panel("panel_a", panel("panel_a", 1), db_path)
+
+    assert delete_panel("panel_a", db_path)
+    assert not delete_panel("panel_a", db_path)
+    assert get_saved_panels(db_path) == []
+
+
+def test_json_files_of_older_versions_are_imported_once(tmp_path, db_path):
+    library_dir = tmp_path / "library"
+    library_dir.mkdir()
+    old = panel("old", 2)
+    (library_dir / "old.json").write_text(json.dumps(old))
+    # Older versions stored some panels as an encoded JSON string
+    (library_dir / "encoded.json").write_text(json.dumps(json.dumps(old)))
+    (library_dir / "broken.json").write_text("{")
+
+    assert sorted(get_saved_panels(db_path)) == ["encoded", "old"]
+    assert load_panel("encoded", db_path) == load_panel("old", db_path) == old
+    delete_panel("old", db_path)
+    assert get_saved_panels(db_path) == ["encoded"]
@@ -0,0 +1,82 @@
+import json
+import os
+import pytest
+from benchmarks.generators import generate_microhaplotype_table, generate_panel_table
+from src import pmo_reader
+from src.pmo_reader import INDEX_SUFFIX, PMOReader, build_pmo_index, read_pmo
+from src.pmo_writer import write_pmo
+from src.transformer import microhaplotype_table_to_pmo_dict, panel_info_table_to_pmo_dict
+
+
+@pytest.fixture
+def pmo():
+    panel = panel_info_table_to_pmo_dict(generate_panel_table(5, primers_per_target=2), "panel", {"name": "genome"})
+    run = microhaplotype_table_to_pmo_dict(generate_microhaplotype_table(6, 4), "run")
+    # Keys and values holding the characters the indexer looks for
+    run["microhaplotypes_detected"]["run"]["experiment_samples"]['odd "{[sample]}"\\'] = {
+        "sample_id": 'odd "{[sample]}"\\', "target_results": {}}
+    return {**panel, **run}
+
+
+@pytest.mark.parametrize("indent", [4, None])
+def test_reader_round_trips_every_entry(tmp_path, pmo, indent):
+    path = tmp_path / "pmo.json"
+    write_pmo([pmo], str(path), indent=indent)
+
+    with PMOReader(str(path)) as reader:
+        for section, pattern in pmo_reader.INDEXED_ENTRIES.items():
+            assert reader.keys(section) == list(pmo[section])
+            for entry_id, entry in pmo[section].items():
+                entries = entry[pattern[2]]
+                assert reader.keys(section, entry_id) == list(entries)
+                for key, value in entries.items():
+                    assert reader.get(section, entry_id, key) == value
+    assert read_pmo(str(path)) == pmo
+
+
+def test_index_is_stored_and_rebuilt_when_the_file_changes(tmp_path, pmo):
+    path = tmp_path / "pmo.json"
+    write_pmo([pmo], str(path))
+    with PMOReader(str(path)):
+        pass
+    assert os.path.exists(f"{path}{INDEX_SUFFIX}")
+
+    del pmo["microhaplotypes_detected"]["run"]["experiment_samples"]["sample_000000"]
+    write_pmo([pmo], str(path))
+    with PMOReader(str(path)) as reader:
+        assert "sample_000000" not in reader.keys("microhaplotypes_detected", "run")
+
+
+def test_index_is_kept_in_memory_when_it_cannot_be_stored(tmp_path, pmo, monkeypatch):
+    path = tmp_path / "pmo.json"
+    write_pmo([pmo], str(path))
+
+    def fail_replace(src, dst):
+        raise PermissionError(13, "Permission denied", dst)
+
+    monkeypatch.setattr(pmo_reader.os, "replace", fail_replace)
+    with PMOReader(str(path)) as reader:
+        assert reader.get_sample("run", "sample_000001") == \
+            pmo["microhaplotypes_detected"]["run"]["experiment_samples"]["sample_000001"]
+    assert os.listdir(tmp_path) == ["pmo.json"]
+
+
+def test_index_can_be_stored_elsewhere(tmp_path, pmo):
+    path = tmp_path / "pmo.json"
+    write_pmo([pmo], str(path))
+    index_path = tmp_path / "cache" / "pmo.index.json"
+    index_path.parent.mkdir()
+
+    index = build_pmo_index(str(path), str(index_path))
+
+    assert json.loads(index_path.read_text()) == json.loads(json.dumps(index))
+    assert not os.path.exists(f"{path}{INDEX_SUFFIX}")
+
+
+def test_reader_rejects_compressed_files(tmp_path, pmo):
+    path = tmp_path / "pmo.json.gz"
+    write_pmo([pmo], str(path))
+
+    with pytest.raises(ValueError):
+        PMOReader(str(path))
+    assert read_pmo(str(path)) == pmo
@@ -0,0 +1,101 @@
+import random
+import numpy as np
+from src import sequence_store
+from src.sequence_store import SequenceStore
+
+
+def random_batch(rng, alphabet, n):
+    loci = [f"locus_{rng.randint(0, 3)}" for _ in range(n)]
+    seqs = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12))) for _ in range(n)]
+    return loci, seqs
+
+
+def test_empty_batches():
+    store = SequenceStore()
+
+    handles, is_new = store.intern_many([], [])
+
+    assert handles.tolist() == [] and is_new.tolist() == []
+    assert store.find_many([], []).tolist() == []
+    assert len(store) == 0
+
+
+def test_sequences_that_are_not_acgt_are_kept_as_given():
+    store = SequenceStore()
+    loci = ["a", "a", "a", "a", "a"]
+    seqs = ["ACGT", "acgt", "ACGN", "ACGTé", ""]
+
+    handles, is_new = store.intern_many(loci, seqs)
+
+    assert handles.tolist() == [0, 1, 2, 3, 4] and is_new.all()
+    assert store.sequences(handles) == seqs
+    assert store.find_many(loci[::-1], seqs[::-1]).tolist() == [4, 3, 2, 1, 0]
+
+
+def test_same_sequence_at_different_loci_gets_different_handles():
+    store = SequenceStore()
+
+    handles, _ = store.intern_many(["a", "b", "a"], ["ACGT", "ACGT", "ACGT"])
+
+    assert handles.tolist() == [0, 1, 0]
+    assert store.find_many(["b", "c"], ["ACGT", "ACGT"]).tolist() == [1, -1]
+    assert [store.locus(handle) for handle in range(2)] == ["a", "b"]
+
+
+def test_intern_many_matches_a_dictionary():
+    rng = random.Random(0)
+    for _ in range(50):
+        # Short alphabets make repeated sequences common, N and é are kept as strings
+        alphabet = rng.choice(["ACGT", "AC", "ACGTN", "ACGTé"])
+        store, expected = SequenceStore(), {}
+        for _ in range(rng.randint(1, 12)):
+            loci, seqs = random_batch(rng, alphabet, rng.randint(0, 30))
+            known = [expected.get(pair, -1) for pair in zip(loci, seqs)]
+            assert store.find_many(loci, seqs).tolist() == known
+
+            handles, is_new = store.intern_many(loci, seqs)
+
+            new = []
+            for pair in zip(loci, seqs):
+                new.append(pair not in expected)
+                expected.setdefault(pair, len(expected))
+            assert handles.tolist() == [expected[pair] for pair in zip(loci, seqs)]
+            assert is_new.tolist() == new
+        pairs = list(expected)
+        assert len(store) == len(pairs)
+        assert store.sequences(np.arange(len(pairs))) == [seq for _, seq in pairs]
+
+
+def test_pairs_with_the_same_hash_are_told_apart(monkeypatch):
+    # Every sequence gets the same hash, so pairs are only found by comparing their bases
+    monkeypatch.setattr(sequence_store, "_hash", lambda chars, lengths, locus_codes: np.zeros(
+        len(chars), dtype=np.uint64))
+    store = SequenceStore()
+    loci, seqs = ["a", "a", "b", "a"], ["ACGT", "ACGA", "ACGT", "ACNT"]
+
+    handles, _ = store.intern_many(loci, seqs)
+    again, is_new = store.intern_many(loci[::-1], seqs[::-1])
+
+    assert handles.tolist() == [0, 1, 2, 3]
+    assert again.tolist() == [3, 2, 1, 0]
+    assert not is_new.any()
+
+
+def test_handles_by_locus_are_in_order_of_first_appearance():
+    store = SequenceStore()
+    store.intern_many(["b", "a", "b", "a"], ["A", "C", "G", "T"])
+
+    by_locus = store.handles_by_locus()
+
+    assert list(by_locus) == ["a", "b"]
+    assert [store.sequences(handles) for handles in by_locus.values()] == [["C", "T"], ["A", "G"]]
+
+
+def test_many_small_batches_keep_few_index_runs():
+    store = SequenceStore()
+    for i in range(1000):
+        store.intern("locus", format(i, "b").replace("0", "A").replace("1", "C"))
+
+    assert len(store) == 1000
+    assert len(store._runs) <= 11
+    assert store.find_many(["locus"], ["CAAAAAAAA"]).tolist() == [256]
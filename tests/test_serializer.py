@@ -0,0 +1,92 @@
+import io
+import json
+import random
+import numpy as np
+import pandas as pd
+import pytest
+from src.pmo_writer import write_json
+from src.serializer import dumps, reindent
+
+# Characters that are structural in JSON, or escaped inside strings
+TRICKY_CHARS = ['"', "\\", "{", "}", "[", "]", ",", ":", " ", "\n", "\t", "é", "☃", "a", "1"]
+
+
+def random_string(rng):
+    return "".join(rng.choice(TRICKY_CHARS) for _ in range(rng.randint(0, 6)))
+
+
+def random_key(rng):
+    return rng.choice([random_string(rng), random_string(rng), rng.randint(-5, 5), 1.5, True, None])
+
+
+def random_value(rng, depth=0):
+    kind = rng.randint(0, 7 if depth < 4 else 4)
+    if kind == 0:
+        return random_string(rng)
+    if kind == 1:
+        return rng.choice([rng.randint(-10 ** 6, 10 ** 6), rng.random() * 1e6, 0.1, -0.0])
+    if kind == 2:
+        return rng.choice([True, False, None])
+    if kind == 3:
+        return rng.choice([{}, []])
+    if kind in (4, 5):
+        return {random_key(rng): random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+    return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+
+
+@pytest.mark.parametrize("obj", [
+    # Escapes and characters that are structural in JSON, inside strings and keys
+    {'"{[,:]}"': 'a "quoted" \\ back\\slash\n\t', "é☃": ["\u0000", "\x7f", "]", "}"]},
+    # Keys that are not strings
+    {2: "int", -2.5: "float", True: "bool", None: "none"},
+    # Empty containers, including nested ones
+    {"empty": {}, "list": [], "nested": [[], [{}], {"a": []}]},
+    [0.1, -0.0, 1e16, 123456.789, -10 ** 6, True, False, None],
+    {}, [], "top level", 3,
+])
+@pytest.mark.parametrize("indent", [None, 1, 4])
+def test_dumps_matches_json_dumps(obj, indent):
+    expected = json.dumps(obj, indent=indent, separators=(",", ":") if indent is None else None)
+
+    assert dumps(obj, indent) == expected
+
+
+def test_dumps_matches_json_dumps_on_random_documents():
+    rng = random.Random(0)
+    for _ in range(300):
+        obj = random_value(rng)
+        indent = rng.choice([1, 2, 4])
+
+        assert dumps(obj, indent) == json.dumps(obj, indent=indent)
+        assert dumps(obj) == json.dumps(obj, separators=(",", ":"))
+
+
+def test_write_json_matches_json_dumps():
+    rng = random.Random(0)
+    for _ in range(20):
+        obj = {random_key(rng): random_value(rng) for _ in range(rng.randint(0, 20))}
+        out = io.StringIO()
+
+        write_json(obj, out, indent=4)
+
+        assert out.getvalue() == json.dumps(obj, indent=4)
+
+
+def test_reindent_at_depth_indents_nested_value():
+    obj = {"a": [1, {"b": "}\\\""}], "c": {}}
+    nested = json.dumps({"outer": obj}, indent=2)
+
+    assert reindent(json.dumps(obj, separators=(",", ": ")), 2, depth=1) in nested
+
+
+def test_dumps_converts_numpy_and_pandas_values():
+    obj = {"count": np.int64(3), "ratio": np.float32(0.5), "flags": np.array([True, False]),
+           "names": pd.Series(["a", None], dtype=object), "missing": pd.NA}
+
+    assert json.loads(dumps(obj, 2)) == {"count": 3, "ratio": 0.5, "flags": [True, False],
+                                         "names": ["a", None], "missing": None}
+
+
+def test_dumps_rejects_unknown_objects():
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
@@ -0,0 +1,89 @@
+import importlib.util
+import io
+import pandas as pd
+import pytest
+from src import table_cache as table_cache_module
+from src.table_cache import TableCache, content_hash, load_csv_cached, load_csvs_cached
+
+CSV = "sample\tlocus\tasv\treads\ns1\tL1\tACGT\t5\ns2\tL1\tACGA\t7\n"
+MAPPING = {"sampleID": "sample", "locus": "locus", "asv": "asv", "reads": "reads"}
+
+
+def table(n):
+    return pd.DataFrame({"reads": range(n)})
+
+
+def test_least_recently_used_tables_are_evicted_beyond_max_bytes():
+    size = int(table(100).memory_usage(deep=True).sum())
+    cache = TableCache(max_bytes=2 * size)
+    cache.put("a", table(100))
+    cache.put("b", table(100))
+    assert cache.get("a") is not None
+
+    cache.put("c", table(100))
+
+    assert [key for key in "abc" if cache.get(key) is not None] == ["a", "c"]
+
+
+def test_table_larger_than_max_bytes_is_still_kept():
+    cache = TableCache(max_bytes=1)
+
+    cache.put("a", table(100))
+
+    assert cache.get("a") is not None
+
+
+@pytest.mark.skipif(not importlib.util.find_spec("pyarrow"), reason="pyarrow is not installed")
+def test_evicted_tables_are_spilled_and_read_back(tmp_path):
+    cache = TableCache(max_bytes=1, spill_dir=str(tmp_path))
+    cache.put("a", table(10))
+    cache.put("b", table(10))
+
+    assert cache.get("a").equals(table(10))
+    cache.clear()
+    assert cache.get("a") is None
+
+
+def test_content_hash_is_the_same_for_paths_and_streams(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text(CSV)
+
+    assert content_hash(str(path)) == content_hash(io.BytesIO(CSV.encode())) == content_hash(io.StringIO(CSV))
+    assert content_hash(io.BytesIO(CSV.encode() + b"\n")) != content_hash(str(path))
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    # The files parsed by the cached loaders
+    parsed = []
+    for name in ("load_csv", "load_csvs"):
+        def counting(files, *args, load=getattr(table_cache_module, name)):
+            parsed.append(files)
+            return load(files, *args)
+        monkeypatch.setattr(table_cache_module, name, counting)
+    return parsed
+
+
+def test_same_contents_are_parsed_once_per_mapping(parsed):
+    cache = TableCache()
+
+    first = load_csv_cached(io.BytesIO(CSV.encode()), cache=cache)
+    again = load_csv_cached(io.BytesIO(CSV.encode()), cache=cache)
+    typed = load_csv_cached(io.BytesIO(CSV.encode()), MAPPING, cache=cache)
+
+    assert again is first and typed is not first
+    assert len(parsed) == 2
+    assert isinstance(typed["sample"].dtype, pd.CategoricalDtype)
+
+
+def test_same_files_in_the_same_order_are_parsed_once(parsed):
+    cache = TableCache()
+    other = CSV.replace("s2", "s3")
+
+    first = load_csvs_cached([io.BytesIO(CSV.encode()), io.BytesIO(other.encode())], MAPPING, cache=cache)
+    again = load_csvs_cached([io.BytesIO(CSV.encode()), io.BytesIO(other.encode())], MAPPING, cache=cache)
+    swapped = load_csvs_cached([io.BytesIO(other.encode()), io.BytesIO(CSV.encode())], MAPPING, cache=cache)
+
+    assert again is first
+    assert swapped["sample"].tolist() == ["s1", "s3", "s1", "s2"]
+    assert len(parsed) == 2
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.validation import (MAX_EXAMPLES, ValidationError, raise_for_violations, validate_mhap_table,
+                            validate_panel_table)
+
+MHAP_MAPPING = {"sampleID": "sample", "locus": "locus", "asv": "asv", "reads": "reads"}
+PANEL_MAPPING = {"target_id": "target", "forward_primers": "fwd", "reverse_primers": "rev",
+                 "insert_start": "start", "insert_end": "end"}
+
+
+@pytest.fixture
+def mhap():
+    return pd.DataFrame({"sample": ["s1", "s1", "s2"], "locus": ["L1", "L1", "L1"], "asv": ["AC", "GT", "AC"],
+                         "reads": [5, 3, 2], "plate": ["p1", "p1", "p2"]})
+
+
+@pytest.fixture
+def panel():
+    return pd.DataFrame({"target": ["t1", "t1", "t2"], "fwd": ["AAC", "AAG", "CCA"], "rev": ["GGT", "GGA", "TTG"],
+                         "start": [10, 10, 0], "end": [90, 90, 50], "chrom": ["chr1", "chr1", "chr2"]})
+
+
+def checks(violations):
+    return [(v.check, v.column) for v in violations]
+
+
+def test_valid_tables_have_no_violations(mhap, panel):
+    assert validate_mhap_table(mhap, MHAP_MAPPING, ["plate"]) == []
+    assert validate_panel_table(panel, PANEL_MAPPING, ["chrom"], ["start"]) == []
+    raise_for_violations([])
+
+
+def test_unmapped_field(mhap):
+    mapping = {**MHAP_MAPPING, "asv": None}
+    del mapping["reads"]
+
+    assert checks(validate_mhap_table(mhap, mapping)) == [("unmapped_field", None), ("unmapped_field", None)]
+
+
+def test_missing_column(mhap):
+    violations = validate_mhap_table(mhap, {**MHAP_MAPPING, "reads": "count"}, ["plate", "run"])
+
+    assert checks(violations) == [("missing_column", "count"), ("missing_column", "run")]
+
+
+def test_missing_value(mhap):
+    mhap.loc[[0, 2], "asv"] = None
+
+    violation, = validate_mhap_table(mhap, MHAP_MAPPING)
+
+    assert (violation.check, violation.column, violation.count, violation.examples) == \
+        ("missing_value", "asv", 2, [0, 2])
+
+
+def test_read_count(mhap):
+    negative_or_fractional = mhap.assign(reads=[5, -1, 2.5])
+    text = mhap.assign(reads=["5", "3", "many"])
+
+    violation, = validate_mhap_table(negative_or_fractional, MHAP_MAPPING)
+
+    assert (violation.check, violation.examples) == ("read_count", [1, 2])
+    assert checks(validate_mhap_table(text, MHAP_MAPPING)) == [("read_count", "reads")]
+
+
+def test_duplicate_call(mhap):
+    mhap.loc[1, "asv"] = "AC"
+
+    violation, = validate_mhap_table(mhap, MHAP_MAPPING)
+
+    assert (violation.check, violation.examples) == ("duplicate_call", [1])
+
+
+def test_coordinates(panel):
+    panel["start"] = [10, 100, np.nan]
+
+    violation, = validate_panel_table(panel, PANEL_MAPPING)
+
+    assert (violation.check, violation.column, violation.examples) == ("coordinates", "start, end", [1, 2])
+
+
+def test_not_unique_for_target(panel):
+    panel.loc[1, "chrom"] = "chr3"
+
+    violation, = validate_panel_table(panel, PANEL_MAPPING, ["chrom"])
+
+    assert (violation.check, violation.column, violation.examples) == ("not_unique_for_target", "chrom", ["t1"])
+
+
+def test_every_violation_is_reported_with_few_examples(mhap):
+    mhap = pd.concat([mhap] * 10, ignore_index=True)
+    mhap.loc[0, "sample"] = None
+
+    with pytest.raises(ValidationError) as error:
+        raise_for_violations(validate_mhap_table(mhap, MHAP_MAPPING, ["run"]))
+
+    assert checks(error.value.violations) == [("missing_column", "run"), ("missing_value", "sample"),
+                                              ("duplicate_call", None)]
+    duplicate = error.value.violations[-1]
+    assert duplicate.count == 26 and len(duplicate.examples) == MAX_EXAMPLES
+    assert duplicate.message.endswith("and 16 more")